@@ -0,0 +1,258 @@
+import random
+import re
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from google.api_core.exceptions import NotFound
+from google.cloud.bigquery import SchemaField, Table
+
+from racing.snapshot import _split_top_level, _unquote
+
+# Local stand-ins for Supabase and BigQuery serving synthetic cards, odds ticks and
+# performance stats, so pages can be driven headless without credentials.
+
+COURSES = ('Ascot', 'York', 'Newbury', 'Kempton', 'Lingfield', 'Doncaster')
+
+SKILL_SCORES = [
+    'horse_form_score', 'horse_potential_skill_score', 'horse_fitness_score',
+    'horse_enthusiasm_score', 'horse_jumping_skill_score', 'horse_going_skill_score',
+    'horse_distance_skill_score', 'jockey_skill_score', 'trainer_skill_score',
+]
+
+
+def synthetic_card(days=2, courses=4, races=7, runners=12, start='2026-10-01', seed=0):
+    rng = random.Random(seed)
+    rows = []
+    race_id = 100000
+    for day in range(days):
+        race_date = (pd.Timestamp(start) + pd.Timedelta(days=day)).strftime('%Y-%m-%d')
+        for city in COURSES[:courses]:
+            for race in range(races):
+                race_id += 1
+                weights = [rng.random() for _ in range(runners)]
+                time_off = f'{12 + race:02d}:{rng.choice(["05", "25", "45"])}:00'
+                total = sum(weights)
+                for n in range(runners):
+                    win = weights[n] / total
+                    row = {
+                        'race_date': race_date, 'race_id': race_id, 'horse_id': f'{race_id}-{n}',
+                        'race_name': f'{city} Handicap {race + 1}', 'city': city,
+                        'horse': f'Horse {race_id}-{n}', 'jockey': f'Jockey {rng.randint(1, 60)}',
+                        'trainer': f'Trainer {rng.randint(1, 40)}',
+                        'odds': round(1 / max(win * rng.uniform(0.7, 1.1), 0.01), 2),
+                        'odds_predicted': round(1 / win, 2), 'odds_predicted_intial': round(1 / win * rng.uniform(0.9, 1.1), 2),
+                        'horse_num': n + 1, 'draw_norm': rng.random(),
+                        'positive_hint': rng.choice(['', 'Course winner', 'In form']),
+                        'negative_hint': rng.choice(['', 'Up in trip', 'Long absence']),
+                        'last_5_positions': '-'.join(rng.choice('1234567890PFU') for _ in range(rng.randint(0, 5))),
+                        'winner_prob': win, 'quinella_prob': min(1, 2 * win), 'trifecta_prob': min(1, 3 * win),
+                        'place_prob': min(1, 3 * win), 'last_place_prob': 1 / runners,
+                        'using_sire_stats': rng.random() < 0.15,
+                        'race_time_off': time_off,
+                        'position': None,
+                    }
+                    for score in SKILL_SCORES:
+                        row[score] = rng.uniform(0, 10)
+                        row[f'{score}_diff'] = rng.uniform(-1, 1)
+                    rows.append(row)
+                # Finishing positions, drawn in proportion to win probability
+                order = sorted(range(runners), key=lambda i: -weights[i] * rng.random())
+                for position, i in enumerate(order, start=1):
+                    rows[-runners + i]['position'] = position
+    return rows
+
+
+def synthetic_odds(rows, ticks=24, interval_minutes=10, seed=1):
+    rng = np.random.default_rng(seed)
+    card = pd.DataFrame(rows)[['race_id', 'horse_id', 'race_date', 'odds']]
+    n = len(card)
+    steps = rng.normal(0, 0.04, size=(n, ticks)).cumsum(axis=1)
+    odds = np.maximum(1.01, card['odds'].to_numpy()[:, None] * np.exp(steps)).round(2)
+    start = pd.to_datetime(card['race_date']).to_numpy()[:, None] + np.timedelta64(9, 'h')
+    times = start + (np.arange(ticks) * interval_minutes).astype('timedelta64[m]')
+    return pd.DataFrame({
+        'race_id': np.repeat(card['race_id'].to_numpy(), ticks),
+        'horse_link': np.repeat(card['horse_id'].to_numpy(), ticks),
+        'odds': odds.ravel(),
+        'scraped_time': times.ravel(),
+    })
+
+
+def synthetic_stats(days=60, seed=2):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'race_date': pd.date_range(end='2026-10-01', periods=days),
+        'avg_acc_top3': rng.uniform(0.2, 0.6, days),
+        'money_earned_top1': rng.normal(0, 20, days).cumsum(),
+        'money_earned_top3': rng.normal(0, 30, days).cumsum(),
+    })
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+
+class FakeQuery:
+    # The subset of the postgrest query builder the pages use
+    def __init__(self, frame):
+        self._frame = frame
+        self._columns = None
+        self._limit = None
+        self._order = []
+
+    def _with(self, frame):
+        query = FakeQuery(frame)
+        query._columns, query._limit, query._order = self._columns, self._limit, self._order
+        return query
+
+    def select(self, *columns):
+        query = self._with(self._frame)
+        query._columns = [c for c in columns if c != '*'] or None
+        return query
+
+    def eq(self, column, value):
+        return self._with(self._frame[self._frame[column].astype(str) == str(value)])
+
+    def gt(self, column, value):
+        return self._with(self._frame[self._frame[column] > _like(self._frame[column], value)])
+
+    def lt(self, column, value):
+        return self._with(self._frame[self._frame[column] < _like(self._frame[column], value)])
+
+    def gte(self, column, value):
+        return self._with(self._frame[self._frame[column] >= _like(self._frame[column], value)])
+
+    def lte(self, column, value):
+        return self._with(self._frame[self._frame[column] <= _like(self._frame[column], value)])
+
+    def or_(self, filters):
+        return self._with(self._frame[_logic(self._frame, filters, 'or')])
+
+    def order(self, column, desc=False):
+        # Later calls break ties of earlier ones, as in SQL
+        query = self._with(self._frame)
+        query._order = self._order + [(column, not desc)]
+        columns, ascending = zip(*query._order)
+        query._frame = self._frame.sort_values(list(columns), ascending=list(ascending), kind='stable')
+        return query
+
+    def limit(self, n):
+        query = self._with(self._frame)
+        query._limit = n
+        return query
+
+    def range(self, start, end):
+        query = self._with(self._frame.iloc[start:])
+        query._limit = end - start + 1
+        return query
+
+    def execute(self):
+        frame = self._frame if self._limit is None else self._frame.head(self._limit)
+        if self._columns:
+            frame = frame[[c for c in self._columns if c in frame.columns]]
+        return FakeResponse(frame.astype(object).where(frame.notna(), None).to_dict('records'))
+
+
+def _logic(frame, text, joiner):
+    # Row mask of a postgrest logic tree such as "a.gt.x,and(a.eq.x,or(b.gt.y,...))"
+    masks = []
+    for part in _split_top_level(text):
+        group = re.fullmatch(r'(and|or)\((.*)\)', part)
+        if group:
+            masks.append(_logic(frame, group.group(2), group.group(1)))
+            continue
+        column, op, value = part.split('.', 2)
+        value = _like(frame[column], _unquote(value))
+        masks.append({'eq': frame[column] == value, 'gt': frame[column] > value, 'lt': frame[column] < value,
+                      'gte': frame[column] >= value, 'lte': frame[column] <= value}[op])
+    combined = masks[0]
+    for mask in masks[1:]:
+        combined = combined & mask if joiner == 'and' else combined | mask
+    return combined
+
+
+def _like(column, value):
+    # Cast a filter value to the column's type, as postgrest would
+    if pd.api.types.is_integer_dtype(column):
+        return int(value)
+    if pd.api.types.is_float_dtype(column):
+        return float(value)
+    return str(value)
+
+
+class FakeSupabase:
+    def __init__(self, rows):
+        self._frame = pd.DataFrame(rows)
+
+    def table(self, name):
+        return FakeQuery(self._frame)
+
+
+class FakeQueryJob:
+    def __init__(self, frame, cache_hit=False):
+        self._frame = frame
+        # Dry runs report the bytes the query would scan, a cached job reports none
+        self.total_bytes_processed = 0 if cache_hit else int(frame.memory_usage(deep=True).sum())
+        self.total_bytes_billed = self.total_bytes_processed
+        self.slot_millis = 0 if cache_hit else max(1, len(frame) // 1000)
+        self.cache_hit = cache_hit
+
+    def result(self, *args, **kwargs):
+        return self
+
+    def to_dataframe(self, *args, **kwargs):
+        return self._frame.copy()
+
+    def to_arrow(self, *args, **kwargs):
+        return pa.Table.from_pandas(self._frame, preserve_index=False)
+
+
+class FakeBigQuery:
+    def __init__(self, rows, ticks=24):
+        self._odds = synthetic_odds(rows, ticks=ticks)
+        self._stats = synthetic_stats()
+        self._results = pd.DataFrame(rows)
+        # Query texts already run, repeated ones are served from the query cache
+        self._ran = set()
+
+    def query(self, query, job_config=None, **kwargs):
+        if 'odds' in query:
+            frame = self._odds
+        elif 'results' in query:
+            frame = self._results
+        else:
+            frame = self._stats
+        if job_config is not None and job_config.dry_run:
+            return FakeQueryJob(frame)
+        cache_hit = query in self._ran
+        self._ran.add(query)
+        return FakeQueryJob(frame, cache_hit)
+
+    def get_table(self, reference):
+        # Only the results tables are looked up
+        if 'results' not in str(reference):
+            raise NotFound(f"Not found: Table {reference}")
+        return Table(reference, schema=[SchemaField(column, 'STRING') for column in self._results.columns])
+
+
+def install(rows, ticks=24):
+    # Patch the client constructors the pages import, must run before the first script run
+    import supabase
+    from google.cloud import bigquery
+    from google.oauth2 import service_account
+
+    supabase.create_client = lambda url, key, options=None: FakeSupabase(rows)
+    service_account.Credentials.from_service_account_info = staticmethod(lambda info: None)
+    fake_bigquery = FakeBigQuery(rows, ticks=ticks)
+    bigquery.Client = lambda *args, **kwargs: fake_bigquery
+
+
+FAKE_SECRETS = {
+    'supabase_url': 'http://localhost',
+    'supabase_key': 'fake',
+    'gcp_service_account': {},
+    'results_tables': {country: f'fake.{country}_horse_data.{country}_data__results'
+                       for country in ('uk', 'fr', 'hk', 'ie', 'za')},
+}
@@ -0,0 +1,222 @@
+# Drive N concurrent headless sessions through each country page and report rerun
+# latency, CPU and memory as concurrency scales. Supabase and BigQuery are replaced
+# by loadtest.fake_backends, so no credentials are needed. Sessions share one process,
+# so CPU and memory are measured for the process and reported as averages per session.
+#
+#   python -m loadtest.run --pages uk fr --concurrency 1 4 16
+import argparse
+import os
+import random
+import resource
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from loadtest.fake_backends import FAKE_SECRETS, install, synthetic_card  # noqa: E402
+
+# share_process_globals replaces Streamlit internals (the Runtime singleton, config.get_option
+# and the components manager) the way this release's AppTest uses them. Another release may
+# use them differently, so the load test refuses to run on one it was not checked against.
+STREAMLIT_VERSION = '1.66'
+
+PAGES = {
+    'uk': 'pages/United_Kingdom.py',
+    'fr': 'pages/France.py',
+    'hk': 'pages/Hong Kong.py',
+    'ie': 'pages/Ireland.py',
+    'za': 'pages/South Africa.py',
+}
+
+
+def share_process_globals():
+    # AppTest swaps process globals around every run: a fresh mock Runtime, st.secrets and a
+    # patched config.get_option. Concurrent sessions would swap them under each other, so one
+    # copy of each is installed for the whole process, as on one server, and the swaps
+    # inside AppTest become no-ops. Each AppTest keeps its own session and fragment state,
+    # so sessions rerun in parallel and latency is not lock queueing.
+    import streamlit as st
+    if not st.__version__.startswith(STREAMLIT_VERSION + '.'):
+        raise RuntimeError(f"loadtest.run patches Streamlit {STREAMLIT_VERSION} internals, found {st.__version__}: "
+                           "check share_process_globals against AppTest before updating STREAMLIT_VERSION")
+    from streamlit import config
+    from streamlit.components.v2.component_manager import BidiComponentManager
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+    from streamlit.runtime.dataframe_source_manager import DataframeSourceManager
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+    from streamlit.runtime.secrets import Secrets
+    from streamlit.testing.v1.util import build_mock_config_get_option
+
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.dataframe_source_mgr = DataframeSourceManager()
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    runtime.bidi_component_registry = BidiComponentManager()
+    runtime.bidi_component_registry.discover_and_register_components(start_file_watching=False)
+    Runtime.instance = classmethod(lambda cls: runtime)
+    Runtime.exists = classmethod(lambda cls: True)
+
+    secrets = Secrets()
+    secrets._secrets = FAKE_SECRETS
+    st.secrets = secrets
+    # AppTest patches get_option with the same override on every run, so a session
+    # restoring another's patch still sees the same values
+    config.get_option = build_mock_config_get_option({"global.appTest": True})
+
+
+def current_rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except OSError:
+        # Peak rather than current outside Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _widget(elements, key):
+    matches = [element for element in elements if element.key == key]
+    return matches[0] if matches else None
+
+
+def session_flow(at, rng, races_per_session, history_date):
+    # A realistic visit: load, pick a course, stack up races, switch the skills table to
+    # percentiles, search for a horse, then use the widgets on the other tabs. Tabs and
+    # expanders are rendered eagerly, so every rerun already builds the odds charts,
+    # skills tables and the other tabs' content. Yields a step name after each rerun.
+    at.run()
+    yield 'load'
+
+    course = _widget(at.selectbox, 'race_city')
+    if course is not None and len(course.options) > 1:
+        course.set_value(rng.choice(course.options[1:])).run()
+        yield 'pick course'
+
+    for _ in range(races_per_session):
+        # The race picker lists only the races not added yet
+        races = _widget(at.selectbox, 'race_add')
+        if races is None or not races.options:
+            break
+        races.set_value(rng.choice(races.options)).run()
+        yield 'select race'
+
+    toggles = [toggle for toggle in at.toggle if toggle.key and toggle.key.startswith('skills_percentiles_')]
+    if toggles:
+        rng.choice(toggles).set_value(True).run()
+        yield 'skills percentiles'
+
+    search = _widget(at.text_input, 'search_query')
+    if search is not None:
+        search.input(f"Horse {rng.randint(100001, 100050)}").run()
+        yield 'search'
+
+    # Preview tab (France): pick a course and race, then generate the missing previews
+    preview_city = _widget(at.selectbox, 'preview_city')
+    if preview_city is not None:
+        preview_city.set_value(rng.choice(preview_city.options)).run()
+        yield 'preview course'
+        generate = [button for button in at.button if button.label.startswith("Generate missing previews")]
+        if generate:
+            generate[0].click().run()
+            yield 'generate previews'
+
+    # Race history (UK): browse the last meeting day on the card and step back one meeting
+    history = [toggle for toggle in at.toggle if toggle.label == "Browse past meetings"]
+    if history:
+        history[0].set_value(True).run()
+        yield 'browse history'
+        _widget(at.date_input, 'history_date').set_value(history_date).run()
+        yield 'history date'
+        previous = [button for button in at.button if button.label == "Previous meeting"]
+        if previous:
+            previous[0].click().run()
+            yield 'previous meeting'
+
+
+def run_session(page, seed, races_per_session, history_date):
+    from streamlit.testing.v1 import AppTest
+
+    # Secrets are installed process-wide by share_process_globals
+    at = AppTest.from_file(os.path.join(ROOT, PAGES[page]), default_timeout=300)
+    rng = random.Random(seed)
+    latencies = []
+    errors = 0
+    steps = session_flow(at, rng, races_per_session, history_date)
+    while True:
+        started = time.perf_counter()
+        try:
+            next(steps)
+        except StopIteration:
+            break
+        latencies.append((time.perf_counter() - started) * 1000)
+        errors += len(at.exception)
+    return {'latencies': latencies, 'errors': errors}
+
+
+def run_level(page, concurrency, races_per_session, history_date):
+    # Scripts run on Streamlit's own threads, so CPU and memory are measured for the
+    # whole process and divided by the sessions: averages, not any one session's cost.
+    # The RSS delta also includes caches the level's first sessions fill for all of them.
+    rss_before = current_rss_mb()
+    cpu_before = time.process_time()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        sessions = list(pool.map(lambda i: run_session(page, i, races_per_session, history_date), range(concurrency)))
+    wall = time.perf_counter() - started
+    latencies = np.concatenate([session['latencies'] for session in sessions])
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        'page': page,
+        'sessions': concurrency,
+        'reruns': len(latencies),
+        'p50_ms': p50,
+        'p95_ms': p95,
+        'p99_ms': p99,
+        'process_cpu_s_avg': (time.process_time() - cpu_before) / concurrency,
+        'process_rss_delta_mb_avg': (current_rss_mb() - rss_before) / concurrency,
+        'rss_mb_total': current_rss_mb(),
+        'errors': sum(session['errors'] for session in sessions),
+        'wall_s': wall,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent headless session load test for the country pages")
+    parser.add_argument('--pages', nargs='+', default=list(PAGES), choices=list(PAGES))
+    parser.add_argument('--concurrency', nargs='+', type=int, default=[1, 2, 4, 8])
+    parser.add_argument('--races', type=int, default=3, help="races stacked up per session")
+    parser.add_argument('--days', type=int, default=2, help="days of synthetic card data")
+    parser.add_argument('--courses', type=int, default=4)
+    parser.add_argument('--ticks', type=int, default=24, help="odds ticks per runner")
+    args = parser.parse_args(argv)
+
+    os.chdir(ROOT)
+    # Real servers compile each page once, here every AppTest compiles its own copy and
+    # concurrent ast.parse calls (used by magic) are not thread safe on older Pythons
+    from streamlit import config
+    config.set_option('runner.magicEnabled', False)
+    card = synthetic_card(days=args.days, courses=args.courses)
+    install(card, ticks=args.ticks)
+    share_process_globals()
+    history_date = max(pd.Timestamp(row['race_date']) for row in card).date()
+
+    header = f"{'page':<5}{'sessions':>9}{'reruns':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'avg cpu s':>11}{'avg +rss MB':>12}{'rss MB':>8}{'errors':>7}"
+    print("avg cpu s and avg +rss MB: process CPU time and RSS growth over a level divided by its sessions,")
+    print("not measured per session. rss MB: the process total after the level.")
+    print(header)
+    for page in args.pages:
+        for concurrency in args.concurrency:
+            r = run_level(page, concurrency, args.races, history_date)
+            print(f"{r['page']:<5}{r['sessions']:>9}{r['reruns']:>8}{r['p50_ms']:>9.0f}{r['p95_ms']:>9.0f}{r['p99_ms']:>9.0f}"
+                  f"{r['process_cpu_s_avg']:>11.2f}{r['process_rss_delta_mb_avg']:>12.1f}{r['rss_mb_total']:>8.0f}{r['errors']:>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,118 +1,167 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-from supabase import create_client, Client
-from google.oauth2 import service_account
-from google.cloud import bigquery
-import plotly.express as px
+from racing.backends import connect_clients
+from racing.bq_budget import display_cost_report, run_query
+from racing.calibration import calibration_store, display_calibration, update_calibration
+from racing.charts import bar_figure, data_version, stamp_data_version
+from racing.export import display_export
+from racing.fetch import guarded, resilient
+from racing.form import add_form_columns, form_filter_settings
+from racing.frames import enable_copy_on_write, share_frame
+from racing.panels import CARD_COLUMN_CONFIG, numbered, race_frame, race_options, race_slot
+from racing.pools import display_pool_bets
+from racing.rollups import display_connections, rollup_store, update_rollups
+from racing.search import apply_search_jump, display_search, search_index
+from racing.staking import card_stakes, display_stakes, staking_settings
+from racing.versions import display_version_changes, prediction_versions, select_card_version
+
+# Cached frames are shared by every session, see racing.frames
+enable_copy_on_write()
 
 st.set_page_config(page_title="HK Horse Racing", page_icon="🇭🇰", layout="wide")
 st.logo("dg-logo.png")
+
+# Key of this page in the shared search index
+COUNTRY = 'hk'
+
+# Card table and the columns read from it
+HK_TABLE = 'hk_horse_racing_full'
+HK_COLUMNS = ('race_date', 'race_name', 'city', 'horse', 'jockey','odds', 'odds_predicted', 'horse_num', 'positive_hint', 'negative_hint', 'draw_norm', 'last_5_positions', 'odds_predicted_intial', 'winner_prob','trifecta_prob','quinella_prob','place_prob','last_place_prob', 'race_time_off')
+
 # Initialize clients (consider moving this to a separate function)
 @st.cache_resource
 def init_clients():
-    url = st.secrets["supabase_url"]
-    key = st.secrets["supabase_key"]
-    supabase: Client = create_client(url, key)
-    
-    credentials = service_account.Credentials.from_service_account_info(
-        st.secrets["gcp_service_account"]
-    )
-    bq_client = bigquery.Client(credentials=credentials)
-    
-    return supabase, bq_client
+    # Live Supabase/BigQuery, or a local snapshot when DG_SNAPSHOT is set
+    return connect_clients()
 
 supabase, bq_client = init_clients()
 
 # Fetch data from Supabase
-@st.cache_data(ttl=600)
+@resilient(COUNTRY, "Race data")
+@st.cache_resource(ttl=600)
 def get_data_hk():
-    try:
-        response_hk = supabase.table('hk_horse_racing_full').select('race_date', 'race_name', 'city', 'horse', 'jockey','odds', 'odds_predicted', 'horse_num', 'positive_hint', 'negative_hint', 'draw_norm', 'last_5_positions', 'odds_predicted_intial', 'winner_prob','trifecta_prob','quinella_prob','place_prob','last_place_prob', 'race_time_off').execute()
-        df = pd.DataFrame(response_hk.data)
-        df['race_date'] = pd.to_datetime(df['race_date'])
-        df.rename(columns={'horse': 'Horse', 'jockey': 'Jockey', 'odds_predicted': 'Odds predicted', 'horse_num': 'Horse number', 'odds': 'Initial market odds', 'positive_hint': 'Betting hint (+)', 
-                           'negative_hint': 'Betting hint (-)', 'last_5_positions': 'Last 5 races', 'draw_norm': 'Draw', 'odds_predicted_intial': 'Odds predicted (raw)',
-                           'winner_prob': 'Win probability','trifecta_prob': 'Top3 probability','quinella_prob': 'Top2 probability','last_place_prob': 'Last place probability'
-                            }, inplace=True)
-        return df
-    except Exception as e:
-        st.error(f"Error fetching data from Supabase: {e}")
-        return pd.DataFrame()
+    response_hk = guarded('supabase', HK_TABLE, supabase.table(HK_TABLE).select(*HK_COLUMNS).execute)
+    df = pd.DataFrame(response_hk.data)
+    df['race_date'] = pd.to_datetime(df['race_date'])
+    df.rename(columns={'horse': 'Horse', 'jockey': 'Jockey', 'odds_predicted': 'Odds predicted', 'horse_num': 'Horse number', 'odds': 'Initial market odds', 'positive_hint': 'Betting hint (+)', 
+                       'negative_hint': 'Betting hint (-)', 'last_5_positions': 'Last 5 races', 'draw_norm': 'Draw', 'odds_predicted_intial': 'Odds predicted (raw)',
+                       'winner_prob': 'Win probability','trifecta_prob': 'Top3 probability','quinella_prob': 'Top2 probability','last_place_prob': 'Last place probability'
+                        }, inplace=True)
+    # Parse the form strings once here so pages can sort and filter on them
+    return stamp_data_version(share_frame(add_form_columns(df)))
 
 # Fetch data from BigQuery
-@st.cache_data(ttl=600)
+@resilient(COUNTRY, "Performance metrics")
+@st.cache_resource(ttl=600)
 def get_bigquery_data():
     query = "SELECT * FROM `data-gaming-425312.hk_horse_data.hk_data__predictions_stats`"
-    try:
-        df = bq_client.query(query).to_dataframe()
-        df['race_date'] = pd.to_datetime(df['race_date'])
-        return df
-    except Exception as e:
-        st.error(f"Error fetching data from BigQuery: {e}")
-        return pd.DataFrame()
+    label = 'Performance Metrics: hk_data__predictions_stats'
+    df = guarded('bigquery', label, run_query, bq_client, query, COUNTRY, label)
+    df['race_date'] = pd.to_datetime(df['race_date'])
+    return stamp_data_version(share_frame(df))
+
+# Calibration aggregates, merged with newly landed results at most every 10 minutes
+@resilient(COUNTRY, "Calibration", default=lambda: calibration_store().get(COUNTRY))
+@st.cache_resource(ttl=600)
+def get_calibration():
+    return update_calibration(COUNTRY, supabase, HK_TABLE, bq_client)
+
+# Jockey and trainer rollups, merged with newly landed results at most every 10 minutes
+@resilient(COUNTRY, "Jockey and trainer records", default=lambda: rollup_store().get(COUNTRY))
+@st.cache_resource(ttl=600)
+def get_rollups():
+    return update_rollups(COUNTRY, supabase, HK_TABLE, bq_client)
 
+@st.fragment
 def display_race_data(df):
     st.subheader("Race Data")
+    if df.empty:
+        st.info("No race data available.")
+        return
+
+    # Predictions as of an earlier refresh, rebuilt from the changes stored since
+    df = select_card_version(COUNTRY, df)
+
+    # Version of the loaded card, used to key cached race slices
+    card_version = data_version(df)
+    
+    # Preselect a race picked from the search box
+    apply_search_jump(COUNTRY, card_version, df)
+    selected_city = st.selectbox("Select racecourse", ["All"] + list(df['city'].unique()), key='race_city')
+    
+    # Race labels are sorted by time off
+    races = race_options(selected_city, card_version, df)
+    # Stakes for the whole card, solved at once and cached until the card or the settings change
+    stakes = card_stakes(card_version, staking_settings(), df)
+    # Runners shown on the card tables, filtered and sorted on their parsed form
+    form_filter = form_filter_settings()
+
+    def display_panel(race, race_key):
+        display_race_panel(race, race_key, selected_city, card_version, df, stakes, form_filter)
+
+    def display_selection(selected):
+        if selected:
+            display_version_changes(COUNTRY, df, [races[race] for race in selected])
+            # Pool bets over the selected races, legs in race time order
+            display_pool_bets(COUNTRY, [(label, race_frame(races[label], card_version, df)) for label in selected])
+        # Export the races behind this filter, streamed to CSV or Parquet
+        display_export(COUNTRY, supabase, HK_TABLE, HK_COLUMNS, df, selected_city, [races[race] for race in selected])
+
+    # Selected races, each panel its own fragment
+    race_slot(0, races, display_panel, display_selection)
 
-    selected_city = st.selectbox("Select racecourse", ["All"] + list(df['city'].unique()))
+# Each race is its own fragment, widgets inside a panel only rerun that panel
+@st.fragment
+def display_race_panel(race, race_key, city, card_version, df, stakes, form_filter):
+    race_df = race_frame(race_key, card_version, df)
     
-    if selected_city != "All":
-        df = df[df['city'] == selected_city]
+    # Check if race_df is not empty before proceeding
+    if race_df.empty:
+        st.warning(f"No data found for race: {race}")
+        return
+        
+    # The cached race frame is shared between sessions, derive new columns instead of writing to it
+    race_df = race_df.assign(**{'Odds difference': np.absolute(race_df['Initial market odds'] - race_df['Odds predicted'])})
+    odds_diff = race_df['Odds difference'].sum().round(2)
+    race_df = race_df.assign(market_overround=1/race_df['Initial market odds'], our_overround=1/race_df['Odds predicted'])
+    market_ovr = (race_df['market_overround'].sum()).round(2)
+    our_ovr = race_df['our_overround'].sum().round(2)
     
-    # Create a sortable race name with time
-    df['race_name_with_time_off'] = df['race_time_off'] + " - " + df['race_name']
+    # Get the race details for the header
+    race_date = race_df['race_date'].iloc[0].strftime('%Y-%m-%d')
+    city = race_df['city'].iloc[0]
     
-    # Sort the unique race names by time
-    unique_races = sorted(df['race_name_with_time_off'].unique())
-    selected = st.multiselect("Select race name", unique_races)
+    st.markdown(f"### {race}")
+    st.markdown(f"**Date:** {race_date} | **City:** {city}")
     
-    if selected:
-        for race in selected:
-            # Extract just the race name part (after the time)
-            race_name = race.split(" - ", 1)[1]
-            race_df = df[df['race_name'] == race_name]
-            
-            # Check if race_df is not empty before proceeding
-            if race_df.empty:
-                st.warning(f"No data found for race: {race}")
-                continue
-                
-            race_df['Odds difference'] = np.absolute(race_df['Initial market odds'] - race_df['Odds predicted'])
-            odds_diff = race_df['Odds difference'].sum().round(2)
-            race_df['market_overround'] = 1/race_df['Initial market odds']
-            race_df['our_overround'] = 1/race_df['Odds predicted']
-            market_ovr = (race_df['market_overround'].sum()).round(2)
-            our_ovr = race_df['our_overround'].sum().round(2)
-            
-            # Get the race details for the header
-            race_date = race_df['race_date'].iloc[0].strftime('%Y-%m-%d')
-            city = race_df['city'].iloc[0]
-            
-            st.markdown(f"### {race}")
-            st.markdown(f"**Date:** {race_date} | **City:** {city}")
-            
-            # Display only horse, jockey, and odds
-            display_df = race_df[['Horse number', 'Horse', 'Jockey', 'Draw', 'Last 5 races', 'Initial market odds', 'Odds predicted', 'Odds predicted (raw)', 'Betting hint (+)', 'Betting hint (-)']].reset_index(drop=True)
-            display_df_prob = race_df[['Horse', 'Win probability', 'Top2 probability', 'Top3 probability', 'Last place probability']]
-            display_df.index += 1
-            display_df_prob.index += 1
-            st.dataframe(display_df, use_container_width=True)
-            st.dataframe(display_df_prob, use_container_width=True)
-            st.markdown("---")
-    else:
-        st.info("Please select at least one race name to display the data.")
+    # Display only horse, jockey, and odds
+    # Sent as column selections of the shared race frame, numbered from 1 without a reset_index copy
+    card_df = form_filter.apply(race_df)
+    if len(card_df) < len(race_df):
+        st.caption(f"{len(card_df)} of {len(race_df)} runners match the form filters.")
+    st.dataframe(numbered(card_df[['Horse number', 'Horse', 'Jockey', 'Draw', 'Last 5 races', 'Form avg position', 'Form wins', 'Form trend', 'Initial market odds', 'Odds predicted', 'Odds predicted (raw)', 'Betting hint (+)', 'Betting hint (-)']]), use_container_width=True, column_config=CARD_COLUMN_CONFIG)
+    # Suggested stakes next to the probabilities they are worked out from
+    prob_col, stake_col = st.columns([3, 2])
+    with prob_col:
+        st.dataframe(numbered(race_df[['Horse', 'Win probability', 'Top2 probability', 'Top3 probability', 'Last place probability']]), use_container_width=True)
+    with stake_col:
+        display_stakes(race_df, stakes)
+    # Career records are looked up per runner from the rollups, no history scan per race
+    with st.expander("SHOW JOCKEY & TRAINER RECORDS"):
+        display_connections(race_df, get_rollups())
+    st.markdown("---")
 
 def plot_accuracy(df):
     st.subheader("Accuracy metric")
     st.markdown("Accuracy over time metric - in other words, how well our model is predicting the top 3 finishers in each race. It is NOT the accuracy of the odds or overall accuracy of the model.")
-    fig = px.bar(df, x='race_date', y='avg_acc_top3', title='Average Accuracy (Top 3)', labels={'avg_acc_top3': 'Accuracy', 'race_date': 'Date'})
+    fig = bar_figure(df, 'avg_acc_top3', 'Average Accuracy (Top 3)', 'Accuracy')
     st.plotly_chart(fig, use_container_width=True)
 
 def plot_earnings(df):
     st.subheader("Cumulative Earnings")
     st.markdown("This chart illustrates the earnings that would have resulted from betting $10 on the top 1 finisher in each race, using the closing odds to determine the payout. The chart shows the total amount of money that would have been earned if this strategy had been employed.")
-    fig = px.bar(df, x='race_date', y='money_earned_top1', title='Cumulative Sum Earned (Top 1)', labels={'money_earned_top1': 'Earnings over time in $', 'race_date': 'Date'})
+    fig = bar_figure(df, 'money_earned_top1', 'Cumulative Sum Earned (Top 1)', 'Earnings over time in $')
     st.plotly_chart(fig, use_container_width=True)
 
 def main():
@@ -123,6 +172,11 @@ def main():
     with tab1:
         # st.subheader("Work in progress")
         race_data = get_data_hk()
+        # Index this card for the search box (no-op unless the card changed)
+        search_index().update(COUNTRY, data_version(race_data), race_data)
+        # Keep this refresh as a version for the "as of" selector (no-op unless the card changed)
+        prediction_versions().update(COUNTRY, data_version(race_data), race_data)
+        display_search(COUNTRY)
         display_race_data(race_data)
     with tab2:
         # st.subheader("Work in progress")
@@ -133,6 +187,8 @@ def main():
             plot_accuracy(bq_data)
         with col2:
             plot_earnings(bq_data)
+        display_calibration(get_calibration())
+        display_cost_report()
 
 if __name__ == "__main__":
     main()
@@ -1,85 +1,131 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-from supabase import create_client, Client
-from google.oauth2 import service_account
-from google.cloud import bigquery
-import plotly.express as px
+from racing.backends import connect_clients
+from racing.bq_budget import display_cost_report, run_query
+from racing.calibration import calibration_store, display_calibration, update_calibration
+from racing.charts import bar_figure, data_version, odds_figure, stamp_data_version
+from racing.export import display_export
+from racing.fetch import guarded, resilient
+from racing.form import add_form_columns, form_filter_settings
+from racing.frames import enable_copy_on_write, share_frame
+from racing.history import adjacent_meeting, fetch_meeting_rows, iter_row_pages, meeting_courses
+from racing.odds_analytics import biggest_movers, odds_feature_table
+from racing.panels import CARD_COLUMN_CONFIG, numbered, race_frame, race_odds_frame, race_options, race_slot
+from racing.percentiles import PercentileRanks
+from racing.pools import display_pool_bets
+from racing.rollups import display_connections, rollup_store, update_rollups
+from racing.search import apply_search_jump, display_search, search_index
+from racing.staking import card_stakes, display_stakes, staking_settings
+from racing.versions import display_version_changes, prediction_versions, select_card_version
+
+# Cached frames are shared by every session, see racing.frames
+enable_copy_on_write()
 
 st.set_page_config(page_title="UK Horse Racing", page_icon="🇬🇧", layout="wide")
 st.logo("dg-logo.png")
 
+# Key of this page in the shared search index
+COUNTRY = 'uk'
+
 # Initialize clients (consider moving this to a separate function)
 @st.cache_resource
 def init_clients():
-    url = st.secrets["supabase_url"]
-    key = st.secrets["supabase_key"]
-    supabase: Client = create_client(url, key)
-    
-    credentials = service_account.Credentials.from_service_account_info(
-        st.secrets["gcp_service_account"]
-    )
-    bq_client = bigquery.Client(credentials=credentials)
-    
-    return supabase, bq_client
+    # Live Supabase/BigQuery, or a local snapshot when DG_SNAPSHOT is set
+    return connect_clients()
 
 supabase, bq_client = init_clients()
 
+UK_TABLE = 'uk_horse_racing_full'
+UK_COLUMNS = (
+    'race_date', 'race_id', 'horse_id', 'race_name', 'city', 'horse', 'jockey',
+    'odds', 'odds_predicted', 'horse_num', 'positive_hint', 'draw_norm',
+    'last_5_positions', 'odds_predicted_intial', 'winner_prob', 'trifecta_prob',
+    'quinella_prob', 'place_prob', 'last_place_prob',
+    'horse_form_score', 'horse_form_score_diff',
+    'horse_potential_skill_score', 'horse_potential_skill_score_diff', 
+    'horse_fitness_score', 'horse_fitness_score_diff',
+    'horse_enthusiasm_score', 'horse_enthusiasm_score_diff',
+    'horse_jumping_skill_score', 'horse_jumping_skill_score_diff',
+    'horse_going_skill_score', 'horse_going_skill_score_diff',
+    'horse_distance_skill_score', 'horse_distance_skill_score_diff',
+    'jockey_skill_score', 'jockey_skill_score_diff',
+    'trainer_skill_score', 'trainer_skill_score_diff',
+    'using_sire_stats', 'race_time_off'
+)
+
+# Recently viewed past meetings kept per process (least recently used are evicted first)
+MAX_CACHED_MEETINGS = 32
+
+def prepare_uk_frame(rows):
+    df = pd.DataFrame(rows)
+    
+    df['race_date'] = pd.to_datetime(df['race_date'])
+    df.rename(columns={'horse': 'Horse', 'jockey': 'Jockey', 'odds_predicted': 'Odds predicted', 'horse_num': 'Horse number', 'odds': 'Initial market odds', 'positive_hint': 'Betting hint', 
+                        'last_5_positions': 'Last 5 races', 'draw_norm': 'Draw', 'odds_predicted_intial': 'Odds predicted (raw)',
+                       'winner_prob': 'Win probability','trifecta_prob': 'Top3 probability','quinella_prob': 'Top2 probability','last_place_prob': 'Last place probability'
+                        }, inplace=True)
+    # Parse the form strings once here so pages can sort and filter on them
+    return stamp_data_version(share_frame(add_form_columns(df)))
+
 # Fetch data from Supabase
-@st.cache_data(ttl=600)
+@resilient(COUNTRY, "Race data")
+@st.cache_resource(ttl=600)
 def get_data_uk():
-    try:
-        response_gb = supabase.table('uk_horse_racing_full').select(
-            'race_date', 'race_id', 'horse_id', 'race_name', 'city', 'horse', 'jockey',
-            'odds', 'odds_predicted', 'horse_num', 'positive_hint', 'draw_norm',
-            'last_5_positions', 'odds_predicted_intial', 'winner_prob', 'trifecta_prob',
-            'quinella_prob', 'place_prob', 'last_place_prob',
-            'horse_form_score', 'horse_form_score_diff',
-            'horse_potential_skill_score', 'horse_potential_skill_score_diff', 
-            'horse_fitness_score', 'horse_fitness_score_diff',
-            'horse_enthusiasm_score', 'horse_enthusiasm_score_diff',
-            'horse_jumping_skill_score', 'horse_jumping_skill_score_diff',
-            'horse_going_skill_score', 'horse_going_skill_score_diff',
-            'horse_distance_skill_score', 'horse_distance_skill_score_diff',
-            'jockey_skill_score', 'jockey_skill_score_diff',
-            'trainer_skill_score', 'trainer_skill_score_diff',
-            'using_sire_stats', 'race_time_off'
-        ).execute()
-        
-        df = pd.DataFrame(response_gb.data)
-        
-        df['race_date'] = pd.to_datetime(df['race_date'])
-        df.rename(columns={'horse': 'Horse', 'jockey': 'Jockey', 'odds_predicted': 'Odds predicted', 'horse_num': 'Horse number', 'odds': 'Initial market odds', 'positive_hint': 'Betting hint', 
-                            'last_5_positions': 'Last 5 races', 'draw_norm': 'Draw', 'odds_predicted_intial': 'Odds predicted (raw)',
-                           'winner_prob': 'Win probability','trifecta_prob': 'Top3 probability','quinella_prob': 'Top2 probability','last_place_prob': 'Last place probability'
-                            }, inplace=True)
-        return df
-        
-    except Exception as e:
-        st.error(f"Error fetching data from Supabase: {str(e)}")
-        return pd.DataFrame()
+    response_gb = guarded('supabase', UK_TABLE, supabase.table(UK_TABLE).select(*UK_COLUMNS).execute)
+    return prepare_uk_frame(response_gb.data)
+
+# Past meetings are immutable, so they are kept for longer and fetched one meeting at a time
+@resilient(COUNTRY, "Meeting")
+@st.cache_resource(ttl=6 * 3600, max_entries=MAX_CACHED_MEETINGS)
+def get_meeting_uk(race_date, city):
+    rows = guarded('supabase', UK_TABLE, fetch_meeting_rows, supabase, UK_TABLE, UK_COLUMNS, race_date, city)
+    return prepare_uk_frame(rows) if rows else pd.DataFrame()
+
+@resilient(COUNTRY, "Meetings", default=list)
+@st.cache_data(ttl=6 * 3600, max_entries=MAX_CACHED_MEETINGS)
+def get_meeting_courses_uk(race_date):
+    return guarded('supabase', UK_TABLE, meeting_courses, supabase, UK_TABLE, race_date)
 
 # Fetch data from BigQuery
-@st.cache_data(ttl=600)
+@resilient(COUNTRY, "Performance metrics")
+@st.cache_resource(ttl=600)
 def get_bigquery_data():
     query = "SELECT * FROM `data-gaming-425312.gb_horse_data.gb_data__predictions_stats`"
-    try:
-        df = bq_client.query(query).to_dataframe()
-        df['race_date'] = pd.to_datetime(df['race_date'])
-        return df
-    except Exception as e:
-        st.error(f"Error fetching data from BigQuery: {e}")
-        return pd.DataFrame()
+    label = 'Performance Metrics: gb_data__predictions_stats'
+    df = guarded('bigquery', label, run_query, bq_client, query, COUNTRY, label)
+    df['race_date'] = pd.to_datetime(df['race_date'])
+    return stamp_data_version(share_frame(df))
 
-@st.cache_data(ttl=600)
+@resilient(COUNTRY, "Odds data")
+@st.cache_resource(ttl=600)
 def get_bigquery_odds_data():
-    try:
-        query = "SELECT * FROM `data-gaming-425312.gb_horse_data.gb_horse_odds`"
-        df = bq_client.query(query).to_dataframe()
-        return df
-    except Exception as e:
-        st.error(f"Error fetching data from BigQuery: {e}")
-        return pd.DataFrame()
+    query = "SELECT * FROM `data-gaming-425312.gb_horse_data.gb_horse_odds`"
+    label = 'Race Data: gb_horse_odds'
+    df = guarded('bigquery', label, run_query, bq_client, query, COUNTRY, label)
+    return stamp_data_version(share_frame(df))
+
+# Calibration aggregates, merged with newly landed results at most every 10 minutes
+@resilient(COUNTRY, "Calibration", default=lambda: calibration_store().get(COUNTRY))
+@st.cache_resource(ttl=600)
+def get_calibration():
+    return update_calibration(COUNTRY, supabase, UK_TABLE, bq_client)
+
+# Jockey and trainer rollups, merged with newly landed results at most every 10 minutes
+@resilient(COUNTRY, "Jockey and trainer records", default=lambda: rollup_store().get(COUNTRY))
+@st.cache_resource(ttl=600)
+def get_rollups():
+    return update_rollups(COUNTRY, supabase, UK_TABLE, bq_client)
+
+# Population the skills percentiles rank against: every runner in the card table, walked
+# by row key on first use and again daily. Races shown are merged in by runner key, so
+# the population does not depend on what was browsed.
+@resilient(COUNTRY, "Percentile population", default=lambda: PercentileRanks(STAT_COLUMNS))
+@st.cache_resource(ttl=24 * 3600, show_spinner="Ranking every runner on record...")
+def get_percentile_ranks():
+    ranks = PercentileRanks(STAT_COLUMNS)
+    guarded('supabase', UK_TABLE, lambda: ranks.load(iter_row_pages(supabase, UK_TABLE, ('race_id', 'horse_id') + STAT_COLUMNS)))
+    return ranks
 
 # Define stats at module level
 STATS = [
@@ -93,6 +139,15 @@ STATS = [
     ('jockey_skill_score', 'jockey_skill_score_diff'),
     ('trainer_skill_score', 'trainer_skill_score_diff')
 ]
+STAT_COLUMNS = tuple(stat for stat, _ in STATS)
+SKILL_LABELS = {
+    'horse_form_score': 'FORM', 'horse_potential_skill_score': 'POTENTIAL', 'horse_fitness_score': 'FITNESS',
+    'horse_enthusiasm_score': 'ENTHUSIASM', 'horse_jumping_skill_score': 'JUMPING', 'horse_going_skill_score': 'GOING',
+    'horse_distance_skill_score': 'DISTANCE', 'jockey_skill_score': 'JOCKEY', 'trainer_skill_score': 'TRAINER',
+}
+
+# Markers for the sign of each score's _diff column (lower is green, higher is red)
+DIFF_MARKERS = {'down': '🟢', 'up': '🔴'}
 
 # Helper function to get position suffix (1st, 2nd, 3rd, etc.)
 def get_position_suffix(position):
@@ -103,248 +158,250 @@ def get_position_suffix(position):
     return suffix
 
 def create_computeform_table(race_df):
-    # Create a new dataframe for display
-    display_data = []
-    
-    for _, horse in race_df.iterrows():
-        row = {'Horse': horse['Horse']}
-        
-        # Add sire stats indicator
-        # Add a symbol to the horse name if using sire stats
-        horse_name = horse['Horse']
-        if horse['using_sire_stats']:
-            horse_name = f"{horse_name} 🧬"  # DNA emoji to indicate sire stats usage
-        row['Horse'] = horse_name
-        
-        # Calculate total score
-        total_score = sum(horse[stat[0]] for stat in STATS)
-        
-        if total_score < 10:
-            row['COMPUTE'] = "Not enough data"
-            for stat, _ in STATS:
-                row[stat] = None
-            display_data.append(row)
-            continue
-            
-        # Process each stat
-        for stat, _ in STATS:
-            row[stat] = int(round(horse[stat]))
-        
-        row['COMPUTE'] = int(round(total_score))
-        display_data.append(row)
-    
-    # Convert to dataframe and sort
-    result_df = pd.DataFrame(display_data)
+    # Built column-wise, so the table is sent as an Arrow batch with no Styler. Scores stay
+    # numeric so the columns sort by value, each is followed by a green/red marker column
+    # from the sign of its _diff. Runners without enough data are left blank.
+    scores = race_df[[stat for stat, _ in STATS]]
+    total_score = scores.sum(axis=1)
+    enough_data = total_score >= 10
     
-    # Sort by COMPUTE, handling "Not enough data"
-    result_df['sort_value'] = pd.to_numeric(result_df['COMPUTE'], errors='coerce')
-    result_df = result_df.sort_values('sort_value', ascending=False)
-    result_df = result_df.drop('sort_value', axis=1)
+    # Add a symbol to the horse name if using sire stats
+    sire_stats = race_df['using_sire_stats'].fillna(False).astype(bool)
+    result_df = pd.DataFrame({'Horse': race_df['Horse'].where(~sire_stats, race_df['Horse'] + ' 🧬')})
+    for stat, diff in STATS:
+        shown = enough_data & scores[stat].notna()
+        marker = np.select([race_df[diff] < 0, race_df[diff] > 0], [DIFF_MARKERS['down'], DIFF_MARKERS['up']], '')
+        result_df[stat] = scores[stat].round().where(shown)
+        result_df[f'{stat}_sign'] = pd.Series(marker, index=race_df.index).where(shown, '')
+    result_df['COMPUTE'] = total_score.round().where(enough_data)
     
-    # Create a function to apply styles
-    def apply_styles(col):
-        if col.name not in [stat[0] for stat in STATS]:
-            return [''] * len(col)
-            
-        styles = []
-        for idx, value in col.items():
-            # If value is None, use default background
-            if pd.isna(value):
-                styles.append('')
-                continue
-                
-            horse_name = result_df.loc[idx, 'Horse'].split(' 🧬')[0]  # Remove emoji for matching
-            horse_idx = race_df[race_df['Horse'] == horse_name].index[0]
-            
-            diff = race_df.loc[horse_idx, f"{col.name}_diff"]
-            if diff < 0:
-                styles.append('background-color: #d4edda; color: #155724')
-            elif diff > 0:
-                styles.append('background-color: #f8d7da; color: #721c24')
-            else:
-                styles.append('')  # Changed: No background color for unchanged values
-        return styles
+    # Sort by COMPUTE, runners without enough data last
+    order = total_score.where(enough_data).sort_values(ascending=False, na_position='last').index
+    return result_df.loc[order]
+
+def create_percentile_table(race_df, version):
+    # Percentile of each score among every UK runner on record (100 = best)
+    ranks = get_percentile_ranks()
+    ranks.update(version, race_df)
+    percentile_df = ranks.frame(race_df).round(0)
+    percentile_df.insert(0, 'Horse', race_df['Horse'])
+    percentile_df['sort_value'] = race_df[list(STAT_COLUMNS)].sum(axis=1)
+    return percentile_df.sort_values('sort_value', ascending=False).drop('sort_value', axis=1)
+
+@st.fragment
+def display_race_data(df, odds_df, live=True):
+    st.subheader("Race Data")
+    if df.empty:
+        st.info("No race data available.")
+        return
     
-    # Apply styling
-    styled_df = result_df.style.apply(apply_styles)
+    # Predictions as of an earlier refresh, rebuilt from the changes stored since.
+    # Versions are of the live card, a past meeting from the history browser has none.
+    if live:
+        df = select_card_version(COUNTRY, df)
+
+    # Version of the loaded card + odds, used to key cached figures and race slices
+    card_version = data_version(df)
+    odds_version = f"{card_version}-{data_version(odds_df)}"
     
-    # Format numbers as integers, skip non-numeric
-    number_format = {stat[0]: '{:,.0f}' for stat in STATS}
-    number_format['COMPUTE'] = lambda x: '{:,.0f}'.format(x) if isinstance(x, (int, float)) else x
-    styled_df = styled_df.format(number_format)
+    # Preselect a race picked from the search box
+    apply_search_jump(COUNTRY, card_version, df)
+    selected_city = st.selectbox("Select racecourse", ["All"] + list(df['city'].unique()), key='race_city')
     
-    return styled_df
+    # Race labels are sorted by time off
+    races = race_options(selected_city, card_version, df)
+    # Stakes for the whole card, solved at once and cached until the card or the settings change
+    stakes = card_stakes(card_version, staking_settings(), df)
+    # Runners shown on the card tables, filtered and sorted on their parsed form
+    form_filter = form_filter_settings()
 
-def display_race_data(df, odds_df):
-    st.subheader("Race Data")
+    def display_panel(race_with_time, race_key):
+        display_race_panel(race_with_time, race_key, selected_city, card_version, odds_version, df, odds_df, stakes, form_filter)
+
+    def display_selection(selected):
+        if selected:
+            display_version_changes(COUNTRY, df, [races[race_with_time] for race_with_time in selected])
+            # Pool bets over the selected races, legs in race time order
+            display_pool_bets(COUNTRY, [(label, race_frame(races[label], card_version, df)) for label in selected])
+        # Export the races behind this filter with their odds ticks and computeform scores, streamed to CSV or Parquet
+        display_export(COUNTRY, supabase, UK_TABLE, UK_COLUMNS, df, selected_city, [races[race_with_time] for race_with_time in selected], odds_df)
+
+    # Selected races, each panel its own fragment
+    race_slot(0, races, display_panel, display_selection)
+
+# Each race is its own fragment, widgets inside a panel only rerun that panel
+@st.fragment
+def display_race_panel(race_with_time, race_key, city, card_version, odds_version, df, odds_df, stakes, form_filter):
+    st.markdown(f"### {race_with_time}")
+    race_name = race_key[2]
+    race_df = race_frame(race_key, card_version, df)
     
-    selected_city = st.selectbox("Select racecourse", ["All"] + list(df['city'].unique()))
+    # Get the race_id for this race
+    race_id = race_df['race_id'].iloc[0]
     
-    if selected_city != "All":
-        df = df[df['city'] == selected_city]
+    # Odds data for this race, joined on horse_id
+    race_odds_df = race_odds_frame(race_id, odds_version, race_df, odds_df)
     
-    # Create a sortable race name with time
-    df['race_name_with_time_off'] = df['race_time_off'] + " - " + df['race_name']
+    # Display race details
+    race_date = race_df['race_date'].iloc[0].strftime('%Y-%m-%d')
+    city = race_df['city'].iloc[0]
+    st.markdown(f"**Date:** {race_date} | **City:** {city}")
     
-    # Sort the unique race names by time
-    unique_races = sorted(df['race_name_with_time_off'].unique())
-    selected = st.multiselect("Select race name", unique_races)
+    # Display main race data, a column selection of the shared race frame numbered from 1 (no reset_index copy)
+    card_df = form_filter.apply(race_df)
+    if len(card_df) < len(race_df):
+        st.caption(f"{len(card_df)} of {len(race_df)} runners match the form filters.")
+    st.dataframe(numbered(card_df[['Horse number', 'Horse', 'Jockey', 'Draw', 'Last 5 races', 'Form avg position', 'Form wins', 'Form trend', 
+                                   'Initial market odds', 'Odds predicted', 'Odds predicted (raw)', 
+                                   'Betting hint']]),
+                 use_container_width=True, column_config=CARD_COLUMN_CONFIG)
     
-    if selected:
-        for race_with_time in selected:
-            st.markdown(f"### {race_with_time}")
-            # Extract the original race name (everything after " - ")
-            race_name = race_with_time.split(" - ")[1]
-            race_df = df[df['race_name'] == race_name]
-            
-            # Get the race_id for this race
-            race_id = race_df['race_id'].iloc[0]
-            
-            # Filter odds data for this race
-            race_odds_df = odds_df[odds_df['race_id'] == race_id]
-            #join the two dataframes on horse_id
-            race_odds_df = race_odds_df.rename(columns={'horse_link': 'horse_id'})
-            race_odds_df = pd.merge(race_odds_df, race_df, on=['horse_id', 'race_id'], how='left')
-            
-            # Display race details
-            race_date = race_df['race_date'].iloc[0].strftime('%Y-%m-%d')
-            city = race_df['city'].iloc[0]
-            st.markdown(f"**Date:** {race_date} | **City:** {city}")
-            
-            # Display main race data
-            display_df = race_df[['Horse number', 'Horse', 'Jockey', 'Draw', 'Last 5 races', 
-                                'Initial market odds', 'Odds predicted', 'Odds predicted (raw)', 
-                                'Betting hint']].reset_index(drop=True)
-            display_df.index += 1
-            st.dataframe(display_df, use_container_width=True)
-            
-            # Display probability data
-            display_df_prob = race_df[['Horse', 'Win probability', 'Top2 probability', 
-                                     'Top3 probability', 'Last place probability']]
-            
-            # Create a copy to avoid modifying the original dataframe
-            display_df_prob = display_df_prob.copy()
-            
-            # Sort by win probability (descending) to determine predicted positions
-            sorted_horses = display_df_prob.sort_values('Win probability', ascending=False)
-            
-            # Create a mapping of horse to predicted position (as integer)
-            position_map = {horse: i+1 for i, horse in enumerate(sorted_horses['Horse'])}
-            
-            # Add the predicted position column to the original dataframe
-            display_df_prob['Predicted Position'] = display_df_prob['Horse'].map(position_map)
-            
-            # Reorder columns to have Predicted Position as the second column
-            display_df_prob = display_df_prob[[ 'Predicted Position', 'Horse', 'Win probability', 
-                                             'Top2 probability', 'Top3 probability', 'Last place probability']]
-            
-            # Reset the index for display
-            display_df_prob.index += 1
-            
-            # Display the dataframe with the new column
-            st.dataframe(display_df_prob, use_container_width=True)
-            
-            # Move the chart creation inside the race loop
-            if not race_odds_df.empty:
-                # Randomly select 6 horses to display initially
-                import random
-                all_horses = race_odds_df['Horse'].unique()
-                initial_horses = random.sample(list(all_horses), min(6, len(all_horses)))  # Added min() to handle races with fewer than 6 horses
-                
-                fig = px.line(
-                    race_odds_df,
-                    x='scraped_time',
-                    y='odds',
-                    color='Horse',
-                    labels={
-                        'scraped_time': 'Time',
-                        'odds': 'Odds',
-                        'Horse': 'Horse'
+    # Display probability data, with the predicted position as the rank by win probability
+    display_df_prob = race_df[['Horse', 'Win probability', 'Top2 probability', 
+                               'Top3 probability', 'Last place probability']]
+    display_df_prob.insert(0, 'Predicted Position', race_df['Win probability'].rank(ascending=False, method='first').astype('Int64'))
+    # Suggested stakes next to the probabilities they are worked out from
+    prob_col, stake_col = st.columns([3, 2])
+    with prob_col:
+        st.dataframe(numbered(display_df_prob), use_container_width=True, column_config=CARD_COLUMN_CONFIG)
+    with stake_col:
+        display_stakes(race_df, stakes)
+    
+    # Move the chart creation inside the race loop
+    if not race_odds_df.empty:
+        # Cached per race and data version, reruns only deserialise the finished figure
+        fig = odds_figure(race_id, odds_version, race_name, race_odds_df, race_df)
+        # Create computeform table in an expander
+        with st.expander("SHOW ODDS MOVEMENT"):
+            st.plotly_chart(fig, use_container_width=True)
+        with st.expander("SHOW SKILLS DATA"):
+            # Percentiles come from the shared rank structure, no history scan per render
+            if st.toggle("Show as percentiles of all runners", key=f"skills_percentiles_{race_id}"):
+                st.dataframe(
+                    create_percentile_table(race_df, f"{card_version}-{race_id}"),
+                    use_container_width=True,
+                    column_config={
+                        'Horse': st.column_config.TextColumn('Horse', width='medium'),
+                        **{stat: st.column_config.ProgressColumn(label, width='small', min_value=0, max_value=100, format='%d')
+                           for stat, label in SKILL_LABELS.items()},
                     },
-                    title=f'Odds Movement - {race_name}',  # Added race name to title for clarity
-                    log_y=True
-                )
-                
-                # Add markers (dots) to the lines
-                fig.update_traces(
-                    mode='lines+markers',
-                    marker=dict(size=6),
-                    line=dict(width=2)
+                    hide_index=True
                 )
-                
-                # Customize the layout
-                fig.update_layout(
-                    xaxis_title="Time",
-                    yaxis_title="Odds",
-                    legend_title="Horses",
-                    height=450,
-                    yaxis={
-                        'autorange': 'reversed',
-                        'type': 'log',
-                        'gridwidth': 0.5,
-                        'gridcolor': 'rgba(128, 128, 128, 0.2)',
-                    },
-                    xaxis={
-                        'gridwidth': 0.5,
-                        'gridcolor': 'rgba(128, 128, 128, 0.2)',
+            else:
+                computeform_df = create_computeform_table(race_df)
+                st.caption("🟢 negative / 🔴 positive score difference. Blank scores: not enough data.")
+                st.dataframe(
+                    computeform_df,
+                    use_container_width=True,
+                    column_config={
+                        'Horse': st.column_config.TextColumn('Horse', width='medium', help="🧬 indicates sire stats are being used"),
+                        'horse_form_score': st.column_config.NumberColumn('FORM', width='small', format='%d', help="Form score"),
+                        'horse_potential_skill_score': st.column_config.NumberColumn('POTENTIAL', width='small', format='%d', help="Potential skill score"),
+                        'horse_fitness_score': st.column_config.NumberColumn('FITNESS', width='small', format='%d', help="Fitness score"),
+                        'horse_enthusiasm_score': st.column_config.NumberColumn('ENTHUSIASM', width='small', format='%d', help="Enthusiasm score"),
+                        'horse_jumping_skill_score': st.column_config.NumberColumn('JUMPING', width='small', format='%d', help="Jumping skill score"),
+                        'horse_going_skill_score': st.column_config.NumberColumn('GOING', width='small', format='%d', help="Going skill score"),
+                        'horse_distance_skill_score': st.column_config.NumberColumn('DISTANCE', width='small', format='%d', help="Distance skill score"),
+                        'jockey_skill_score': st.column_config.NumberColumn('JOCKEY', width='small', format='%d', help="Jockey skill score"),
+                        'trainer_skill_score': st.column_config.NumberColumn('TRAINER', width='small', format='%d', help="Trainer skill score"),
+                        **{f'{stat}_sign': st.column_config.TextColumn('±', width='small', help=f"Sign of the {SKILL_LABELS[stat].lower()} score difference")
+                           for stat in STAT_COLUMNS},
+                        'COMPUTE': st.column_config.NumberColumn('DG SCORE', width='small', format='%d', help="Final computed score, blank when there is not enough data"),
                     },
-                    plot_bgcolor='rgba(0,0,0,0)',
-                    paper_bgcolor='rgba(0,0,0,0)',
-                    font=dict(size=12),
-                    legend=dict(
-                        yanchor="top",
-                        y=0.99,
-                        xanchor="left",
-                        x=1.02,
-                        itemsizing='constant'
-                    )
+                    hide_index=True
                 )
-                
-                # Add horse names to legend and hide non-selected horses
-                horse_names = race_df.set_index('horse_id')['Horse'].to_dict()
-                for trace in fig.data:
-                    horse_name = horse_names.get(trace.name, trace.name)
-                    trace.update(
-                        name=horse_name,
-                        visible='legendonly' if horse_name not in initial_horses else True
-                    )
-                # Create computeform table in an expander
-                with st.expander("SHOW ODDS MOVEMENT"):
-                    st.plotly_chart(fig, use_container_width=True)
-                with st.expander("SHOW SKILLS DATA"):
-                    computeform_df = create_computeform_table(race_df)
-                    st.dataframe(
-                        computeform_df,
-                        use_container_width=True,
-                        column_config={
-                            'Horse': st.column_config.TextColumn('Horse', width='medium', help="🧬 indicates sire stats are being used"),
-                            'horse_form_score': st.column_config.NumberColumn('FORM', width='small', help="Form score", format='%d'),
-                            'horse_potential_skill_score': st.column_config.NumberColumn('POTENTIAL', width='small', help="Potential skill score", format='%d'),
-                            'horse_fitness_score': st.column_config.NumberColumn('FITNESS', width='small', help="Fitness score", format='%d'),
-                            'horse_enthusiasm_score': st.column_config.NumberColumn('ENTHUSIASM', width='small', help="Enthusiasm score", format='%d'),
-                            'horse_jumping_skill_score': st.column_config.NumberColumn('JUMPING', width='small', help="Jumping skill score", format='%d'),
-                            'horse_going_skill_score': st.column_config.NumberColumn('GOING', width='small', help="Going skill score", format='%d'),
-                            'horse_distance_skill_score': st.column_config.NumberColumn('DISTANCE', width='small', help="Distance skill score", format='%d'),
-                            'jockey_skill_score': st.column_config.NumberColumn('JOCKEY', width='small', help="Jockey skill score", format='%d'),
-                            'trainer_skill_score': st.column_config.NumberColumn('TRAINER', width='small', help="Trainer skill score", format='%d'),
-                            'COMPUTE': st.column_config.NumberColumn('DG SCORE', width='small', help="Final computed score", format='%d'),
-                        },
-                        hide_index=True
-                    )
-            st.markdown("---")  # Add a separator between races
-    else:
-        st.info("Please select at least one race name to display the data.")
+    # Career records are looked up per runner from the rollups, no history scan per race
+    with st.expander("SHOW JOCKEY & TRAINER RECORDS"):
+        display_connections(race_df, get_rollups())
+    st.markdown("---")  # Add a separator between races
+
+# Move the history browser to the previous/next meeting at the selected course
+def step_meeting(forward):
+    meeting = get_meeting_uk(st.session_state['history_date'].isoformat(), st.session_state['history_city'])
+    if meeting.empty:
+        return
+    race_ids = meeting['race_id']
+    cursor = race_ids.max() if forward else race_ids.min()
+    try:
+        target = guarded('supabase', UK_TABLE, adjacent_meeting, supabase, UK_TABLE,
+                         st.session_state['history_date'].isoformat(), cursor,
+                         city=st.session_state['history_city'], forward=forward)
+    except Exception as e:
+        st.error(f"Error fetching meetings from Supabase: {str(e)}")
+        return
+    if target is None:
+        st.toast("No more meetings at this racecourse.")
+        return
+    st.session_state['history_date'] = pd.to_datetime(target[0]).date()
+    st.session_state['history_city'] = target[1]
+
+def display_history(odds_df):
+    st.subheader("Race History")
+    
+    if 'history_date' not in st.session_state:
+        st.session_state['history_date'] = (pd.Timestamp.today() - pd.Timedelta(days=1)).date()
+    race_date = st.date_input("Meeting date", key='history_date')
+    courses = get_meeting_courses_uk(race_date.isoformat())
+    if not courses:
+        st.info("No meetings found on this date.")
+        return
+    if st.session_state.get('history_city') not in courses:
+        st.session_state['history_city'] = courses[0]
+    st.selectbox("Select racecourse", courses, key='history_city')
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        st.button("Previous meeting", on_click=step_meeting, args=(False,), use_container_width=True)
+    with col2:
+        st.button("Next meeting", on_click=step_meeting, args=(True,), use_container_width=True)
+    
+    meeting = get_meeting_uk(race_date.isoformat(), st.session_state['history_city'])
+    if meeting.empty:
+        st.info("No races found for this meeting.")
+        return
+    display_race_data(meeting, odds_df, live=False)
+
+def display_market_movers(df, odds_df):
+    st.subheader("Biggest Market Movers")
+    st.markdown("Runners whose market price moved most since our first odds scrape. Steamers are shortening (backed), drifters are lengthening. The slope is the average move per minute over the last 30 minutes.")
+    if df.empty or odds_df.empty:
+        st.info("No odds data available.")
+        return
+    
+    # Per-runner features for the whole card, cached until the card or odds refresh
+    features = odds_feature_table(f"{data_version(df)}-{data_version(odds_df)}", odds_df, df)
+    steamers, drifters = biggest_movers(features, df)
+    
+    columns = {'race_time_off': 'Off', 'city': 'City', 'race_name': 'Race', 'Horse': 'Horse',
+               'opening_odds': 'Opening odds', 'latest_odds': 'Latest odds', 'pct_move': 'Move %',
+               'slope_pct_per_min': 'Recent slope %/min', 'volatility': 'Volatility',
+               'odds_predicted': 'Odds predicted', 'largest_gap_pct': 'Largest gap to prediction %'}
+    column_config = {
+        'Move %': st.column_config.NumberColumn(format='%.1f'),
+        'Recent slope %/min': st.column_config.NumberColumn(format='%.2f'),
+        'Volatility': st.column_config.NumberColumn(format='%.3f'),
+        'Largest gap to prediction %': st.column_config.NumberColumn(format='%.1f'),
+    }
+    col1, col2 = st.columns(2)
+    with col1:
+        st.markdown("**Steamers**")
+        st.dataframe(steamers.reindex(columns=list(columns)).rename(columns=columns),
+                     use_container_width=True, hide_index=True, column_config=column_config)
+    with col2:
+        st.markdown("**Drifters**")
+        st.dataframe(drifters.reindex(columns=list(columns)).rename(columns=columns),
+                     use_container_width=True, hide_index=True, column_config=column_config)
 
 def plot_accuracy(df):
     st.subheader("Accuracy metric")
     st.markdown("Accuracy over time metric - in other words, how well our model is predicting the top 3 finishers in each race. It is NOT the accuracy of the odds or overall accuracy of the model.")
-    fig = px.bar(df, x='race_date', y='avg_acc_top3', title='Average Accuracy (Top 3)', labels={'avg_acc_top3': 'Accuracy', 'race_date': 'Date'})
+    fig = bar_figure(df, 'avg_acc_top3', 'Average Accuracy (Top 3)', 'Accuracy')
     st.plotly_chart(fig, use_container_width=True)
 
 def plot_earnings(df):
     st.subheader("Cumulative Earnings")
     st.markdown("This chart illustrates the earnings that would have resulted from betting $10 on the top 1 finisher in each race, using the closing odds to determine the payout. The chart shows the total amount of money that would have been earned if this strategy had been employed.")
-    fig = px.bar(df, x='race_date', y='money_earned_top1', title='Cumulative Sum Earned (Top 1)', labels={'money_earned_top1': 'Earnings over time in $', 'race_date': 'Date'})
+    fig = bar_figure(df, 'money_earned_top1', 'Cumulative Sum Earned (Top 1)', 'Earnings over time in $')
     st.plotly_chart(fig, use_container_width=True)
 
 def main():
@@ -352,23 +409,36 @@ def main():
     
     
     # Create tabs with a dedicated chat tab
-    tab1, tab2, tab3 = st.tabs(["Race Data", "Performance Metrics", "Chat with Henry"])
+    tab1, tab2, tab3, tab4 = st.tabs(["Race Data", "Market Movers", "Performance Metrics", "Chat with Henry"])
     
     with tab1:
         race_data = get_data_uk()
         odds_data = get_bigquery_odds_data()
-        display_race_data(race_data, odds_data)
+        # Index this card for the search box (no-op unless the card changed)
+        search_index().update(COUNTRY, data_version(race_data), race_data)
+        # Keep this refresh as a version for the "as of" selector (no-op unless the card changed)
+        prediction_versions().update(COUNTRY, data_version(race_data), race_data)
+        display_search(COUNTRY)
+        if st.toggle("Browse past meetings"):
+            display_history(odds_data)
+        else:
+            display_race_data(race_data, odds_data)
     
     with tab2:
+        display_market_movers(race_data, odds_data)
+    
+    with tab3:
         bq_data = get_bigquery_data()
         col1, col2 = st.columns(2)
         with col1:
             plot_accuracy(bq_data)
         with col2:
             plot_earnings(bq_data)
+        display_calibration(get_calibration())
+        display_cost_report()
         # st.dataframe(bq_data)
     
-    with tab3:
+    with tab4:
         st.subheader("Horse Racing Assistant")
         st.markdown("Chat with Henry, your horse racing assistant, to get insights about races, horses, and predictions.")
 
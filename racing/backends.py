@@ -0,0 +1,39 @@
+import os
+
+import streamlit as st
+import supabase
+from google.cloud import bigquery
+from google.oauth2 import service_account
+
+# Every page reads through a (supabase, bq_client) pair. The live pair talks to
+# Supabase and BigQuery, the snapshot pair (racing.snapshot) answers the same calls
+# from a local Parquet export. Set DG_SNAPSHOT or snapshot_path in secrets to use it.
+SNAPSHOT_ENV = 'DG_SNAPSHOT'
+
+# Per-request timeout, a hung request fails and is retried by racing.fetch
+SUPABASE_TIMEOUT_SECONDS = 30
+
+
+def live_clients(secrets):
+    client = supabase.create_client(secrets["supabase_url"], secrets["supabase_key"],
+                                    options=supabase.ClientOptions(postgrest_client_timeout=SUPABASE_TIMEOUT_SECONDS))
+    credentials = service_account.Credentials.from_service_account_info(secrets["gcp_service_account"])
+    return client, bigquery.Client(credentials=credentials)
+
+
+def snapshot_path():
+    path = os.environ.get(SNAPSHOT_ENV)
+    if path:
+        return path
+    try:
+        return st.secrets.get("snapshot_path")
+    except FileNotFoundError:
+        return None
+
+
+def connect_clients():
+    path = snapshot_path()
+    if path:
+        from racing.snapshot import snapshot_clients
+        return snapshot_clients(path)
+    return live_clients(st.secrets)
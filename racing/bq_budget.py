@@ -0,0 +1,163 @@
+import hashlib
+import threading
+import time
+from collections import deque
+
+import pandas as pd
+import streamlit as st
+from google.api_core.exceptions import BadRequest, Forbidden
+from google.cloud import bigquery
+
+# Default cap on bytes billed per query, override with bq_max_bytes_billed in secrets
+DEFAULT_MAX_BYTES_BILLED = 10 * 2**30
+
+# Wait for a query job this long before failing it (racing.fetch retries it)
+QUERY_TIMEOUT_SECONDS = 120
+
+# On-demand price used for the cost estimate column
+USD_PER_TIB = 6.25
+
+# Dry-run estimates are reused for this long, tables grow so the estimate goes stale
+ESTIMATE_TTL_SECONDS = 3600
+
+# Jobs kept for the cost report, the oldest are dropped first
+MAX_LEDGER_JOBS = 10_000
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryLedger:
+    # Per-process record of the BigQuery jobs the pages run: statistics of the latest
+    # MAX_LEDGER_JOBS jobs and dry-run estimates per query shape. A query blocked by the
+    # budget raises, the loaders' resilient() layer serves its last good result.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.jobs = deque(maxlen=MAX_LEDGER_JOBS)
+        # {query shape: (bytes processed, monotonic time of the dry run)}
+        self.estimates = {}
+
+    def record(self, country, label, job, seconds):
+        # Statistics of a finished job. A job served from the query cache scanned and
+        # billed nothing, whatever its dry run estimated.
+        cache_hit = bool(job.cache_hit)
+        with self._lock:
+            self.jobs.append({
+                'country': country,
+                'query': label,
+                'bytes_processed': 0 if cache_hit else job.total_bytes_processed or 0,
+                'bytes_billed': 0 if cache_hit else job.total_bytes_billed or 0,
+                'slot_ms': job.slot_millis or 0,
+                'cache_hit': cache_hit,
+                'seconds': seconds,
+                'ran_at': pd.Timestamp.now(tz='UTC'),
+            })
+
+    def estimate(self, shape):
+        # Bytes from the last dry run of a query shape, None once it is older than the TTL
+        with self._lock:
+            estimate = self.estimates.get(shape)
+            if estimate is None or time.monotonic() - estimate[1] > ESTIMATE_TTL_SECONDS:
+                return None
+            return estimate[0]
+
+    def store_estimate(self, shape, bytes_processed):
+        # Expired estimates are dropped as new ones come in, query texts change with the dates
+        now = time.monotonic()
+        with self._lock:
+            self.estimates = {key: value for key, value in self.estimates.items() if now - value[1] <= ESTIMATE_TTL_SECONDS}
+            self.estimates[shape] = (bytes_processed, now)
+
+    def job_records(self):
+        with self._lock:
+            return list(self.jobs)
+
+
+@st.cache_resource
+def query_ledger():
+    return QueryLedger()
+
+
+def max_bytes_billed():
+    try:
+        return int(st.secrets.get("bq_max_bytes_billed", DEFAULT_MAX_BYTES_BILLED))
+    except FileNotFoundError:
+        # No secrets file, the default cap applies
+        return DEFAULT_MAX_BYTES_BILLED
+
+
+def _estimate(bq_client, query, ledger):
+    # Bytes the query would scan, from a dry run at most every ESTIMATE_TTL_SECONDS. The
+    # dry run itself is made outside the ledger lock, two sessions may both make one.
+    shape = hashlib.sha256(query.encode()).hexdigest()
+    estimate = ledger.estimate(shape)
+    if estimate is None:
+        dry_run = bq_client.query(query, job_config=bigquery.QueryJobConfig(dry_run=True, use_query_cache=False))
+        estimate = dry_run.total_bytes_processed or 0
+        ledger.store_estimate(shape, estimate)
+    return estimate
+
+
+def _bytes_billed_limit(error):
+    # BigQuery's own rejection of a job above maximum_bytes_billed
+    reasons = [e.get('reason') for e in getattr(error, 'errors', None) or [] if isinstance(e, dict)]
+    return 'bytesBilledLimitExceeded' in reasons or 'bytes billed' in str(error).lower()
+
+
+def run_query(bq_client, query, country, label, ledger=None, cap=None):
+    # Refuse to run above the cap on the dry-run estimate and let BigQuery enforce it too,
+    # both raise QueryBudgetExceeded
+    ledger = ledger or query_ledger()
+    cap = cap or max_bytes_billed()
+    estimate = _estimate(bq_client, query, ledger)
+    if estimate > cap:
+        raise QueryBudgetExceeded(f"{label} would scan {estimate / 2**20:,.1f} MiB, "
+                                  f"above the {cap / 2**20:,.1f} MiB cap")
+
+    started = time.perf_counter()
+    try:
+        job = bq_client.query(query, job_config=bigquery.QueryJobConfig(maximum_bytes_billed=cap), timeout=QUERY_TIMEOUT_SECONDS)
+        df = job.result(timeout=QUERY_TIMEOUT_SECONDS).to_dataframe()
+    except (BadRequest, Forbidden) as e:
+        if _bytes_billed_limit(e):
+            raise QueryBudgetExceeded(f"{label} was stopped by BigQuery above the {cap / 2**20:,.1f} MiB cap") from e
+        raise
+    ledger.record(country, label, job, time.perf_counter() - started)
+    return df
+
+
+def cost_report(ledger=None):
+    # Totals per country and query, most expensive first
+    ledger = ledger or query_ledger()
+    jobs = pd.DataFrame(ledger.job_records())
+    if jobs.empty:
+        return jobs
+    report = jobs.groupby(['country', 'query']).agg(
+        runs=('bytes_billed', 'size'),
+        cache_hits=('cache_hit', 'sum'),
+        gib_processed=('bytes_processed', lambda b: b.sum() / 2**30),
+        gib_billed=('bytes_billed', lambda b: b.sum() / 2**30),
+        slot_seconds=('slot_ms', lambda ms: ms.sum() / 1000),
+        avg_seconds=('seconds', 'mean'),
+        last_run=('ran_at', 'max'),
+    )
+    report['est_cost_usd'] = report['gib_billed'] / 1024 * USD_PER_TIB
+    return report.sort_values('gib_billed', ascending=False).reset_index()
+
+
+def display_cost_report():
+    with st.expander("BIGQUERY COSTS"):
+        st.caption(f"Per-query cap: {max_bytes_billed() / 2**30:.1f} GiB billed. Totals over the last {MAX_LEDGER_JOBS:,} jobs since this server started.")
+        report = cost_report()
+        if report.empty:
+            st.info("No BigQuery jobs recorded yet.")
+            return
+        st.dataframe(report, use_container_width=True, hide_index=True, column_config={
+            'gib_processed': st.column_config.NumberColumn('GiB processed', format='%.3f'),
+            'gib_billed': st.column_config.NumberColumn('GiB billed', format='%.3f'),
+            'slot_seconds': st.column_config.NumberColumn('Slot s', format='%.1f'),
+            'avg_seconds': st.column_config.NumberColumn('Avg s', format='%.2f'),
+            'est_cost_usd': st.column_config.NumberColumn('Est. cost $', format='%.4f'),
+        })
@@ -0,0 +1,210 @@
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import streamlit as st
+
+from racing.results import ResultsCursor, fetch_new_results, results_source
+
+# Calibration of the model's probabilities against finishing positions. For each
+# country and probability column we keep binned reliability counts plus running
+# Brier and log-loss sums. Results are merged a day at a time: only races not yet
+# counted are joined and added, history is never recomputed.
+
+# Probability column -> the event it predicts (see outcomes)
+PROBABILITY_COLUMNS = {
+    'winner_prob': 'Win',
+    'trifecta_prob': 'Top 3',
+    'last_place_prob': 'Last place',
+}
+
+# Equal-width reliability bins over [0, 1]
+NUM_BINS = 20
+
+# Probabilities are clipped to [EPSILON, 1 - EPSILON] for the log-loss
+EPSILON = 1e-6
+
+CALIBRATION_STORE_PATH = ".calibration"
+
+
+def outcomes(column, position, field_size):
+    if column == 'winner_prob':
+        return position == 1
+    if column == 'trifecta_prob':
+        return position <= 3
+    if column == 'last_place_prob':
+        return position == field_size
+    raise KeyError(column)
+
+
+class Calibration:
+    # Mergeable aggregates for one country: arrays are (probability column, bin)
+
+    def __init__(self, bins=NUM_BINS):
+        self.bins = bins
+        self.runners = np.zeros((len(PROBABILITY_COLUMNS), bins), dtype=np.int64)
+        self.predicted = np.zeros((len(PROBABILITY_COLUMNS), bins))
+        self.hits = np.zeros((len(PROBABILITY_COLUMNS), bins), dtype=np.int64)
+        self.brier = np.zeros(len(PROBABILITY_COLUMNS))
+        self.log_loss = np.zeros(len(PROBABILITY_COLUMNS))
+        self.cursor = ResultsCursor()
+
+    @property
+    def through(self):
+        return self.cursor.through
+
+    def merge(self, joined):
+        # Add finishers from races not counted yet, returns the number of new races
+        joined = self.cursor.unseen(joined)
+        if joined.empty:
+            return 0
+
+        position = joined['position'].to_numpy(dtype=float)
+        field_size = joined['field_size'].to_numpy(dtype=float)
+        for i, column in enumerate(PROBABILITY_COLUMNS):
+            if column not in joined.columns:
+                continue
+            p = pd.to_numeric(joined[column], errors='coerce').to_numpy(dtype=float)
+            valid = ~np.isnan(p)
+            p, y = np.clip(p[valid], 0, 1), outcomes(column, position[valid], field_size[valid])
+            b = np.minimum((p * self.bins).astype(int), self.bins - 1)
+            self.runners[i] += np.bincount(b, minlength=self.bins)
+            self.predicted[i] += np.bincount(b, weights=p, minlength=self.bins)
+            self.hits[i] += np.bincount(b, weights=y, minlength=self.bins).astype(np.int64)
+            self.brier[i] += np.sum((p - y) ** 2)
+            q = np.clip(p, EPSILON, 1 - EPSILON)
+            self.log_loss[i] -= np.sum(np.where(y, np.log(q), np.log1p(-q)))
+
+        return self.cursor.advance(joined)
+
+    def scores(self):
+        runners = self.runners.sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return pd.DataFrame({
+                'Prediction': list(PROBABILITY_COLUMNS.values()),
+                'Runners': runners,
+                'Brier score': self.brier / runners,
+                'Log-loss': self.log_loss / runners,
+                'Hit rate': self.hits.sum(axis=1) / runners,
+                'Mean probability': self.predicted.sum(axis=1) / runners,
+            })
+
+    def reliability(self, column):
+        i = list(PROBABILITY_COLUMNS).index(column)
+        runners = self.runners[i]
+        used = runners > 0
+        return pd.DataFrame({
+            'bin_start': np.arange(self.bins)[used] / self.bins,
+            'runners': runners[used],
+            'mean_predicted': self.predicted[i][used] / runners[used],
+            'observed': self.hits[i][used] / runners[used],
+        })
+
+    def to_dict(self):
+        return {
+            'bins': self.bins, 'runners': self.runners.tolist(), 'predicted': self.predicted.tolist(),
+            'hits': self.hits.tolist(), 'brier': self.brier.tolist(), 'log_loss': self.log_loss.tolist(),
+            **self.cursor.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        calibration = cls(state['bins'])
+        calibration.runners = np.array(state['runners'], dtype=np.int64)
+        calibration.predicted = np.array(state['predicted'])
+        calibration.hits = np.array(state['hits'], dtype=np.int64)
+        calibration.brier = np.array(state['brier'])
+        calibration.log_loss = np.array(state['log_loss'])
+        calibration.cursor = ResultsCursor.from_dict(state)
+        return calibration
+
+
+class CalibrationStore:
+    # Per-country aggregates, saved to disk after every merge so a restart resumes
+    # from the last counted day instead of replaying history
+
+    def __init__(self, path=CALIBRATION_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._countries = {}
+
+    def _file(self, country):
+        return os.path.join(self.path, f"{country}.json")
+
+    def get(self, country):
+        with self._lock:
+            if country not in self._countries:
+                try:
+                    with open(self._file(country)) as f:
+                        self._countries[country] = Calibration.from_dict(json.load(f))
+                except (OSError, ValueError, KeyError):
+                    self._countries[country] = Calibration()
+            return self._countries[country]
+
+    def merge(self, country, joined):
+        calibration = self.get(country)
+        with self._lock:
+            added = calibration.merge(joined)
+            if added:
+                os.makedirs(self.path, exist_ok=True)
+                tmp = self._file(country) + ".tmp"
+                with open(tmp, "w") as f:
+                    json.dump(calibration.to_dict(), f)
+                os.replace(tmp, self._file(country))
+        return added
+
+
+@st.cache_resource
+def calibration_store():
+    return CalibrationStore()
+
+
+def update_calibration(country, supabase, table, bq_client):
+    # Merge newly settled results, returns the country's aggregates or None without a results table
+    source = results_source(bq_client, country)
+    if source is None:
+        return None
+    store = calibration_store()
+    joined = fetch_new_results(country, 'Calibration', supabase, table, bq_client, source,
+                               list(PROBABILITY_COLUMNS), store.get(country).cursor)
+    store.merge(country, joined)
+    return store.get(country)
+
+
+def reliability_figure(calibration, column):
+    reliability = calibration.reliability(column)
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=[0, 1], y=[0, 1], mode='lines', name='Perfect calibration',
+                             line=dict(dash='dash', color='grey')))
+    fig.add_trace(go.Scatter(x=reliability['mean_predicted'], y=reliability['observed'], mode='lines+markers',
+                             name=PROBABILITY_COLUMNS[column], customdata=reliability['runners'],
+                             hovertemplate='Predicted %{x:.3f}<br>Observed %{y:.3f}<br>%{customdata} runners'))
+    fig.update_layout(title=f'Reliability - {PROBABILITY_COLUMNS[column]} probability',
+                      xaxis_title='Mean predicted probability', yaxis_title='Observed frequency',
+                      xaxis_range=[0, 1], yaxis_range=[0, 1])
+    return fig
+
+
+def display_calibration(calibration):
+    st.subheader("Probability calibration")
+    st.markdown("How well the model's probabilities match what actually happened. Runners are grouped by predicted probability, a well calibrated model sits on the diagonal. Lower Brier score and log-loss are better.")
+    if calibration is None:
+        st.info("No results table is configured for this country (results_tables in secrets).")
+        return
+    if calibration.through is None:
+        st.info("No results available yet.")
+        return
+    st.caption(f"Results counted through {calibration.through}.")
+    st.dataframe(calibration.scores(), use_container_width=True, hide_index=True, column_config={
+        'Brier score': st.column_config.NumberColumn(format='%.4f'),
+        'Log-loss': st.column_config.NumberColumn(format='%.4f'),
+        'Hit rate': st.column_config.NumberColumn(format='%.3f'),
+        'Mean probability': st.column_config.NumberColumn(format='%.3f'),
+    })
+    columns = st.columns(len(PROBABILITY_COLUMNS))
+    for col, column in zip(columns, PROBABILITY_COLUMNS):
+        with col:
+            st.plotly_chart(reliability_figure(calibration, column), use_container_width=True)
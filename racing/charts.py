@@ -0,0 +1,123 @@
+import hashlib
+
+import pandas as pd
+import plotly.express as px
+import plotly.io as pio
+import streamlit as st
+
+# Number of horses visible when an odds chart is first drawn
+INITIAL_VISIBLE_HORSES = 6
+
+
+def stamp_data_version(df):
+    # Tag a freshly loaded frame with a content hash, figures built from it are cached on this
+    df.attrs['data_version'] = _hash_frame(df)
+    return df
+
+
+def data_version(df):
+    version = df.attrs.get('data_version')
+    if version is None:
+        version = _hash_frame(df)
+    return version
+
+
+def _hash_frame(df):
+    if df.empty:
+        return "empty"
+    try:
+        hashed = pd.util.hash_pandas_object(df, index=False).values
+    except TypeError:
+        # Unhashable cells (lists, dicts) - fall back to hashing the repr
+        return hashlib.sha1(df.to_csv(index=False).encode()).hexdigest()[:16]
+    return hashlib.sha1(hashed.tobytes()).hexdigest()[:16]
+
+
+def initial_horses(race_df, n=INITIAL_VISIBLE_HORSES):
+    # Show the market leaders by our predicted odds, so the same race always opens the same way
+    if 'Odds predicted' in race_df.columns:
+        ordered = race_df.sort_values(['Odds predicted', 'Horse'], na_position='last')
+    else:
+        ordered = race_df.sort_values('Horse')
+    return tuple(ordered['Horse'].drop_duplicates().head(n))
+
+
+# Performance metric bar charts (keyed by metric + data version, underscore args are not hashed)
+@st.cache_data(show_spinner=False, max_entries=64)
+def _bar_figure_json(metric, version, title, label, _df):
+    if metric not in _df.columns:
+        # Nothing loaded yet (failed fetch with no earlier copy), draw an empty chart
+        return px.bar(title=title).to_json()
+    fig = px.bar(_df, x='race_date', y=metric, title=title, labels={metric: label, 'race_date': 'Date'})
+    return fig.to_json()
+
+
+def bar_figure(df, metric, title, label):
+    return pio.from_json(_bar_figure_json(metric, data_version(df), title, label, df), skip_invalid=True)
+
+
+@st.cache_data(show_spinner=False, max_entries=512)
+def _odds_figure_json(race_id, version, race_name, visible_horses, _race_odds_df, _horse_names):
+    fig = px.line(
+        _race_odds_df,
+        x='scraped_time',
+        y='odds',
+        color='Horse',
+        labels={
+            'scraped_time': 'Time',
+            'odds': 'Odds',
+            'Horse': 'Horse'
+        },
+        title=f'Odds Movement - {race_name}',
+        log_y=True
+    )
+
+    # Add markers (dots) to the lines
+    fig.update_traces(
+        mode='lines+markers',
+        marker=dict(size=6),
+        line=dict(width=2)
+    )
+
+    fig.update_layout(
+        xaxis_title="Time",
+        yaxis_title="Odds",
+        legend_title="Horses",
+        height=450,
+        yaxis={
+            'autorange': 'reversed',
+            'type': 'log',
+            'gridwidth': 0.5,
+            'gridcolor': 'rgba(128, 128, 128, 0.2)',
+        },
+        xaxis={
+            'gridwidth': 0.5,
+            'gridcolor': 'rgba(128, 128, 128, 0.2)',
+        },
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        font=dict(size=12),
+        legend=dict(
+            yanchor="top",
+            y=0.99,
+            xanchor="left",
+            x=1.02,
+            itemsizing='constant'
+        )
+    )
+
+    # Add horse names to legend and hide non-selected horses
+    for trace in fig.data:
+        horse_name = _horse_names.get(trace.name, trace.name)
+        trace.update(
+            name=horse_name,
+            visible='legendonly' if horse_name not in visible_horses else True
+        )
+    return fig.to_json()
+
+
+def odds_figure(race_id, version, race_name, race_odds_df, race_df):
+    horse_names = race_df.set_index('horse_id')['Horse'].to_dict()
+    fig_json = _odds_figure_json(race_id, version, race_name, initial_horses(race_df),
+                                 race_odds_df, horse_names)
+    return pio.from_json(fig_json, skip_invalid=True)
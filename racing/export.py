@@ -0,0 +1,110 @@
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import streamlit as st
+
+from racing.history import iter_row_pages
+
+# Bulk export of the races behind a page's current filter. Rows are read from Supabase
+# a page at a time, joined with their odds ticks where the page has them and written
+# straight to the output file, so a multi-day export never holds the joined frame.
+# The file is only built when the download button is clicked, off the script thread.
+# Streamlit serves a download once the whole file is built and held in its media
+# store, so the browser's download starts when the file is complete, not with the first chunk.
+
+EXPORT_FORMATS = {
+    'CSV': ('csv', 'text/csv'),
+    'Parquet': ('parquet', 'application/vnd.apache.parquet'),
+}
+
+# Rows read from Supabase per chunk
+EXPORT_PAGE_SIZE = 1000
+
+# Exports larger than this are spooled to disk while they are written
+SPOOL_BYTES = 32 * 1024 * 1024
+
+
+def export_chunks(supabase, table, columns, start, end, city=None, races=None, odds_df=None, page_size=EXPORT_PAGE_SIZE):
+    # Frames of runners with race_date in [start, end], one per Supabase page. races
+    # limits them to (race_date, city, race_name) keys, odds_df adds one row per odds tick.
+    ticks_by_race = None
+    if odds_df is not None and not odds_df.empty:
+        # Positions of each race's ticks, found once instead of scanning the ticks per chunk
+        ticks_by_race = odds_df.groupby('race_id', sort=False).indices
+    races = set(races) if races else None
+    for page in iter_row_pages(supabase, table, columns, start, end, city, page_size=page_size):
+        chunk = pd.DataFrame(page)
+        if races is not None:
+            keys = zip(chunk['race_date'].astype(str).str[:10], chunk['city'], chunk['race_name'])
+            chunk = chunk[pd.Series(list(keys), index=chunk.index).isin(races)]
+        if ticks_by_race is not None and 'race_id' in chunk.columns:
+            chunk = join_ticks(chunk, odds_df, ticks_by_race)
+        if not chunk.empty:
+            yield chunk
+
+
+def join_ticks(chunk, odds_df, ticks_by_race):
+    positions = [ticks_by_race[race_id] for race_id in chunk['race_id'].unique() if race_id in ticks_by_race]
+    ticks = odds_df.take(np.concatenate(positions) if positions else np.array([], dtype=np.int64))
+    ticks = ticks.rename(columns={'horse_link': 'horse_id'})
+    # Runners without ticks keep a single row, so every chunk has the same columns.
+    # Tick columns that clash with the card get a suffix.
+    return chunk.merge(ticks, on=['race_id', 'horse_id'], how='left', suffixes=('', '_tick'))
+
+
+def write_export(chunks, fmt):
+    # Write chunks to a temporary file as they arrive, returns it rewound for reading
+    out = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES)
+    if fmt == 'CSV':
+        header = True
+        for chunk in chunks:
+            out.write(chunk.to_csv(index=False, header=header).encode())
+            header = False
+    else:
+        writer = None
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                # Columns that are empty in the first chunk are typed as text
+                schema = pa.schema([field.with_type(pa.string()) if pa.types.is_null(field.type) else field
+                                    for field in table.schema]).remove_metadata()
+                writer = pq.ParquetWriter(out, schema)
+            writer.write_table(table.select(schema.names).cast(schema))
+        if writer is not None:
+            writer.close()
+    out.seek(0)
+    return out
+
+
+def display_export(country, supabase, table, columns, df, city, race_keys, odds_df=None):
+    # Export the races behind the page's filter: the selected races, or every race on
+    # the selected course within a date range
+    with st.expander("EXPORT"):
+        if race_keys:
+            dates = sorted(race_date for race_date, _, _ in race_keys)
+            start, end = dates[0], dates[-1]
+            st.caption(f"Exports the {len(race_keys)} selected race(s).")
+        else:
+            first, last = df['race_date'].min().date(), df['race_date'].max().date()
+            picked = st.date_input("Race dates", value=(first, last), key='export_dates')
+            if len(picked) < 2:
+                st.info("Pick the last day of the range.")
+                return
+            start, end = picked[0].isoformat(), picked[1].isoformat()
+            st.caption(f"Exports every race at {'every course' if city == 'All' else city} from {start} to {end}.")
+        fmt = st.radio("Format", list(EXPORT_FORMATS), horizontal=True, key='export_format')
+        if odds_df is not None and not odds_df.empty:
+            st.caption("Each runner is repeated for every odds tick scraped for it.")
+        extension, mime = EXPORT_FORMATS[fmt]
+        course = None if city == "All" else city
+
+        def build():
+            return write_export(export_chunks(supabase, table, columns, start, end, course, race_keys, odds_df), fmt)
+
+        st.caption("The download starts once the whole file has been built.")
+        st.download_button("Download", data=build, mime=mime,
+                           file_name=f"{country}_races_{start}_{end}.{extension}", on_click='ignore',
+                           key='export_download')
@@ -0,0 +1,167 @@
+import functools
+import random
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+import streamlit as st
+from google.api_core.exceptions import ClientError, TooManyRequests
+from postgrest.exceptions import APIError
+
+from racing.bq_budget import QueryBudgetExceeded
+
+# Backend calls inside cached page loaders go through guarded(): a failing call is
+# retried with bounded exponential backoff behind a circuit breaker per table or
+# query, and raises instead of returning an empty frame, so Streamlit never caches
+# the failure. Cache hits never reach a breaker. The loaders are wrapped in
+# resilient(), which serves the last good result with a staleness banner until a
+# refresh succeeds.
+
+RETRY_ATTEMPTS = 3
+BACKOFF_SECONDS = 0.5
+MAX_BACKOFF_SECONDS = 4
+
+# Consecutive failures that open a backend's circuit, and how long it stays open
+# before a single trial request is let through
+FAILURE_THRESHOLD = 3
+RESET_SECONDS = 60
+
+# Last good results kept per process (least recently used are evicted first)
+MAX_LAST_GOOD = 128
+
+# Errors a retry cannot fix. They are raised straight away and do not count towards
+# the breaker, a query that can never succeed says nothing about the backend.
+NOT_RETRYABLE = (QueryBudgetExceeded,)
+
+# PostgREST request and schema errors (PGRST1xx/2xx) and SQLSTATE classes of bad
+# queries: data exceptions, integrity violations, syntax errors and missing objects
+POSTGREST_CLIENT_CODES = ('PGRST1', 'PGRST2', '22', '23', '42')
+
+
+class CircuitOpen(Exception):
+    pass
+
+
+class CircuitBreaker:
+
+    def __init__(self, name, failure_threshold=FAILURE_THRESHOLD, reset_seconds=RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at >= self.reset_seconds:
+                # Half open: this caller tries, everyone else keeps failing fast until it reports back
+                self._opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+
+@st.cache_resource
+def circuit_breaker(backend, source):
+    # One breaker per table or query, a broken one does not block the others
+    return CircuitBreaker(f"{backend} ({source})")
+
+
+def retryable(error):
+    if isinstance(error, NOT_RETRYABLE):
+        return False
+    if isinstance(error, ClientError):
+        # 4xx from BigQuery: bad request, missing table, no permission. Rate limits pass.
+        return isinstance(error, TooManyRequests)
+    if isinstance(error, APIError):
+        return not str(error.code or '').startswith(POSTGREST_CLIENT_CODES)
+    return True
+
+
+class LastGood:
+
+    def __init__(self, max_entries=MAX_LAST_GOOD):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._values = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._values:
+                return None
+            self._values.move_to_end(key)
+            return self._values[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._values[key] = (value, pd.Timestamp.now(tz='UTC'))
+            self._values.move_to_end(key)
+            while len(self._values) > self.max_entries:
+                self._values.popitem(last=False)
+
+
+@st.cache_resource
+def last_good():
+    return LastGood()
+
+
+def call_with_retries(breaker, fn, *args, **kwargs):
+    for attempt in range(RETRY_ATTEMPTS):
+        if not breaker.allow():
+            raise CircuitOpen(f"{breaker.name} is unavailable after repeated failures, retrying in under {breaker.reset_seconds}s")
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            if not retryable(e):
+                raise
+            breaker.record_failure()
+            if attempt == RETRY_ATTEMPTS - 1:
+                raise
+            # Full jitter, so sessions that failed together do not retry together
+            time.sleep(random.uniform(0, min(MAX_BACKOFF_SECONDS, BACKOFF_SECONDS * 2 ** attempt)))
+        else:
+            breaker.record_success()
+            return result
+
+
+def guarded(backend, source, fn, *args, **kwargs):
+    # Call a backend for one table or query, retried behind that source's breaker
+    return call_with_retries(circuit_breaker(backend, source), fn, *args, **kwargs)
+
+
+def resilient(country, label, default=pd.DataFrame):
+    # Decorate a cached loader that raises on failure
+    def decorate(loader):
+        @functools.wraps(loader)
+        def wrapper(*args):
+            key = (country, label, args)
+            try:
+                value = loader(*args)
+            except Exception as e:
+                stale = last_good().get(key)
+                if stale is None:
+                    st.error(f"Error fetching {label.lower()}: {e}")
+                    return default()
+                value, fetched_at = stale
+                minutes = int((pd.Timestamp.now(tz='UTC') - fetched_at).total_seconds() // 60)
+                st.warning(f"{label} could not be refreshed, showing data from {minutes} min ago "
+                           f"({fetched_at:%H:%M} UTC). {e}", icon="⏳")
+                return value
+            last_good().put(key, value)
+            return value
+        return wrapper
+    return decorate
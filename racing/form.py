@@ -0,0 +1,143 @@
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+# Runs kept per horse, oldest on the left and most recent in the last column
+FORM_WIDTH = 5
+FORM_COLUMNS = [f'form_{i}' for i in range(1, FORM_WIDTH + 1)]
+
+# Codes stored in the form matrix. Positive values are finishing positions,
+# 0 means no run recorded and negative values are non-finishes.
+NO_RUN = 0
+UNPLACED = 10  # a '0' in a form string means finished outside the first nine
+NON_FINISH = {'P': -1, 'F': -2, 'U': -3, 'R': -4, 'B': -5, 'D': -6, 'S': -7, 'C': -8,
+              # Two letter codes are one run: pulled up, unseated rider, brought down, refused to race
+              'PU': -1, 'UR': -3, 'BD': -5, 'RR': -4}
+OTHER_NON_FINISH = -9
+
+# Two letter codes are matched before single characters
+_CODES = '|'.join(code for code in NON_FINISH if len(code) > 1)
+
+# Card orders offered by the form filters, column and whether lower sorts first
+FORM_SORTS = {
+    'Card order': None,
+    'Form avg position': ('Form avg position', True),
+    'Form wins': ('Form wins', False),
+    'Form trend': ('Form trend', True),
+}
+
+
+def parse_form(series, width=FORM_WIDTH):
+    # Parse form strings ("1-3-P-2-4", "13P24", "1/3/2") into an (n, width) int8 matrix, right aligned
+    text = series.reset_index(drop=True).fillna('').astype(str).str.upper()
+    matrix = np.full((len(text), width), NO_RUN, dtype=np.int8)
+    # With separators each token may have several digits, otherwise every character is a run
+    separated = text.str.contains(r'[-/,\s]', regex=True)
+    tokens = pd.concat([
+        text[separated].str.extractall(rf'(\d+|{_CODES}|[A-Z])')[0],
+        text[~separated].str.extractall(rf'(\d|{_CODES}|[A-Z])')[0],
+    ])
+    if tokens.empty:
+        return matrix
+
+    rows = tokens.index.get_level_values(0).to_numpy()
+    match = tokens.index.get_level_values('match').to_numpy()
+    runs = np.bincount(rows, minlength=len(text))
+    from_right = runs[rows] - match - 1
+    keep = from_right < width
+
+    values = tokens.to_numpy()[keep]
+    positions = pd.to_numeric(pd.Series(values), errors='coerce').to_numpy()
+    codes = np.where(positions == 0, UNPLACED, np.clip(positions, 1, 99))
+    letters = pd.Series(values).map(NON_FINISH).fillna(OTHER_NON_FINISH).to_numpy()
+    codes = np.where(np.isnan(positions), letters, codes)
+
+    matrix[rows[keep], width - 1 - from_right[keep]] = codes.astype(np.int8)
+    return matrix
+
+
+def form_features(matrix):
+    # Summary columns from a form matrix, all vectorised over rows
+    finished = matrix > 0
+    runs = (matrix != NO_RUN).sum(axis=1)
+    finishes = finished.sum(axis=1)
+    positions = np.where(finished, matrix, 0).astype(np.float64)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_position = positions.sum(axis=1) / finishes
+
+        # Least squares slope of finishing position against run order, negative means improving
+        x = np.broadcast_to(np.arange(matrix.shape[1], dtype=np.float64), matrix.shape)
+        x = np.where(finished, x, 0)
+        sum_x = x.sum(axis=1)
+        sum_y = positions.sum(axis=1)
+        sum_xy = (x * positions).sum(axis=1)
+        sum_xx = (x * x).sum(axis=1)
+        denominator = finishes * sum_xx - sum_x ** 2
+        trend = np.where(finishes >= 2, (finishes * sum_xy - sum_x * sum_y) / denominator, np.nan)
+
+    return pd.DataFrame({
+        'Form runs': runs.astype(np.int8),
+        'Form avg position': np.round(mean_position, 2),
+        'Form wins': (matrix == 1).sum(axis=1).astype(np.int8),
+        'Form non-finishes': (matrix < 0).sum(axis=1).astype(np.int8),
+        'Form trend': np.round(trend, 2),
+    })
+
+
+def add_form_columns(df, column='Last 5 races'):
+    # Parse the form strings once at load time and attach the matrix + summary columns
+    if df.empty or column not in df.columns:
+        return df
+    matrix = parse_form(df[column])
+    form = pd.DataFrame(matrix, columns=FORM_COLUMNS)
+    features = form_features(matrix)
+    extra = pd.concat([form, features], axis=1)
+    extra.index = df.index
+    return pd.concat([df, extra], axis=1)
+
+
+class FormFilter(NamedTuple):
+    # Runners shown on the card tables, from the parsed form columns
+    min_wins: int = 0
+    # Worst average finishing position kept (0 for no limit)
+    max_avg_position: float = 0.0
+    improving_only: bool = False
+    finished_every_run: bool = False
+    sort_by: str = 'Card order'
+
+    def apply(self, race_df):
+        # Filtered and sorted view of the race frame, a no-op with the defaults
+        if self == FormFilter():
+            return race_df
+        keep = race_df['Form wins'] >= self.min_wins
+        if self.max_avg_position > 0:
+            keep &= race_df['Form avg position'] <= self.max_avg_position
+        if self.improving_only:
+            keep &= race_df['Form trend'] < 0
+        if self.finished_every_run:
+            keep &= race_df['Form non-finishes'] == 0
+        shown = race_df[keep]
+        if FORM_SORTS[self.sort_by] is not None:
+            column, ascending = FORM_SORTS[self.sort_by]
+            shown = shown.sort_values(column, ascending=ascending, na_position='last', kind='stable')
+        return shown
+
+
+def form_filter_settings():
+    # Form filter controls for the card
+    with st.expander("FORM FILTERS"):
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            min_wins = st.number_input("Wins in the last 5 runs, at least", min_value=0, max_value=FORM_WIDTH, value=0, key='form_min_wins')
+            sort_by = st.selectbox("Sort runners by", list(FORM_SORTS), key='form_sort')
+        with col2:
+            max_avg_position = st.number_input("Average position, at most (0 for no limit)", min_value=0.0, value=0.0,
+                                               step=0.5, key='form_max_avg_position')
+        with col3:
+            improving_only = st.checkbox("Improving form only", key='form_improving',
+                                         help="Finishing positions getting better over the last runs")
+            finished_every_run = st.checkbox("No pulled up, fallen or other non-finishes", key='form_finished')
+    return FormFilter(int(min_wins), float(max_avg_position), improving_only, finished_every_run, sort_by)
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+
+# Large frames are loaded once per process with st.cache_resource and handed to every
+# session as the same object, so nothing on the render path may write to them.
+# share_frame marks their numpy buffers read-only, an in-place write raises instead of
+# changing the frame for every session. Copy-on-Write makes every derived frame share
+# memory with the original until it is written to, so slices and new columns cost no
+# copy and writes to them never reach the shared buffers.
+
+try:
+    ARROW_STRING = pd.StringDtype('pyarrow', na_value=np.nan)
+except TypeError:
+    # pandas < 2.3 spells the NaN-semantics Arrow string dtype differently
+    ARROW_STRING = pd.StringDtype('pyarrow_numpy')
+
+
+def enable_copy_on_write():
+    # Called at the top of every page script, each is an entry point in a multipage app.
+    # Copy-on-Write is always on from pandas 3, older versions need the option.
+    if int(pd.__version__.split('.')[0]) < 3:
+        pd.set_option('mode.copy_on_write', True)
+
+
+def freeze_frame(df):
+    # df rebuilt on read-only copies of its numpy backed columns, through public APIs only:
+    # the constructor keeps arrays passed with copy=False as they are, so a write to the
+    # frame lands on a read-only array and raises. Extension columns (Arrow strings) are
+    # immutable already and are passed through. Costs one copy of the numeric columns,
+    # made once when the frame is loaded.
+    columns = {}
+    for i in range(df.shape[1]):
+        column = df.iloc[:, i]
+        if isinstance(column.dtype, np.dtype):
+            values = column.to_numpy(copy=True)
+            values.flags.writeable = False
+            columns[i] = values
+        else:
+            columns[i] = column.array
+    frozen = pd.DataFrame(columns, index=df.index, copy=False).set_axis(df.columns, axis=1)
+    frozen.attrs.update(df.attrs)
+    return frozen
+
+
+def share_frame(df):
+    # Arrow backed string columns: one contiguous buffer per column instead of a Python object
+    # per cell. The result is frozen, it is shared by every session.
+    text = [column for column in df.columns
+            if df[column].dtype == object and pd.api.types.infer_dtype(df[column], skipna=True) == 'string']
+    if text:
+        df = df.astype({column: ARROW_STRING for column in text})
+    return freeze_frame(df)
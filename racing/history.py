@@ -0,0 +1,104 @@
+# Keyset-paginated access to the card tables. A meeting is one racecourse on one
+# day, races are ordered by (race_date, race_id) and runners inside a meeting by
+# (race_id, horse_id), so every page is an indexed range scan rather than an OFFSET.
+# Longer walks page on a unique row key the same way, so rows inserted while a walk
+# is under way cannot shift a page and drop or repeat rows.
+
+# Rows fetched per request when walking a meeting
+PAGE_SIZE = 500
+
+# Unique key each card table is walked in. Tables without ids are walked on the
+# runner, a horse runs once in a race.
+ROW_KEYS = {'uk_horse_racing_full': ('race_date', 'race_id', 'horse_id')}
+RUNNER_ROW_KEY = ('race_date', 'city', 'race_name', 'horse')
+
+
+def fetch_meeting_rows(supabase, table, columns, race_date, city, page_size=PAGE_SIZE):
+    rows = []
+    last = None
+    while True:
+        query = supabase.table(table).select(*columns).eq('race_date', race_date).eq('city', city)
+        if last is not None:
+            race_id, horse_id = last
+            query = query.or_(f'race_id.gt.{race_id},and(race_id.eq.{race_id},horse_id.gt."{horse_id}")')
+        page = query.order('race_id').order('horse_id').limit(page_size).execute().data
+        rows.extend(page)
+        if len(page) < page_size:
+            return rows
+        last = (page[-1]['race_id'], page[-1]['horse_id'])
+
+
+def meeting_courses(supabase, table, race_date):
+    response = supabase.table(table).select('city').eq('race_date', race_date).execute()
+    return sorted({row['city'] for row in response.data})
+
+
+def adjacent_meeting(supabase, table, race_date, race_id, city=None, forward=True):
+    # Nearest race strictly after (or before) the (race_date, race_id) cursor, optionally on one course.
+    # Returns the (race_date, city) of its meeting, or None at either end of the archive.
+    op = 'gt' if forward else 'lt'
+    query = supabase.table(table).select('race_date', 'race_id', 'city')
+    if city is not None:
+        query = query.eq('city', city)
+    query = query.or_(f'race_date.{op}.{race_date},and(race_date.eq.{race_date},race_id.{op}.{race_id})')
+    rows = (query.order('race_date', desc=not forward)
+                 .order('race_id', desc=not forward)
+                 .limit(1)
+                 .execute().data)
+    if not rows:
+        return None
+    return rows[0]['race_date'], rows[0]['city']
+
+
+def fetch_rows_since(supabase, table, columns, race_date=None, page_size=PAGE_SIZE):
+    # Every row on or after race_date (the whole table when None)
+    return [row for page in iter_row_pages(supabase, table, columns, race_date, page_size=page_size) for row in page]
+
+
+def row_key(table):
+    return ROW_KEYS.get(table, RUNNER_ROW_KEY)
+
+
+def _quote(value):
+    # Quoted postgrest filter value, names may hold commas, dots or parentheses
+    text = str(value).replace('\\', '\\\\').replace('"', '\\"')
+    return f'"{text}"'
+
+
+def rows_after(key, values):
+    # postgrest logic tree for rows strictly after values in key order, e.g. for (a, b, c):
+    #   a.gt.x,and(a.eq.x,or(b.gt.y,and(b.eq.y,c.gt.z)))
+    head, value = key[0], _quote(values[0])
+    if len(key) == 1:
+        return f'{head}.gt.{value}'
+    rest = rows_after(key[1:], values[1:])
+    if len(key) > 2:
+        rest = f'or({rest})'
+    return f'{head}.gt.{value},and({head}.eq.{value},{rest})'
+
+
+def iter_row_pages(supabase, table, columns, start=None, end=None, city=None, page_size=PAGE_SIZE):
+    # Pages of rows with race_date in [start, end] (open ends when None), optionally on one
+    # course, walked in the table's row key order
+    key = row_key(table)
+    if '*' not in columns:
+        columns = tuple(columns) + tuple(column for column in key if column not in columns)
+    last = None
+    while True:
+        query = supabase.table(table).select(*columns)
+        if start is not None:
+            query = query.gte('race_date', start)
+        if end is not None:
+            query = query.lte('race_date', end)
+        if city is not None:
+            query = query.eq('city', city)
+        if last is not None:
+            query = query.or_(rows_after(key, last))
+        for column in key:
+            query = query.order(column)
+        page = query.limit(page_size).execute().data
+        if page:
+            yield page
+        if len(page) < page_size:
+            return
+        last = tuple(page[-1][column] for column in key)
@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+# Window for the recent odds slope
+SLOPE_WINDOW_MINUTES = 30
+
+RUNNER_KEYS = ['race_id', 'horse_link']
+
+
+def runner_odds_features(odds_df, card_df=None, window_minutes=SLOPE_WINDOW_MINUTES):
+    # One row per (race_id, horse_link) from every scraped tick, computed in a single sort + groupby pass.
+    # Negative moves/slopes mean the price is shortening (steaming), positive means drifting.
+    if odds_df.empty:
+        return pd.DataFrame()
+    ticks = odds_df[RUNNER_KEYS + ['scraped_time', 'odds']].dropna(subset=['odds'])
+    ticks = ticks[ticks['odds'] > 0].sort_values(RUNNER_KEYS + ['scraped_time'], kind='stable')
+    ticks = ticks.assign(
+        scraped_time=pd.to_datetime(ticks['scraped_time']),
+        log_odds=np.log(ticks['odds'].to_numpy(dtype=np.float64)),
+    )
+    groups = ticks.groupby(RUNNER_KEYS, sort=False)
+
+    features = groups.agg(
+        opening_odds=('odds', 'first'),
+        latest_odds=('odds', 'last'),
+        min_odds=('odds', 'min'),
+        max_odds=('odds', 'max'),
+        ticks=('odds', 'size'),
+        first_seen=('scraped_time', 'first'),
+        last_seen=('scraped_time', 'last'),
+    )
+    features['pct_move'] = (features['latest_odds'] / features['opening_odds'] - 1) * 100
+
+    # Volatility: standard deviation of tick-to-tick log returns
+    returns = ticks['log_odds'] - groups['log_odds'].shift()
+    features['volatility'] = returns.groupby([ticks[k] for k in RUNNER_KEYS], sort=False).std()
+
+    # Slope of log odds per minute over the last window, least squares from grouped sums
+    minutes = (ticks['scraped_time'] - groups['scraped_time'].transform('last')).dt.total_seconds() / 60
+    recent = ticks.assign(t=minutes, ty=minutes * ticks['log_odds'], tt=minutes ** 2)[minutes >= -window_minutes]
+    sums = recent.groupby(RUNNER_KEYS, sort=False)[['t', 'log_odds', 'ty', 'tt']].sum()
+    n = recent.groupby(RUNNER_KEYS, sort=False).size()
+    denominator = n * sums['tt'] - sums['t'] ** 2
+    slope = (n * sums['ty'] - sums['t'] * sums['log_odds']) / denominator.where(denominator != 0)
+    features['slope_pct_per_min'] = (np.expm1(slope) * 100).reindex(features.index)
+
+    # Largest gap between the market and our predicted price at any tick
+    if card_df is not None and not card_df.empty:
+        predicted = (card_df[['race_id', 'horse_id', 'Odds predicted']]
+                     .drop_duplicates(['race_id', 'horse_id'])
+                     .rename(columns={'horse_id': 'horse_link'}))
+        ticks = ticks.merge(predicted, on=RUNNER_KEYS, how='left')
+        gap = ticks['odds'] / ticks['Odds predicted'] - 1
+        largest = (ticks.assign(gap=gap, abs_gap=gap.abs())
+                        .dropna(subset=['gap'])
+                        .sort_values('abs_gap', kind='stable')
+                        .groupby(RUNNER_KEYS, sort=False)['gap'].last())
+        features['odds_predicted'] = predicted.set_index(RUNNER_KEYS)['Odds predicted'].reindex(features.index)
+        features['largest_gap_pct'] = largest.reindex(features.index) * 100
+        features['latest_gap_pct'] = (features['latest_odds'] / features['odds_predicted'] - 1) * 100
+
+    return features.reset_index()
+
+
+@st.cache_resource(ttl=600, show_spinner=False)
+def odds_feature_table(version, _odds_df, _card_df):
+    # Cached per runner feature table, keyed by the card + odds data version
+    return runner_odds_features(_odds_df, _card_df)
+
+
+def biggest_movers(features, card_df, n=10):
+    # Top steamers (shortened) and drifters (lengthened) across the card by percentage move
+    # since the first tick, a runner whose price has not moved is neither
+    if features.empty:
+        return features, features
+    runners = (card_df[['race_id', 'horse_id', 'Horse', 'race_name', 'city', 'race_time_off']]
+               .drop_duplicates(['race_id', 'horse_id'])
+               .rename(columns={'horse_id': 'horse_link'}))
+    movers = features.merge(runners, on=RUNNER_KEYS, how='inner')
+    movers = movers[movers['ticks'] > 1]
+    steamers = movers[movers['pct_move'] < 0]
+    drifters = movers[movers['pct_move'] > 0]
+    return steamers.nsmallest(n, 'pct_move'), drifters.nlargest(n, 'pct_move')
@@ -0,0 +1,89 @@
+import pandas as pd
+import streamlit as st
+
+# Cached inputs for the race panels, shared by every session so callers must not
+# write to them. Underscore args are not hashed, the data version stands in for
+# them so each lookup is keyed on small scalars only.
+
+
+# Integer columns of the card tables, formatted by the frontend instead of a Styler
+CARD_COLUMN_CONFIG = {
+    'Horse number': st.column_config.NumberColumn(format='%d'),
+    'Form wins': st.column_config.NumberColumn(format='%d'),
+    'Predicted Position': st.column_config.NumberColumn(format='%d'),
+}
+
+
+def numbered(frame):
+    # Rows numbered from 1 for display, as the card tables have always shown them. The
+    # relabelled frame shares its column data with frame under copy-on-write.
+    return frame.set_axis(pd.RangeIndex(1, len(frame) + 1))
+
+
+@st.cache_resource(show_spinner=False, max_entries=64)
+def race_options(city, version, _df):
+    # Map of "HH:MM - race name" labels to (race date, course, race name) keys, sorted by
+    # time off. Labels carry the date as well when the frame spans several days, and the
+    # course on "All", so identically named races from different meetings stay apart.
+    df = _df if city == "All" else _df[_df['city'] == city]
+    race_dates = df['race_date'].dt.strftime('%Y-%m-%d')
+    if 'race_time_off' in df.columns:
+        labels = df['race_time_off'].astype(str) + " - " + df['race_name']
+    else:
+        labels = df['race_name']
+    if city == "All":
+        labels = labels + " (" + df['city'] + ")"
+    if race_dates.nunique() > 1:
+        labels = race_dates + " " + labels
+    options = dict(zip(labels, zip(race_dates, df['city'], df['race_name'])))
+    return {label: options[label] for label in sorted(options)}
+
+
+@st.cache_resource(show_spinner=False, max_entries=512)
+def race_frame(race_key, version, _df):
+    race_date, city, race_name = race_key
+    return _df[(_df['race_name'] == race_name) & (_df['city'] == city) & (_df['race_date'].dt.strftime('%Y-%m-%d') == race_date)]
+
+
+def add_race():
+    # Append the race picked in the trailing slot, the picker is reset for the next one
+    label = st.session_state.get('race_add')
+    if label is not None:
+        st.session_state['race_select'] = st.session_state.get('race_select', []) + [label]
+        st.session_state['race_add'] = None
+
+
+def remove_race(label):
+    st.session_state['race_select'] = [race for race in st.session_state.get('race_select', []) if race != label]
+
+
+@st.fragment
+def race_slot(slot, races, display_panel, display_selection):
+    # Selected races render as a chain of fragments, each slot holding one race and the
+    # next slot, the last one holding the race picker and the views over the selection.
+    # Adding a race reruns only the last slot, so panels already on screen are not rerun.
+    selected = [label for label in st.session_state.get('race_select', []) if label in races]
+    if slot < len(selected):
+        label = selected[slot]
+        st.button(f"Remove {label}", key=f"race_remove_{label}", on_click=remove_race, args=(label,))
+        display_panel(label, races[label])
+        race_slot(slot + 1, races, display_panel, display_selection)
+        return
+    remaining = [label for label in races if label not in selected]
+    if remaining:
+        st.selectbox("Add a race", remaining, index=None, placeholder="Select race name",
+                     key='race_add', on_change=add_race)
+    if not selected:
+        st.info("Please select at least one race name to display the data.")
+    # Views over the whole selection, in race time order
+    display_selection([label for label in races if label in selected])
+
+
+@st.cache_resource(show_spinner=False, max_entries=512)
+def race_odds_frame(race_id, version, _race_df, _odds_df):
+    # Odds ticks for one race joined to the runners on horse_id
+    if _odds_df.empty:
+        return _odds_df
+    race_odds_df = _odds_df[_odds_df['race_id'] == race_id]
+    race_odds_df = race_odds_df.rename(columns={'horse_link': 'horse_id'})
+    return pd.merge(race_odds_df, _race_df, on=['horse_id', 'race_id'], how='left')
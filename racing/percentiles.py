@@ -0,0 +1,78 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+
+class PercentileRanks:
+    # One sorted array per score column over a fixed population: every runner in the card
+    # table, loaded in one walk, with refreshed cards merged in by runner key. Merges are
+    # searchsorted/insert (O(n + m)) and lookups are binary searches, so no history is
+    # rescanned per render and the population does not depend on what was browsed.
+
+    def __init__(self, columns, key_columns=('race_id', 'horse_id')):
+        self.columns = list(columns)
+        self.key_columns = list(key_columns)
+        self._lock = threading.Lock()
+        self._sorted = {column: np.empty(0) for column in self.columns}
+        self._keys = pd.MultiIndex.from_tuples([], names=self.key_columns)
+        self._values = np.empty((0, len(self.columns)))
+        self._versions = set()
+
+    def __len__(self):
+        return len(self._keys)
+
+    def load(self, pages):
+        # Replace the population with the rows in pages (lists of row dicts), sorted once
+        frames = [pd.DataFrame(page, columns=self.key_columns + self.columns) for page in pages]
+        if not frames:
+            return
+        frame = pd.concat(frames, ignore_index=True).drop_duplicates(self.key_columns, keep='last')
+        # An owned copy, rows are overwritten in place when a card refreshes them
+        values = frame[self.columns].to_numpy(dtype=np.float64, na_value=np.nan, copy=True)
+        with self._lock:
+            self._keys = pd.MultiIndex.from_frame(frame[self.key_columns])
+            self._values = values
+            self._sorted = {column: np.sort(values[:, i][~np.isnan(values[:, i])]) for i, column in enumerate(self.columns)}
+            self._versions = set()
+
+    def update(self, version, df):
+        # Merge a card into the population, runners already in it are replaced with their latest scores
+        if version in self._versions or df.empty:
+            return
+        frame = df[self.key_columns + self.columns].drop_duplicates(self.key_columns, keep='last')
+        keys = pd.MultiIndex.from_frame(frame[self.key_columns])
+        values = frame[self.columns].to_numpy(dtype=np.float64, na_value=np.nan)
+        with self._lock:
+            positions = self._keys.get_indexer(keys)
+            seen = positions >= 0
+            for i, column in enumerate(self.columns):
+                population = self._sorted[column]
+                old = np.sort(self._values[positions[seen], i])
+                old = old[~np.isnan(old)]
+                if old.size:
+                    # Offset repeated values so each stale copy removes its own entry
+                    repeat = np.arange(old.size) - np.searchsorted(old, old)
+                    population = np.delete(population, np.searchsorted(population, old) + repeat)
+                new = np.sort(values[:, i][~np.isnan(values[:, i])])
+                self._sorted[column] = np.insert(population, np.searchsorted(population, new), new)
+            self._values[positions[seen]] = values[seen]
+            self._keys = self._keys.append(keys[~seen])
+            self._values = np.vstack([self._values, values[~seen]])
+            self._versions.add(version)
+
+    def percentiles(self, column, values):
+        # Mid-rank percentile (0-100) of each value within the population, NaN when unknown
+        population = self._sorted[column]
+        values = np.asarray(values, dtype=np.float64)
+        if population.size == 0:
+            return np.full(values.shape, np.nan)
+        below = np.searchsorted(population, values, side='left')
+        at_or_below = np.searchsorted(population, values, side='right')
+        ranks = (below + at_or_below) / 2 / population.size * 100
+        return np.where(np.isnan(values), np.nan, ranks)
+
+    def frame(self, df):
+        # Percentile columns for a whole field, same column names as the raw scores
+        return pd.DataFrame({column: self.percentiles(column, df[column]) for column in self.columns},
+                            index=df.index)
@@ -0,0 +1,197 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+# Multi-leg pool bets (placepot, jackpot, pick-N). A perm picks some runners in every
+# leg and costs one unit stake per line, the product of the picks per leg. For a given
+# number of picks the best runners in a leg are its most likely ones, so a leg is
+# summarised by its coverage array: the chance that its k most likely runners cover
+# the leg, for every k. Perms are then found by dynamic programming over the legs on
+# the number of lines, instead of enumerating ticket combinations.
+
+# Pool -> (what a pick must do, legs in the pool or None for any number, countries it
+# runs in or None for all). Placepot, Quadpot and Jackpot are UK and Irish tote pools and
+# place pools are paid on UK/IE place terms, elsewhere only the generic Pick-N is offered.
+POOLS = {
+    'Placepot': ('place', 6, ('uk', 'ie')),
+    'Quadpot': ('place', 4, ('uk', 'ie')),
+    'Jackpot': ('win', 6, ('uk', 'ie')),
+    'Pick-N': ('win', None, None),
+}
+
+# Lines searched at most, larger budgets are capped
+MAX_LINES = 100_000
+
+# Gauss-Laguerre nodes for the place coverage integral
+QUADRATURE_NODES = 64
+
+# Frontier perms listed in the table
+MAX_FRONTIER_ROWS = 25
+
+
+def places_paid(runners, race_name=''):
+    # UK and Irish place terms by declared runners, the place pools only run there
+    if runners < 5:
+        return 1
+    if runners < 8:
+        return 2
+    if runners >= 16 and 'handicap' in race_name.lower():
+        return 4
+    return 3
+
+
+def leg_coverage(win_probs, places=1):
+    # c[k - 1] = chance that at least one of the k most likely runners finishes in the
+    # first `places`, for k = 1..n. Finishing orders follow the Harville model on the win
+    # probabilities, so picks that would place together are not counted twice.
+    p = np.sort(np.nan_to_num(np.asarray(win_probs, dtype=float)))[::-1]
+    if p.sum() <= 0:
+        p = np.full(len(p), 1 / len(p))
+    p = p / p.sum()
+    covered = np.cumsum(p)
+    if places > 1:
+        covered = 1 - _all_placed_elsewhere(p, places)
+    return np.clip(covered, 0, 1)
+
+
+def _all_placed_elsewhere(p, places):
+    # For every k, the chance that all of the first `places` finishers come from outside
+    # the k most likely runners. As an exponential race with rates p, that is the chance
+    # that `places` of the others arrive before the first of the k picks:
+    #   integral over t of P_k e^(-P_k t) P(at least `places` others by t) dt
+    # with P_k the picks' total rate, taken by Gauss-Laguerre on x = P_k t.
+    n = len(p)
+    x, w = np.polynomial.laguerre.laggauss(QUADRATURE_NODES)
+    picked = np.cumsum(p)
+    t = x[None, :] / np.maximum(picked, 1e-12)[:, None]
+    # below[c] = P(exactly c of the others arrived by t), for c < places; row k - 1 of every
+    # array is the set of k picks, runners ranked k and below are the others
+    below = np.zeros((places, n, len(x)))
+    below[0] = 1
+    for r in range(1, n):
+        arrived = 1 - np.exp(-p[r] * t[:r])
+        stay = below[:, :r] * (1 - arrived)
+        stay[1:] += below[:-1, :r] * arrived
+        below[:, :r] = stay
+    at_least = 1 - below.sum(axis=0)
+    return at_least @ w
+
+
+def optimal_perms(coverages, max_lines):
+    # Best log hit probability of a perm with exactly m lines, m = 0..max_lines, and for
+    # every leg the picks that reach it
+    best = np.full(max_lines + 1, -np.inf)
+    best[1] = 0.0
+    picks = []
+    with np.errstate(divide='ignore'):
+        for coverage in coverages:
+            log_coverage = np.log(coverage)
+            new = np.full(max_lines + 1, -np.inf)
+            pick = np.zeros(max_lines + 1, dtype=np.int64)
+            for k in range(1, min(len(coverage), max_lines) + 1):
+                lines = np.arange(1, max_lines // k + 1)
+                candidate = best[lines] + log_coverage[k - 1]
+                better = candidate > new[lines * k]
+                new[lines[better] * k] = candidate[better]
+                pick[lines[better] * k] = k
+            best = new
+            picks.append(pick)
+    return best, picks
+
+
+def perm_picks(picks, lines):
+    # Picks per leg of the perm with this many lines
+    counts = []
+    for pick in reversed(picks):
+        k = int(pick[lines])
+        counts.append(k)
+        lines //= k
+    return counts[::-1]
+
+
+def frontier(best):
+    # Line counts where the hit probability beats every cheaper perm
+    lines = np.flatnonzero(np.isfinite(best))
+    improves = best[lines] > np.maximum.accumulate(np.concatenate([[-np.inf], best[lines][:-1]]))
+    return lines[improves]
+
+
+def legs_covered(leg_coverage):
+    # Chance of covering exactly j legs, j = 0..legs, by dynamic programming over the legs
+    distribution = np.zeros(len(leg_coverage) + 1)
+    distribution[0] = 1
+    for c in leg_coverage:
+        distribution[1:] = distribution[1:] * (1 - c) + distribution[:-1] * c
+        distribution[0] *= 1 - c
+    return distribution
+
+
+def pool_legs(legs, event):
+    # Runners of each leg from most to least likely, and the leg's coverage array
+    prepared = []
+    for label, race_df in legs:
+        race_df = race_df.sort_values('Win probability', ascending=False, na_position='last')
+        places = places_paid(len(race_df), str(race_df['race_name'].iloc[0])) if event == 'place' else 1
+        prepared.append((label, race_df['Horse'].tolist(), leg_coverage(race_df['Win probability'], places), places))
+    return prepared
+
+
+def country_pools(country):
+    return [pool for pool, (_, _, countries) in POOLS.items() if countries is None or country in countries]
+
+
+def display_pool_bets(country, legs):
+    # Pool perms over the selected races, legs are (label, race frame) in race time order
+    legs = [(label, race_df) for label, race_df in legs if not race_df.empty]
+    if len(legs) < 2:
+        return
+    pools = country_pools(country)
+    with st.expander(f"SHOW POOL BETS ({' / '.join(pool.upper() for pool in pools)})"):
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            pool = st.selectbox("Pool", pools, key='pool_type')
+        with col2:
+            unit = st.number_input("Unit stake", min_value=0.01, value=1.0, step=0.5, key='pool_unit')
+        with col3:
+            budget = st.number_input("Budget", min_value=0.01, value=50.0, step=10.0, key='pool_budget')
+        event, pool_legs_count, _ = POOLS[pool]
+        if pool_legs_count is not None and len(legs) != pool_legs_count:
+            st.info(f"A {pool} has {pool_legs_count} legs, {len(legs)} races are selected. Showing a {len(legs)}-leg pool.")
+        max_lines = int(min(MAX_LINES, budget // unit))
+        if max_lines < 1:
+            st.info("The budget does not cover a single line.")
+            return
+
+        prepared = pool_legs(legs, event)
+        best, picks = optimal_perms([coverage for _, _, coverage, _ in prepared], max_lines)
+        points = frontier(best)
+        lines = int(points[-1])
+        counts = perm_picks(picks, lines)
+        coverage = np.array([leg[2][k - 1] for leg, k in zip(prepared, counts)])
+
+        verb = "place" if event == 'place' else "win"
+        st.markdown(f"**Best perm within budget:** {lines} lines, cost {lines * unit:.2f}, "
+                    f"hit probability {np.exp(best[lines]):.2%}, expected legs covered {coverage.sum():.2f} of {len(prepared)}")
+        st.dataframe(pd.DataFrame({
+            'Leg': [label for label, _, _, _ in prepared],
+            'Picks': counts,
+            'Selections': [", ".join(horses[:k]) for (_, horses, _, _), k in zip(prepared, counts)],
+            'Places paid': [places for _, _, _, places in prepared],
+            'Leg coverage': coverage,
+        }), use_container_width=True, hide_index=True, column_config={
+            'Leg coverage': st.column_config.ProgressColumn(format='%.3f', min_value=0, max_value=1,
+                                                           help=f"Chance that one of the picks will {verb}"),
+        })
+        st.caption("Legs covered: " + " | ".join(f"{j}: {share:.1%}" for j, share in enumerate(legs_covered(coverage))))
+
+        st.markdown("**Cheapest perm for each hit probability**")
+        shown = points if len(points) <= MAX_FRONTIER_ROWS else points[np.unique(np.linspace(0, len(points) - 1, MAX_FRONTIER_ROWS).round().astype(int))]
+        st.dataframe(pd.DataFrame({
+            'Lines': shown,
+            'Cost': shown * unit,
+            'Hit probability': np.exp(best[shown]),
+            'Picks per leg': ["-".join(map(str, perm_picks(picks, int(m)))) for m in shown],
+        }), use_container_width=True, hide_index=True, column_config={
+            'Cost': st.column_config.NumberColumn(format='%.2f'),
+            'Hit probability': st.column_config.NumberColumn(format='%.4f'),
+        })
@@ -0,0 +1,150 @@
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+# Bump when the prompts change, so every preview is regenerated once
+PROMPT_VERSION = 1
+
+# Concurrent generation requests sent to the model backend
+MAX_PARALLEL_REQUESTS = 4
+
+PREVIEW_STORE_PATH = ".preview_cache"
+
+RUNNER_FIELDS = ['Horse', 'Jockey', 'Last 5 races', 'Win probability', 'Top3 probability',
+                 'Betting hint (+)', 'Betting hint (-)']
+
+
+def runner_prompt(race, runner):
+    details = "\n".join(f"- {field}: {runner[field]}" for field in RUNNER_FIELDS if field in runner and pd.notna(runner[field]))
+    return (f"Write a short, upbeat preview (3 sentences) of one runner for a horse racing fan.\n"
+            f"Race: {race['race_name']} at {race['city']} on {race['race_date']}\n"
+            f"Runner:\n{details}")
+
+
+def race_prompt(race, runners):
+    lines = []
+    for runner in runners:
+        lines.append(", ".join(f"{field}: {runner[field]}" for field in RUNNER_FIELDS if field in runner and pd.notna(runner[field])))
+    return (f"Write a race preview in markdown (about 150 words) covering the favourites, the challengers and the outsiders.\n"
+            f"Race: {race['race_name']} at {race['city']} on {race['race_date']}\n"
+            f"Runners (by win probability):\n" + "\n".join(lines))
+
+
+class StubBackend:
+    # Deterministic local stand-in for a language model, used in tests and offline runs
+    name = "stub"
+
+    def generate(self, prompt):
+        digest = hashlib.sha256(prompt.encode()).hexdigest()[:8]
+        lines = [line for line in prompt.splitlines() if line.startswith(("Race:", "- Horse:"))]
+        return f"[preview {digest}] " + " | ".join(lines)
+
+
+class ChatCompletionsBackend:
+    # Any OpenAI compatible /chat/completions endpoint
+    def __init__(self, url, api_key, model, timeout=60):
+        import httpx
+        self.name = f"chat:{model}"
+        self._client = httpx.Client(timeout=timeout, headers={"Authorization": f"Bearer {api_key}"})
+        self._url = url
+        self._model = model
+
+    def generate(self, prompt):
+        response = self._client.post(self._url, json={
+            "model": self._model,
+            "messages": [{"role": "user", "content": prompt}],
+        })
+        response.raise_for_status()
+        return response.json()["choices"][0]["message"]["content"].strip()
+
+
+class PreviewStore:
+    # Content addressed: previews are stored under a hash of backend + prompt,
+    # so a runner whose inputs did not change always hits the store.
+
+    def __init__(self, path=PREVIEW_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._memory = {}
+
+    def key(self, backend, prompt):
+        payload = json.dumps([PROMPT_VERSION, backend.name, prompt])
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _file(self, key):
+        return os.path.join(self.path, key[:2], f"{key}.json")
+
+    def get(self, key):
+        if key in self._memory:
+            return self._memory[key]
+        try:
+            with open(self._file(key), encoding="utf-8") as f:
+                text = json.load(f)["preview"]
+        except FileNotFoundError:
+            return None
+        self._memory[key] = text
+        return text
+
+    def put(self, key, text):
+        file = self._file(key)
+        os.makedirs(os.path.dirname(file), exist_ok=True)
+        with self._lock:
+            with open(file, "w", encoding="utf-8") as f:
+                json.dump({"preview": text}, f)
+            self._memory[key] = text
+
+
+def _race_groups(card_df):
+    card = card_df.assign(race_date=pd.to_datetime(card_df['race_date']).dt.strftime('%Y-%m-%d'))
+    for (race_date, city, race_name), runners in card.groupby(['race_date', 'city', 'race_name'], sort=True):
+        race = {'race_date': race_date, 'city': city, 'race_name': race_name}
+        yield race, runners.sort_values('Win probability', ascending=False).to_dict('records')
+
+
+def preview_jobs(card_df):
+    # (race key, horse or None for the race preview, prompt) for every race on the card.
+    # Race keys are (race_date, city, race_name), race names repeat across courses.
+    for race, runners in _race_groups(card_df):
+        race_key = (race['race_date'], race['city'], race['race_name'])
+        yield race_key, None, race_prompt(race, runners)
+        for runner in runners:
+            yield race_key, runner['Horse'], runner_prompt(race, runner)
+
+
+def generate_previews(card_df, backend, store, max_workers=MAX_PARALLEL_REQUESTS):
+    # Generate every missing preview on the card with bounded parallelism. A failed request
+    # is skipped and generated on the next call, the others carry on. Returns the number
+    # generated and the (race key, horse, error) of each failure.
+    pending = {}
+    for race_key, horse, prompt in preview_jobs(card_df):
+        key = store.key(backend, prompt)
+        if store.get(key) is None:
+            pending[key] = (race_key, horse, prompt)
+    if not pending:
+        return 0, []
+
+    def run(item):
+        key, (race_key, horse, prompt) = item
+        try:
+            store.put(key, backend.generate(prompt))
+        except Exception as e:
+            return race_key, horse, e
+        return None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        failed = [failure for failure in pool.map(run, pending.items()) if failure is not None]
+    return len(pending) - len(failed), failed
+
+
+def lookup_previews(card_df, backend, store):
+    # Previews already in the store, keyed by (race_date, city, race_name) -> {None: race text, horse: text}
+    previews = {}
+    for race_key, horse, prompt in preview_jobs(card_df):
+        text = store.get(store.key(backend, prompt))
+        if text is not None:
+            previews.setdefault(race_key, {})[horse] = text
+    return previews
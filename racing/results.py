@@ -0,0 +1,136 @@
+import pandas as pd
+import streamlit as st
+from google.api_core.exceptions import NotFound
+
+from racing.bq_budget import run_query
+from racing.fetch import guarded
+from racing.history import fetch_rows_since
+
+# Finishing positions joined to the predictions they settle, read incrementally.
+# Every consumer keeps a ResultsCursor: a refresh only reads the last few days of
+# results and drops the races it already counted, so the work is proportional to the
+# number of new races rather than the size of the archive.
+#
+# Results are read from a BigQuery table per country, named in secrets:
+#
+#   [results_tables]
+#   uk = "project.dataset.table"
+#
+# It needs the runner keys and a numeric finishing position, the trainer is read when
+# present. Features built on results are skipped for a country without a usable table.
+
+RACE_KEYS = ['race_date', 'city', 'race_name']
+RUNNER_KEYS = RACE_KEYS + ['horse']
+
+# Columns read from a results table besides the runner keys, the first one is required
+RESULT_COLUMNS = ['position', 'trainer']
+
+# Results can land days after a race. The last SETTLE_DAYS days up to the cursor are
+# read again on every refresh, so late results are still counted. Races older than
+# that are taken as final.
+SETTLE_DAYS = 7
+
+
+class ResultsCursor:
+    # Races are counted by day: days before the settle window are final, inside it the
+    # races already counted are remembered
+
+    def __init__(self, through=None, counted=(), settle_days=SETTLE_DAYS):
+        self.through = through
+        self.counted = set(counted)
+        self.settle_days = settle_days
+
+    @property
+    def window_start(self):
+        # First day read again on a refresh, None before anything is counted
+        if self.through is None:
+            return None
+        return (pd.Timestamp(self.through) - pd.Timedelta(days=self.settle_days)).strftime('%Y-%m-%d')
+
+    def unseen(self, joined):
+        if joined.empty or self.through is None:
+            return joined
+        seen = (joined['race_date'] < pd.Timestamp(self.window_start)) | _race_ids(joined).isin(self.counted)
+        return joined[~seen]
+
+    def advance(self, joined):
+        # Mark the races in joined as counted, returns how many there were
+        if joined.empty:
+            return 0
+        races = joined[RACE_KEYS].drop_duplicates()
+        last_day = races['race_date'].max()
+        if self.through is None or last_day > pd.Timestamp(self.through):
+            self.through = last_day.strftime('%Y-%m-%d')
+        self.counted.update(_race_ids(races))
+        # Ids start with the date, races that left the window are final and forgotten
+        start = self.window_start
+        self.counted = {race for race in self.counted if race[:10] >= start}
+        return len(races)
+
+    def to_dict(self):
+        return {'through': self.through, 'counted': sorted(self.counted)}
+
+    @classmethod
+    def from_dict(cls, state):
+        if 'counted' in state:
+            return cls(state['through'], state['counted'])
+        # Saved before the settle window, only the races of the last day were kept
+        return cls(state['through'], [f"{state['through']}|{race}" for race in state['races_on_through']])
+
+
+def _race_ids(df):
+    return df['race_date'].dt.strftime('%Y-%m-%d') + '|' + df['city'].astype(str) + '|' + df['race_name'].astype(str)
+
+
+def results_table(country):
+    # The country's results table from secrets, None when there is none
+    try:
+        return st.secrets.get("results_tables", {}).get(country)
+    except FileNotFoundError:
+        return None
+
+
+def results_source(bq_client, country):
+    # (table, columns to read) for the country's results, None when no table is
+    # configured, it does not exist or it lacks the required columns
+    table = results_table(country)
+    if not table:
+        return None
+    try:
+        schema = guarded('bigquery', table, bq_client.get_table, table).schema
+    except NotFound:
+        return None
+    names = {field.name for field in schema}
+    if not set(RUNNER_KEYS + RESULT_COLUMNS[:1]) <= names:
+        return None
+    return table, RUNNER_KEYS + [c for c in RESULT_COLUMNS if c in names]
+
+
+def join_results(predictions, results):
+    # One row per finisher with its predictions, result columns and field size
+    predictions = predictions.assign(race_date=pd.to_datetime(predictions['race_date']))
+    results = results.assign(race_date=pd.to_datetime(results['race_date']))
+    results = results[results['position'].notna()]
+    settled = [c for c in RESULT_COLUMNS if c in results.columns]
+    predictions = predictions.drop(columns=settled, errors='ignore').drop_duplicates(RUNNER_KEYS)
+    joined = predictions.merge(results[RUNNER_KEYS + settled], on=RUNNER_KEYS)
+    return joined.assign(field_size=joined.groupby(RACE_KEYS)['position'].transform('max'))
+
+
+def fetch_new_results(country, label, supabase, table, bq_client, source, prediction_columns, cursor):
+    # Results from the cursor's settle window onwards joined with the matching prediction
+    # rows, races the cursor already counted are dropped. source is from results_source.
+    results_table, result_columns = source
+    query = f"SELECT {', '.join(result_columns)} FROM `{results_table}`"
+    if cursor.through is not None:
+        query += f" WHERE race_date >= '{cursor.window_start}'"
+    # Reads go through breakers of their own, a failing results join never blocks the card
+    query_label = f'{label}: {results_table.split(".")[-1]}'
+    results = guarded('bigquery', query_label, run_query, bq_client, query, country, query_label)
+    if results.empty:
+        return pd.DataFrame()
+    columns = RUNNER_KEYS + [c for c in prediction_columns if c not in RUNNER_KEYS]
+    predictions = pd.DataFrame(guarded('supabase', f'{label}: {table}', fetch_rows_since, supabase, table, columns, cursor.window_start))
+    if predictions.empty:
+        return pd.DataFrame()
+    return cursor.unseen(join_results(predictions, results))
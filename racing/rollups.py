@@ -0,0 +1,203 @@
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import streamlit as st
+
+from racing.results import ResultsCursor, fetch_new_results, results_source
+
+# Career rollups per jockey and trainer: rides, wins, places, the return of a level
+# stake at the initial market odds and the wins expected from our odds_predicted.
+# Totals live in one numpy array per metric, rows are addressed through a dict on
+# (role, name), so a day's results only touch the names that rode that day and a
+# panel looks a runner up without scanning history.
+
+ROLES = ('jockey', 'trainer')
+
+METRICS = ('rides', 'wins', 'places', 'staked', 'returns', 'expected_wins')
+
+# Prediction columns the rollups read alongside the results
+PREDICTION_COLUMNS = ['jockey', 'odds', 'odds_predicted']
+
+ROLLUP_STORE_PATH = ".rollups"
+
+
+class Rollups:
+    # Totals for one country
+
+    def __init__(self):
+        self.keys = []
+        self._index = {}
+        self.totals = {metric: np.zeros(0) for metric in METRICS}
+        # Trainer of each horse at its latest run, cards do not carry the trainer
+        self.trainers = {}
+        self.cursor = ResultsCursor()
+
+    def _rows(self, keys):
+        # Row of each (role, name), appending rows for names seen for the first time
+        new = [key for key in dict.fromkeys(keys) if key not in self._index]
+        if new:
+            for key in new:
+                self._index[key] = len(self.keys)
+                self.keys.append(key)
+            for metric in METRICS:
+                self.totals[metric] = np.concatenate([self.totals[metric], np.zeros(len(new))])
+        return np.fromiter((self._index[key] for key in keys), dtype=np.int64, count=len(keys))
+
+    def merge(self, joined):
+        # Add finishers from races not counted yet, returns the number of new races
+        joined = self.cursor.unseen(joined)
+        if joined.empty:
+            return 0
+        position = joined['position'].astype(float)
+        odds = pd.to_numeric(joined['odds'], errors='coerce')
+        predicted = pd.to_numeric(joined['odds_predicted'], errors='coerce')
+        runs = pd.DataFrame({
+            'rides': 1.0,
+            'wins': (position == 1).astype(float),
+            'places': (position <= 3).astype(float),
+            'staked': odds.notna().astype(float),
+            'returns': odds.where(position == 1, 0).fillna(0),
+            'expected_wins': (1 / predicted).fillna(0),
+        }, index=joined.index)
+        for role in ROLES:
+            if role not in joined.columns:
+                continue
+            names = joined[role]
+            totals = runs[names.notna()].groupby(names[names.notna()]).sum()
+            rows = self._rows([(role, name) for name in totals.index])
+            for metric in METRICS:
+                self.totals[metric][rows] += totals[metric].to_numpy()
+        if 'trainer' in joined.columns:
+            latest = joined[joined['trainer'].notna()].sort_values('race_date')
+            self.trainers.update(zip(latest['horse'], latest['trainer']))
+        return self.cursor.advance(joined)
+
+    def lookup(self, role, names):
+        # Rollup rows for names in order, NaN for names without a counted ride
+        rows = np.array([self._index.get((role, name), -1) for name in names], dtype=np.int64)
+        found = rows >= 0
+        totals = {}
+        for metric in METRICS:
+            column = np.full(len(rows), np.nan)
+            column[found] = self.totals[metric][rows[found]]
+            totals[metric] = column
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return pd.DataFrame({
+                'Rides': totals['rides'],
+                'Strike rate %': 100 * totals['wins'] / totals['rides'],
+                'Place rate %': 100 * totals['places'] / totals['rides'],
+                'ROI %': 100 * (totals['returns'] - totals['staked']) / totals['staked'],
+                'A/E': totals['wins'] / totals['expected_wins'],
+            })
+
+    def to_arrow(self):
+        table = pa.table({
+            'role': [role for role, _ in self.keys],
+            'name': [name for _, name in self.keys],
+            **{metric: self.totals[metric] for metric in METRICS},
+        })
+        return table.replace_schema_metadata({'cursor': json.dumps(self.cursor.to_dict())})
+
+    @classmethod
+    def from_arrow(cls, table, trainers):
+        rollups = cls()
+        rollups.keys = list(zip(table.column('role').to_pylist(), table.column('name').to_pylist()))
+        rollups._index = {key: i for i, key in enumerate(rollups.keys)}
+        rollups.totals = {metric: table.column(metric).to_numpy().astype(float) for metric in METRICS}
+        rollups.trainers = dict(zip(trainers.column('horse').to_pylist(), trainers.column('trainer').to_pylist()))
+        rollups.cursor = ResultsCursor.from_dict(json.loads(table.schema.metadata[b'cursor']))
+        return rollups
+
+
+class RollupStore:
+    # Per-country rollups, written as Parquet after every merge so a restart resumes
+    # from the last counted day instead of replaying history
+
+    def __init__(self, path=ROLLUP_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._countries = {}
+
+    def _files(self, country):
+        return os.path.join(self.path, f"{country}.parquet"), os.path.join(self.path, f"{country}_trainers.parquet")
+
+    def get(self, country):
+        with self._lock:
+            if country not in self._countries:
+                totals, trainers = self._files(country)
+                try:
+                    self._countries[country] = Rollups.from_arrow(pq.read_table(totals), pq.read_table(trainers))
+                except (OSError, ValueError, KeyError, TypeError):
+                    self._countries[country] = Rollups()
+            return self._countries[country]
+
+    def merge(self, country, joined):
+        rollups = self.get(country)
+        with self._lock:
+            added = rollups.merge(joined)
+            if added:
+                os.makedirs(self.path, exist_ok=True)
+                totals, trainers = self._files(country)
+                pq.write_table(pa.table({'horse': list(rollups.trainers), 'trainer': list(rollups.trainers.values())}), trainers + ".tmp")
+                pq.write_table(rollups.to_arrow(), totals + ".tmp")
+                os.replace(trainers + ".tmp", trainers)
+                os.replace(totals + ".tmp", totals)
+        return added
+
+
+@st.cache_resource
+def rollup_store():
+    return RollupStore()
+
+
+def update_rollups(country, supabase, table, bq_client):
+    # Merge newly settled results, returns the country's rollups or None without a results table
+    source = results_source(bq_client, country)
+    if source is None:
+        return None
+    store = rollup_store()
+    joined = fetch_new_results(country, 'Rollups', supabase, table, bq_client, source,
+                               PREDICTION_COLUMNS, store.get(country).cursor)
+    store.merge(country, joined)
+    return store.get(country)
+
+
+def connections_table(race_df, rollups):
+    # Jockey and trainer rollups for every runner in a race
+    jockeys = race_df['Jockey'].tolist()
+    if 'trainer' in race_df.columns:
+        trainers = race_df['trainer'].tolist()
+    else:
+        trainers = [rollups.trainers.get(horse) for horse in race_df['Horse']]
+    jockey_stats = rollups.lookup('jockey', jockeys).add_prefix('Jockey ')
+    trainer_stats = rollups.lookup('trainer', trainers).add_prefix('Trainer ')
+    return pd.concat([
+        pd.DataFrame({'Horse': race_df['Horse'].tolist(), 'Jockey': jockeys}), jockey_stats,
+        pd.DataFrame({'Trainer': trainers}), trainer_stats,
+    ], axis=1)
+
+
+CONNECTIONS_COLUMN_CONFIG = {
+    **{f'{role} Rides': st.column_config.NumberColumn(format='%d') for role in ('Jockey', 'Trainer')},
+    **{f'{role} {metric}': st.column_config.NumberColumn(format='%.1f')
+       for role in ('Jockey', 'Trainer') for metric in ('Strike rate %', 'Place rate %', 'ROI %')},
+    **{f'{role} A/E': st.column_config.NumberColumn(format='%.2f', help="Actual wins / wins expected from our predicted odds")
+       for role in ('Jockey', 'Trainer')},
+}
+
+
+def display_connections(race_df, rollups):
+    if rollups is None:
+        st.info("No results table is configured for this country (results_tables in secrets).")
+        return
+    if rollups.cursor.through is None:
+        st.info("No results available yet.")
+        return
+    st.caption(f"Career records from results through {rollups.cursor.through}. ROI is a level stake at the initial market odds.")
+    st.dataframe(connections_table(race_df, rollups), use_container_width=True, hide_index=True,
+                 column_config=CONNECTIONS_COLUMN_CONFIG)
@@ -0,0 +1,214 @@
+import bisect
+import functools
+import threading
+import unicodedata
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from racing.panels import race_options
+
+# Columns indexed for every card and the label shown next to a hit
+SEARCH_FIELDS = {'Horse': 'Horse', 'Jockey': 'Jockey', 'race_name': 'Race', 'city': 'Course'}
+
+# Country pages, used to jump to a race loaded by another page
+COUNTRY_PAGES = {
+    'uk': ("pages/United_Kingdom.py", "🇬🇧"),
+    'fr': ("pages/France.py", "🇫🇷"),
+    'hk': ("pages/Hong Kong.py", "🇭🇰"),
+    'ie': ("pages/Ireland.py", "🇮🇪"),
+    'za': ("pages/South Africa.py", "🇿🇦"),
+}
+
+# Hits below this trigram similarity are dropped
+MIN_SIMILARITY = 0.3
+
+
+# Names repeat across refreshes, so their normalised forms are kept
+@functools.lru_cache(maxsize=1 << 16)
+def normalise(text):
+    text = unicodedata.normalize('NFKD', str(text))
+    return ''.join(c for c in text if not unicodedata.combining(c)).lower().strip()
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SearchIndex:
+    # Trigram + prefix index over the distinct names on every loaded card.
+    # Terms are (field, normalised text); each term points at the races it appears in,
+    # per country. A refresh is diffed against the card's previous postings, so only the
+    # terms whose races changed are touched. Terms are numbered and every trigram keeps
+    # the numbers of its terms in an array, so a fuzzy query is one bincount.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versions = {}
+        # Postings of the last card indexed per source, term -> (display, refs)
+        self._cards = {}
+        self._postings = {}
+        self._display = {}
+        self._sorted_terms = []
+        self._term_ids = {}
+        self._terms = []
+        self._free_ids = []
+        self._term_sizes = np.zeros(0)
+        self._trigram_ids = defaultdict(set)
+        # Arrays of the trigram sets, rebuilt on the first query after a set changes
+        self._trigram_arrays = {}
+
+    def update(self, source, version, df):
+        if self._versions.get(source) == version:
+            return
+        postings = _card_postings(df)
+        with self._lock:
+            previous = self._cards.get(source, {})
+            for term in previous.keys() - postings.keys():
+                self._remove(source, term)
+            for term, (display, refs) in postings.items():
+                if previous.get(term, (None, None))[1] != refs:
+                    self._add(source, term, display, refs)
+            self._cards[source] = postings
+            self._versions[source] = version
+
+    def _add(self, source, term, display, refs):
+        if term not in self._postings:
+            self._postings[term] = {}
+            self._display[term] = display
+            if self._free_ids:
+                term_id = self._free_ids.pop()
+                self._terms[term_id] = term
+            else:
+                term_id = len(self._terms)
+                self._terms.append(term)
+                if term_id == len(self._term_sizes):
+                    self._term_sizes = np.concatenate([self._term_sizes, np.zeros(max(term_id, 64))])
+            self._term_ids[term] = term_id
+            grams = trigrams(term[1])
+            self._term_sizes[term_id] = len(grams)
+            for gram in grams:
+                self._trigram_ids[gram].add(term_id)
+                self._trigram_arrays.pop(gram, None)
+            bisect.insort(self._sorted_terms, (term[1], term[0]))
+        self._postings[term][source] = refs
+
+    def _remove(self, source, term):
+        sources = self._postings[term]
+        del sources[source]
+        if sources:
+            return
+        del self._postings[term]
+        del self._display[term]
+        term_id = self._term_ids.pop(term)
+        self._terms[term_id] = None
+        self._free_ids.append(term_id)
+        for gram in trigrams(term[1]):
+            self._trigram_ids[gram].discard(term_id)
+            self._trigram_arrays.pop(gram, None)
+            if not self._trigram_ids[gram]:
+                del self._trigram_ids[gram]
+        self._sorted_terms.pop(bisect.bisect_left(self._sorted_terms, (term[1], term[0])))
+
+    def _trigram_array(self, gram):
+        array = self._trigram_arrays.get(gram)
+        if array is None:
+            array = self._trigram_arrays[gram] = np.fromiter(self._trigram_ids.get(gram, ()), dtype=np.int64)
+        return array
+
+    def search(self, query, limit=10):
+        query = normalise(query)
+        if not query:
+            return []
+        with self._lock:
+            scores = {}
+            # Exact prefixes rank above fuzzy matches
+            start = bisect.bisect_left(self._sorted_terms, (query, ''))
+            for text, field in self._sorted_terms[start:start + limit]:
+                if not text.startswith(query):
+                    break
+                scores[(field, text)] = 2.0 - len(text) / 1000
+            # Typo tolerant: rank the rest by trigram overlap (Jaccard)
+            grams = trigrams(query)
+            ids = np.concatenate([self._trigram_array(gram) for gram in grams] + [np.zeros(0, dtype=np.int64)])
+            if ids.size:
+                counts = np.bincount(ids)
+                candidates = np.flatnonzero(counts)
+                common = counts[candidates]
+                similarity = common / (len(grams) + self._term_sizes[candidates] - common)
+                similar = similarity >= MIN_SIMILARITY
+                candidates, similarity = candidates[similar], similarity[similar]
+                # At most limit prefix hits rank above these, so the best 2 * limit are enough
+                top = np.argsort(-similarity, kind='stable')[:2 * limit]
+                candidates, similarity = candidates[top], similarity[top]
+                for term_id, value in zip(candidates.tolist(), similarity.tolist()):
+                    scores.setdefault(self._terms[term_id], value)
+            # Ties keep a stable order: alphabetical by term
+            best = sorted(scores, key=lambda term: (-scores[term], term[1], term[0]))[:limit]
+            hits = []
+            for term in best:
+                for source, refs in self._postings[term].items():
+                    for ref in refs:
+                        hits.append((SEARCH_FIELDS[term[0]], self._display[term], source) + ref)
+            return hits[:limit]
+
+
+def _card_postings(df):
+    # term -> (display text, sorted tuple of (race_date, city, race_name)) for one card
+    postings = {}
+    if df.empty:
+        return postings
+    race_dates = df['race_date'].dt.strftime('%Y-%m-%d')
+    for field in SEARCH_FIELDS:
+        frame = pd.DataFrame({'value': df[field].astype(str), 'race_date': race_dates,
+                              'city': df['city'], 'race_name': df['race_name']}).drop_duplicates()
+        values = frame['value'].tolist()
+        terms = {value: (field, normalise(value)) for value in set(values)}
+        refs = defaultdict(set)
+        displays = {}
+        races = zip(frame['race_date'].tolist(), frame['city'].tolist(), frame['race_name'].tolist())
+        for value, ref in zip(values, races):
+            refs[terms[value]].add(ref)
+            displays.setdefault(terms[value], value)
+        postings.update((term, (displays[term], tuple(sorted(races)))) for term, races in refs.items())
+    return postings
+
+
+@st.cache_resource
+def search_index():
+    return SearchIndex()
+
+
+def display_search(source):
+    query = st.text_input("Search horses, jockeys, races or courses", key='search_query')
+    if not query:
+        return
+    hits = search_index().search(query)
+    if not hits:
+        st.caption("No matches on the loaded cards.")
+        return
+    for i, (field, value, hit_source, race_date, city, race_name) in enumerate(hits):
+        flag = COUNTRY_PAGES[hit_source][1]
+        label = f"{flag} {field}: **{value}** — {race_name}, {city} ({race_date})"
+        if st.button(label, key=f"search_hit_{i}"):
+            st.session_state['search_jump'] = (hit_source, race_date, city, race_name)
+            if hit_source != source:
+                st.switch_page(COUNTRY_PAGES[hit_source][0])
+
+
+def apply_search_jump(source, version, df):
+    # Preselect the race picked in the search box, must run before the race widgets are created
+    jump = st.session_state.get('search_jump')
+    if not jump or jump[0] != source:
+        return
+    del st.session_state['search_jump']
+    _, race_date, city, race_name = jump
+    races = race_options(city, version, df)
+    for label, race_key in races.items():
+        if race_key == (race_date, city, race_name):
+            st.session_state['race_city'] = city
+            st.session_state['race_select'] = [label]
+            return
@@ -0,0 +1,405 @@
+# Offline snapshot of everything the pages read: the five country race tables from
+# Supabase plus gb_horse_odds, the predictions_stats tables and any configured results
+# tables from BigQuery, written as one directory of Parquet files. SnapshotSupabase and SnapshotBigQuery answer the
+# same builder calls and SQL the pages already issue. Filters, ordering and limits are
+# compiled into DuckDB SQL, so they are pushed down into the Parquet scans instead of
+# being applied to full tables in pandas.
+#
+#   python -m racing.snapshot export snapshots/2026-10-19
+#   DG_SNAPSHOT=snapshots/2026-10-19 streamlit run Home_Page.py
+import argparse
+import os
+import re
+import threading
+
+import duckdb
+import pyarrow as pa
+import pyarrow.parquet as pq
+from google.api_core.exceptions import NotFound
+from google.cloud.bigquery import SchemaField, Table
+
+from racing.history import iter_row_pages
+
+BQ_PROJECT = 'data-gaming-425312'
+
+SUPABASE_TABLES = (
+    'uk_horse_racing_full',
+    'fr_horse_racing',
+    'hk_horse_racing_full',
+    'ie_horse_racing_full',
+    'za_horse_racing_full',
+)
+
+BIGQUERY_TABLES = (
+    'gb_horse_data.gb_horse_odds',
+    'gb_horse_data.gb_data__predictions_stats',
+    'fr_horse_data.fr_data__predictions_stats',
+    'hk_horse_data.hk_data__predictions_stats',
+    'ie_horse_data.ie_data__predictions_stats',
+    'za_horse_data.za_data__predictions_stats',
+)
+
+# Rows fetched per request when exporting a Supabase table
+EXPORT_PAGE_SIZE = 1000
+
+# Rows per Parquet row group
+ROW_GROUP_SIZE = 64_000
+
+# Exported rows are sorted on these (when present) so Parquet row groups cover
+# narrow date ranges and date/course filters can skip most of the file
+SORT_COLUMNS = ('race_date', 'city', 'race_id', 'horse_id', 'scraped_time')
+
+_OPERATORS = {'eq': '=', 'neq': '<>', 'gt': '>', 'gte': '>=', 'lt': '<', 'lte': '<='}
+
+# BigQuery field types of the DuckDB column types, anything else is reported as STRING
+_FIELD_TYPES = {'BOOLEAN': 'BOOLEAN', 'DATE': 'DATE', 'TIMESTAMP': 'TIMESTAMP', 'DOUBLE': 'FLOAT', 'FLOAT': 'FLOAT',
+                'TINYINT': 'INTEGER', 'SMALLINT': 'INTEGER', 'INTEGER': 'INTEGER', 'BIGINT': 'INTEGER'}
+
+
+def _supabase_file(root, table):
+    return os.path.join(root, 'supabase', f'{table}.parquet')
+
+
+def _bigquery_file(root, table):
+    dataset, name = table.split('.')
+    return os.path.join(root, 'bigquery', dataset, f'{name}.parquet')
+
+
+def _write_table(table, path):
+    keys = [(c, 'ascending') for c in SORT_COLUMNS if c in table.column_names]
+    if keys:
+        table = table.sort_by(keys)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    pq.write_table(table, path, row_group_size=ROW_GROUP_SIZE)
+
+
+def _write_pages(pages, path):
+    # Stream pages of row dicts into Parquet one row group at a time, returns the row count.
+    # Pages arrive in the table's row key order, which starts with race_date, so row groups
+    # cover narrow date ranges without a sort. The schema is inferred from the first row
+    # group, columns that are null throughout it are written as strings.
+    writer, schema, rows, count = None, None, [], 0
+
+    def flush():
+        nonlocal writer, schema
+        if schema is None:
+            inferred = pa.Table.from_pylist(rows).schema
+            schema = pa.schema([field.with_type(pa.string()) if pa.types.is_null(field.type) else field
+                                for field in inferred])
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            writer = pq.ParquetWriter(path, schema)
+        writer.write_table(pa.Table.from_pylist(rows, schema=schema), row_group_size=ROW_GROUP_SIZE)
+
+    try:
+        for page in pages:
+            rows.extend(page)
+            count += len(page)
+            if len(rows) >= ROW_GROUP_SIZE:
+                flush()
+                rows = []
+        if rows:
+            flush()
+    finally:
+        if writer is not None:
+            writer.close()
+    return count
+
+
+def export_snapshot(root, supabase, bq_client, results_tables=(), page_size=EXPORT_PAGE_SIZE):
+    # Copy every table the pages read into root, returns {table: rows}. Supabase tables are
+    # walked by row key and streamed to disk page by page. results_tables are full
+    # `project.dataset.table` references. BigQuery tables that do not exist are skipped.
+    counts = {}
+    for table in SUPABASE_TABLES:
+        counts[table] = _write_pages(iter_row_pages(supabase, table, ('*',), page_size=page_size),
+                                     _supabase_file(root, table))
+    references = [f'{BQ_PROJECT}.{table}' for table in BIGQUERY_TABLES] + list(results_tables)
+    for reference in references:
+        try:
+            arrow = bq_client.query(f"SELECT * FROM `{reference}`").to_arrow()
+        except NotFound:
+            continue
+        table = reference.split('.', 1)[1]
+        _write_table(arrow, _bigquery_file(root, table))
+        counts[table] = arrow.num_rows
+    return counts
+
+
+class SnapshotStore:
+    # One in-memory DuckDB database with a view per exported Parquet file. Each query
+    # runs on its own cursor, so sessions can query concurrently.
+
+    def __init__(self, root):
+        self.root = root
+        self._con = duckdb.connect()
+        self._lock = threading.Lock()
+        self._types = {}
+        self.sizes = {}
+        for table in SUPABASE_TABLES:
+            self._view(f'"{table}"', _supabase_file(root, table), table)
+        # BigQuery tables are whatever was exported, results tables vary with the secrets
+        bigquery_root = os.path.join(root, 'bigquery')
+        for dataset in sorted(os.listdir(bigquery_root)) if os.path.isdir(bigquery_root) else ():
+            self._con.execute(f'CREATE SCHEMA IF NOT EXISTS "{dataset}"')
+            for file in sorted(os.listdir(os.path.join(bigquery_root, dataset))):
+                name, extension = os.path.splitext(file)
+                if extension == '.parquet':
+                    table = f'{dataset}.{name}'
+                    self._view(f'"{dataset}"."{name}"', _bigquery_file(root, table), table)
+
+    def _view(self, name, path, table):
+        if not os.path.exists(path):
+            return
+        self._con.execute(f"CREATE VIEW {name} AS SELECT * FROM read_parquet('{path}')")
+        self.sizes[table] = os.path.getsize(path)
+
+    def execute(self, sql, params=()):
+        return self._con.cursor().execute(sql, list(params))
+
+    def column_types(self, table):
+        # {column: DuckDB type} of a view, BigQuery tables are given as dataset.table
+        with self._lock:
+            if table not in self._types:
+                view = '.'.join(f'"{part}"' for part in table.split('.'))
+                rows = self.execute(f'DESCRIBE {view}').fetchall()
+                self._types[table] = {name: kind for name, kind, *_ in rows}
+            return self._types[table]
+
+
+def _split_top_level(text):
+    # Split a postgrest logic tree on commas outside parentheses and quotes
+    parts, depth, quoted, escaped, start = [], 0, False, False, 0
+    for i, char in enumerate(text):
+        if escaped:
+            escaped = False
+        elif quoted and char == '\\':
+            escaped = True
+        elif char == '"':
+            quoted = not quoted
+        elif not quoted and char == '(':
+            depth += 1
+        elif not quoted and char == ')':
+            depth -= 1
+        elif not quoted and depth == 0 and char == ',':
+            parts.append(text[start:i])
+            start = i + 1
+    parts.append(text[start:])
+    return parts
+
+
+def _unquote(value):
+    # postgrest values may be double quoted, with backslash escapes inside
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        return re.sub(r'\\(.)', r'\1', value[1:-1])
+    return value
+
+
+class SnapshotResponse:
+    def __init__(self, data):
+        self.data = data
+
+
+class SnapshotQuery:
+    # The postgrest query builder subset the pages use, compiled to one SQL statement
+
+    def __init__(self, store, table):
+        self._store = store
+        self._table = table
+        self._columns = None
+        self._where = []
+        self._params = []
+        self._order = []
+        self._limit = None
+        self._offset = None
+
+    def _copy(self):
+        query = SnapshotQuery(self._store, self._table)
+        query._columns = self._columns
+        query._where, query._params, query._order = list(self._where), list(self._params), list(self._order)
+        query._limit, query._offset = self._limit, self._offset
+        return query
+
+    def _value(self, column, value):
+        # postgrest filter values arrive as text, cast them to the column's type
+        kind = self._store.column_types(self._table).get(column, 'VARCHAR')
+        if value is None:
+            return None
+        if kind in ('TINYINT', 'SMALLINT', 'INTEGER', 'BIGINT', 'HUGEINT'):
+            return int(value)
+        if kind in ('FLOAT', 'DOUBLE') or kind.startswith('DECIMAL'):
+            return float(value)
+        if kind == 'BOOLEAN':
+            return value if isinstance(value, bool) else str(value).lower() == 'true'
+        return str(value)
+
+    def _condition(self, column, op, value):
+        if op == 'is':
+            return f'"{column}" IS {"NULL" if value in (None, "null") else "NOT NULL"}', []
+        return f'"{column}" {_OPERATORS[op]} ?', [self._value(column, value)]
+
+    def _logic(self, text, joiner):
+        clauses, params = [], []
+        for part in _split_top_level(text):
+            group = re.fullmatch(r'(and|or)\((.*)\)', part)
+            if group:
+                clause, values = self._logic(group.group(2), group.group(1).upper())
+            else:
+                column, op, value = part.split('.', 2)
+                clause, values = self._condition(column, op, _unquote(value))
+            clauses.append(clause)
+            params.extend(values)
+        return '(' + f' {joiner} '.join(clauses) + ')', params
+
+    def _filter(self, column, op, value):
+        query = self._copy()
+        clause, values = query._condition(column, op, value)
+        query._where.append(clause)
+        query._params.extend(values)
+        return query
+
+    def select(self, *columns):
+        query = self._copy()
+        query._columns = [c for c in columns if c != '*'] or None
+        return query
+
+    def eq(self, column, value):
+        return self._filter(column, 'eq', value)
+
+    def neq(self, column, value):
+        return self._filter(column, 'neq', value)
+
+    def gt(self, column, value):
+        return self._filter(column, 'gt', value)
+
+    def gte(self, column, value):
+        return self._filter(column, 'gte', value)
+
+    def lt(self, column, value):
+        return self._filter(column, 'lt', value)
+
+    def lte(self, column, value):
+        return self._filter(column, 'lte', value)
+
+    def or_(self, filters):
+        query = self._copy()
+        clause, values = query._logic(filters, 'OR')
+        query._where.append(clause)
+        query._params.extend(values)
+        return query
+
+    def order(self, column, desc=False):
+        query = self._copy()
+        query._order.append(f'"{column}" {"DESC" if desc else "ASC"}')
+        return query
+
+    def limit(self, n):
+        query = self._copy()
+        query._limit = int(n)
+        return query
+
+    def range(self, start, end):
+        query = self._copy()
+        query._offset, query._limit = int(start), int(end) - int(start) + 1
+        return query
+
+    def sql(self):
+        columns = ', '.join(f'"{c}"' for c in self._columns) if self._columns else '*'
+        sql = f'SELECT {columns} FROM "{self._table}"'
+        if self._where:
+            sql += ' WHERE ' + ' AND '.join(self._where)
+        if self._order:
+            sql += ' ORDER BY ' + ', '.join(self._order)
+        if self._limit is not None:
+            sql += f' LIMIT {self._limit}'
+        if self._offset:
+            sql += f' OFFSET {self._offset}'
+        return sql
+
+    def execute(self):
+        cursor = self._store.execute(self.sql(), self._params)
+        names = [d[0] for d in cursor.description]
+        return SnapshotResponse([dict(zip(names, row)) for row in cursor.fetchall()])
+
+
+class SnapshotSupabase:
+    def __init__(self, store):
+        self._store = store
+
+    def table(self, name):
+        return SnapshotQuery(self._store, name)
+
+
+class SnapshotQueryJob:
+    # Mirrors the QueryJob attributes the BigQuery ledger records. Nothing is billed
+    # locally, bytes processed is the size of the Parquet files the query touches.
+    def __init__(self, store, sql, bytes_processed, dry_run=False):
+        self._store = store
+        self._sql = sql
+        self.total_bytes_processed = bytes_processed
+        self.total_bytes_billed = 0
+        self.slot_millis = 0
+        self.cache_hit = False
+        self.dry_run = dry_run
+
+    def result(self, *args, **kwargs):
+        return self
+
+    def to_dataframe(self, *args, **kwargs):
+        return self._store.execute(self._sql).df()
+
+    def to_arrow(self, *args, **kwargs):
+        return self._store.execute(self._sql).fetch_arrow_table()
+
+
+class SnapshotBigQuery:
+    # Runs the pages' standard SQL locally: `project.dataset.table` references are
+    # rewritten to the snapshot views, everything else is left to DuckDB
+    _TABLE_REF = re.compile(r'`[\w-]+\.(\w+)\.(\w+)`')
+
+    def __init__(self, store):
+        self._store = store
+
+    def query(self, query, job_config=None, **kwargs):
+        tables = [f'{dataset}.{name}' for dataset, name in self._TABLE_REF.findall(query)]
+        missing = [table for table in tables if table not in self._store.sizes]
+        if missing:
+            # As BigQuery reports it, so it is not retried
+            raise NotFound(f"Not found: Table {missing[0]} is not in the snapshot")
+        sql = self._TABLE_REF.sub(r'"\1"."\2"', query)
+        bytes_processed = sum(self._store.sizes.get(table, 0) for table in tables)
+        return SnapshotQueryJob(self._store, sql, bytes_processed,
+                                dry_run=bool(job_config is not None and job_config.dry_run))
+
+    def get_table(self, reference):
+        # Table metadata of an exported table, NotFound like BigQuery when it is not in the snapshot
+        dataset, name = str(reference).split('.')[-2:]
+        if f'{dataset}.{name}' not in self._store.sizes:
+            raise NotFound(f"Not found: Table {reference} is not in the snapshot")
+        types = self._store.column_types(f'{dataset}.{name}')
+        return Table(reference, schema=[SchemaField(column, _FIELD_TYPES.get(kind, 'STRING')) for column, kind in types.items()])
+
+
+def snapshot_clients(root):
+    store = SnapshotStore(root)
+    return SnapshotSupabase(store), SnapshotBigQuery(store)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the tables the pages read into a local snapshot")
+    parser.add_argument('command', choices=['export'])
+    parser.add_argument('root', help="snapshot directory to write")
+    parser.add_argument('--secrets', default='.streamlit/secrets.toml')
+    args = parser.parse_args()
+
+    import tomllib
+    from racing.backends import live_clients
+    with open(args.secrets, 'rb') as f:
+        secrets = tomllib.load(f)
+    supabase, bq_client = live_clients(secrets)
+    results_tables = secrets.get('results_tables', {}).values()
+    for table, rows in export_snapshot(args.root, supabase, bq_client, results_tables).items():
+        print(f"{table}: {rows:,} rows")
+
+
+if __name__ == '__main__':
+    main()
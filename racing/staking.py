@@ -0,0 +1,212 @@
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+# Stakes for the runners our model prices above the market. The whole card is solved
+# at once: runners are laid out as a (race, runner) array padded with NaN, and every
+# method is a closed form over that array, so a refresh of the odds re-solves the
+# card in a handful of NumPy operations.
+
+RACE_KEYS = ['race_date', 'city', 'race_name']
+
+# Bisection steps for the Lagrange multiplier of a stake limit
+LIMIT_ITERATIONS = 60
+
+METHODS = ('Fractional Kelly', 'Dutch to a target profit')
+
+
+class StakeSettings(NamedTuple):
+    method: str = METHODS[0]
+    bankroll: float = 1000.0
+    kelly_fraction: float = 0.25
+    target_profit: float = 10.0
+    # Most staked on one race, and on the whole card (0 for no limit)
+    max_race_exposure: float = 100.0
+    card_budget: float = 0.0
+
+
+DEFAULTS = StakeSettings()
+
+
+def race_arrays(df, probability='Win probability', odds='Initial market odds'):
+    # (race, runner) arrays of win probabilities and decimal odds, NaN past each race's
+    # runners, with the race and slot of every row of df
+    race = df.groupby(RACE_KEYS, sort=False, dropna=False).ngroup().to_numpy()
+    slot = df.groupby(RACE_KEYS, sort=False, dropna=False).cumcount().to_numpy()
+    shape = (race.max() + 1, slot.max() + 1) if len(df) else (0, 0)
+    p = np.full(shape, np.nan)
+    o = np.full(shape, np.nan)
+    p[race, slot] = pd.to_numeric(df[probability], errors='coerce').to_numpy(dtype=float)
+    o[race, slot] = pd.to_numeric(df[odds], errors='coerce').to_numpy(dtype=float)
+    # Decimal odds of 1 or less cannot be backed
+    o[~(o > 1)] = np.nan
+    return p, o, race, slot
+
+
+def kelly_fractions(p, o, penalty=0.0):
+    # Kelly fractions of the bankroll for simultaneous bets on the runners of each race
+    # (one winner per race). Runners are taken in order of expected return p * o while
+    # that beats the reserve rate R = (1 - sum p) / (1 - sum 1/o) of those taken before
+    # them, and each is staked p - R / o (Smoczynski and Tomkins, 2010).
+    #
+    # penalty (scalar or per race) is a Lagrange multiplier on the race's total stake,
+    # used to meet stake limits. With it the optimality conditions give stakes k p - r / o
+    # where the cash kept r solves  penalty a r^2 + (a - penalty) r - q = 0  with
+    # a = 1 - sum 1/o, q = 1 - sum p over the runners taken, and k = (1 - a r) / sum p.
+    # A runner is worth adding while k p o > r, starting from p o > 1 + penalty.
+    penalty = np.broadcast_to(np.asarray(penalty, dtype=float), (len(p),))[:, None]
+    valid = ~(np.isnan(p) | np.isnan(o))
+    ret = np.where(valid, p * o, -np.inf)
+    order = np.argsort(-ret, axis=1, kind='stable')
+    p_sorted = np.take_along_axis(np.where(valid, p, 0), order, axis=1)
+    o_sorted = np.take_along_axis(np.where(valid, o, np.inf), order, axis=1)
+    ret_sorted = np.take_along_axis(ret, order, axis=1)
+    implied = 1 / o_sorted
+    covered = np.cumsum(p_sorted, axis=1)
+    a = 1 - np.cumsum(implied, axis=1)
+    q = 1 - covered
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Positive root of the quadratic in a form that stays exact as the penalty goes to 0
+        b = a - penalty
+        root = b + np.sqrt(b ** 2 + 4 * penalty * a * q)
+        reserve = np.where(root > 0, 2 * q / root, np.maximum(-b / (penalty * a), 0))
+        multiplier = (1 - a * reserve) / covered
+        threshold = reserve / multiplier
+        # Once the runners taken cover the whole book no further runner is worth adding
+        threshold = np.where(a > 0, threshold, np.inf)
+    threshold_before = np.concatenate([1 + penalty, threshold[:, :-1]], axis=1)
+    taken = np.cumprod(ret_sorted > threshold_before, axis=1).astype(bool)
+    last = np.maximum(taken.sum(axis=1) - 1, 0)[:, None]
+    rate = np.take_along_axis(reserve, last, axis=1)
+    scale = np.take_along_axis(multiplier, last, axis=1)
+    fractions_sorted = np.where(taken, np.maximum(scale * p_sorted - rate * implied, 0), 0)
+    fractions = np.zeros_like(fractions_sorted)
+    np.put_along_axis(fractions, order, fractions_sorted, axis=1)
+    return fractions
+
+
+def _limit_penalty(total, limit, low, high):
+    # Smallest penalty in [low, high] (elementwise) whose total(penalty) is at most limit.
+    # total is non-increasing in the penalty and nothing is staked at high.
+    lo, hi = low.copy(), high.copy()
+    for _ in range(LIMIT_ITERATIONS):
+        mid = (lo + hi) / 2
+        over = total(mid) > limit
+        lo = np.where(over, mid, lo)
+        hi = np.where(over, hi, mid)
+    return np.where(total(low) <= limit, low, hi)
+
+
+def limited_kelly_fractions(p, o, race_limit=0, card_limit=0):
+    # Kelly fractions maximising the expected log growth of each race with at most race_limit
+    # staked on any race and card_limit on the card (fractions of the bankroll, 0 for no
+    # limit). Each limit is met through its Lagrange multiplier, found by bisection: a race
+    # over its own limit gets its own penalty, the card budget adds one shared by all races.
+    races = len(p)
+    penalty = np.zeros(races)
+    # Past the best expected return in a race nothing is staked in it
+    high = np.maximum(np.max(np.where(np.isnan(p * o), 1, p * o), axis=1, initial=1) - 1, 0)
+    if race_limit > 0:
+        penalty = _limit_penalty(lambda x: kelly_fractions(p, o, x).sum(axis=1), race_limit, penalty, high)
+    if card_limit > 0 and races:
+        floor = penalty
+        shared = _limit_penalty(lambda x: kelly_fractions(p, o, np.maximum(floor, x)).sum(keepdims=True).ravel(),
+                                card_limit, np.zeros(1), high.max(keepdims=True))
+        penalty = np.maximum(floor, shared)
+    return kelly_fractions(p, o, penalty)
+
+
+def dutch_stakes(p, o, target_profit):
+    # Stakes on every value runner (p * o > 1) of each race so that any of them winning
+    # returns the same profit: stake_i = target / (o_i (1 - sum 1/o))
+    value = ~(np.isnan(p) | np.isnan(o)) & (p * o > 1)
+    implied = np.where(value, 1 / np.where(value, o, 1), 0)
+    book = implied.sum(axis=1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        stakes = np.where(value, target_profit * implied / (1 - book), 0)
+    return np.where(book < 1, stakes, 0)
+
+
+def cap_stakes(stakes, max_race_exposure=0, card_budget=0):
+    # Scale races down to the per race limit, then the whole card down to the budget.
+    # Scaling keeps dutched stakes returning the same profit whichever runner wins.
+    if max_race_exposure > 0:
+        staked = stakes.sum(axis=1, keepdims=True)
+        stakes = stakes * np.minimum(1, max_race_exposure / np.maximum(staked, 1e-12))
+    if card_budget > 0 and stakes.sum() > card_budget:
+        stakes = stakes * (card_budget / stakes.sum())
+    return stakes
+
+
+def solve_stakes(p, o, settings):
+    if settings.method == 'Dutch to a target profit':
+        stakes = dutch_stakes(p, o, settings.target_profit)
+        return cap_stakes(stakes, settings.max_race_exposure, settings.card_budget)
+    # Fractional Kelly of the Kelly solution under the limits, taken in the same units
+    scale = settings.kelly_fraction * settings.bankroll
+    if scale <= 0:
+        return np.zeros_like(p)
+    return scale * limited_kelly_fractions(p, o, settings.max_race_exposure / scale, settings.card_budget / scale)
+
+
+@st.cache_resource(show_spinner=False, max_entries=64)
+def card_stakes(version, settings, _df):
+    # Stake and profit if it wins for every runner of the card, aligned to its rows
+    p, o, race, slot = race_arrays(_df)
+    # Whole pennies, rounded down so the stakes shown stay within the limits
+    stakes = np.floor(solve_stakes(p, o, settings) * 100 + 1e-9) / 100
+    stake = stakes[race, slot]
+    odds = o[race, slot]
+    return pd.DataFrame({
+        'Stake': stake,
+        'Profit if wins': np.where(stake > 0, stake * odds - stakes.sum(axis=1)[race], np.nan).round(2),
+        'Edge %': (100 * (p[race, slot] * odds - 1)).round(1),
+    }, index=_df.index)
+
+
+def staking_settings():
+    # Stake optimiser controls for the card
+    with st.expander("STAKE OPTIMISER"):
+        method = st.radio("Method", METHODS, horizontal=True, key='stake_method')
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            if method == METHODS[0]:
+                bankroll = st.number_input("Bankroll", min_value=0.0, value=DEFAULTS.bankroll, step=100.0, key='stake_bankroll')
+                fraction = st.slider("Kelly fraction", 0.05, 1.0, DEFAULTS.kelly_fraction, 0.05, key='stake_kelly_fraction')
+                target = DEFAULTS.target_profit
+            else:
+                target = st.number_input("Target profit per race", min_value=0.0, value=DEFAULTS.target_profit, step=5.0, key='stake_target')
+                bankroll, fraction = DEFAULTS.bankroll, DEFAULTS.kelly_fraction
+        with col2:
+            exposure = st.number_input("Max stake per race (0 for no limit)", min_value=0.0, value=DEFAULTS.max_race_exposure,
+                                       step=10.0, key='stake_max_race')
+        with col3:
+            budget = st.number_input("Budget for the card (0 for no limit)", min_value=0.0, value=DEFAULTS.card_budget,
+                                     step=50.0, key='stake_card_budget')
+        if method == METHODS[0]:
+            limits = "Kelly stakes are re-solved under the race limit and card budget, so each race keeps its best mix of runners."
+        else:
+            limits = "Dutched stakes are scaled down to the race limit first, then to the card budget, keeping an equal profit."
+        st.caption("Only races with a runner whose win probability is above the market's implied probability are staked. " + limits)
+    return StakeSettings(method, float(bankroll), float(fraction), float(target), float(exposure), float(budget))
+
+
+def display_stakes(race_df, stakes):
+    # Suggested stakes for one race, looked up from the card's solution
+    race_stakes = stakes.loc[race_df.index]
+    backed = race_stakes['Stake'] > 0
+    if not backed.any():
+        st.info("No runner is priced above the market in this race.")
+        return
+    table = pd.concat([race_df[['Horse', 'Initial market odds']], race_stakes], axis=1)[backed.to_numpy()]
+    st.dataframe(table.sort_values('Stake', ascending=False), use_container_width=True, hide_index=True, column_config={
+        'Stake': st.column_config.NumberColumn(format='%.2f'),
+        'Profit if wins': st.column_config.NumberColumn(format='%.2f'),
+        'Edge %': st.column_config.NumberColumn(format='%.1f', help="Win probability x market odds - 1"),
+    })
+    win = pd.to_numeric(race_df['Win probability'], errors='coerce')[backed.to_numpy()]
+    staked = race_stakes['Stake'].sum()
+    expected = (win * race_stakes['Stake'][backed] * table['Initial market odds']).sum() - staked
+    st.caption(f"Staked {staked:.2f}, expected profit {expected:.2f}, loses {staked:.2f} if none of them wins.")
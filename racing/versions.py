@@ -0,0 +1,291 @@
+import threading
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+# Every refresh of a country card is kept as a version. Only the latest card is held
+# in full, each refresh also records the cells it changed together with their values
+# before the refresh, so a day of refreshes costs about one card plus the odds and
+# probabilities that moved. A past card is rebuilt by undoing the changes made after
+# it, the work grows with the number of changes since rather than with the day, and
+# comes back in the row order and index it was loaded with.
+
+# Columns identifying a runner across refreshes
+RUNNER_KEYS = ['race_date', 'city', 'race_name', 'Horse']
+
+# Versions kept per country, a day of 5 minute refreshes. The oldest is dropped past
+# this, together with runners that are on none of the kept versions.
+MAX_VERSIONS = 288
+
+# Columns compared between two versions in the price changes table, our price next to the market's
+CHANGE_COLUMNS = ['Odds predicted', 'Initial market odds', 'Win probability']
+
+LATEST = "Latest"
+
+# Code of a missing text value
+_NO_CODE = -1
+
+
+def _kind(column):
+    # How a column's cells are held: numbers as floats, datetimes as int64 nanoseconds,
+    # anything else as int64 codes into a per column dictionary of distinct values
+    if pd.api.types.is_numeric_dtype(column) and not pd.api.types.is_bool_dtype(column):
+        return 'float'
+    if column.dtype.kind == 'M':
+        return 'datetime'
+    return 'text'
+
+
+def _missing(kind, n):
+    if kind == 'float':
+        return np.full(n, np.nan)
+    if kind == 'datetime':
+        return np.full(n, np.datetime64('NaT'), dtype='datetime64[ns]').view(np.int64)
+    return np.full(n, _NO_CODE, dtype=np.int64)
+
+
+def _same(a, b, kind):
+    if kind == 'float':
+        return (a == b) | (np.isnan(a) & np.isnan(b))
+    # NaT and missing codes are plain integers and compare equal to themselves
+    return a == b
+
+
+class CardVersions:
+    # Versions of one country's card, numbered in refresh order
+
+    def __init__(self, max_versions=MAX_VERSIONS):
+        self.max_versions = max_versions
+        self._lock = threading.Lock()
+        # (data version, fetched at, columns, rows, index) per kept version, the oldest is
+        # number self.first. rows are the runners in card order, index the card's index.
+        self.versions = []
+        self.first = 0
+        self.keys = []
+        self._index = {}
+        self.kinds = {}
+        self.dtypes = {}
+        # Distinct values of text columns, cells hold their position
+        self._values = {}
+        self._codes = {}
+        # Cells of every runner at the latest version
+        self.current = {}
+        # Last version each runner was on the card
+        self.last_seen = np.zeros(0, dtype=np.int64)
+        # Per column, (version, rows, values before that version) for every version that changed it
+        self.changes = {}
+
+    @property
+    def latest(self):
+        return self.first + len(self.versions) - 1
+
+    def labels(self):
+        # Selector label of every kept version, newest first (the newest of a minute wins)
+        labels = {}
+        for i, (_, fetched_at, *_) in enumerate(reversed(self.versions)):
+            labels.setdefault(f"{fetched_at:%d %b %H:%M} UTC" if i else f"{LATEST} ({fetched_at:%d %b %H:%M} UTC)", self.latest - i)
+        return labels
+
+    def _encode(self, column, series, kind):
+        if kind == 'float':
+            return series.to_numpy(dtype=float, na_value=np.nan)
+        if kind == 'datetime':
+            return series.to_numpy(dtype='datetime64[ns]').view(np.int64)
+        # Only the distinct values of this refresh go through the dictionary
+        local, uniques = pd.factorize(series.astype(object), use_na_sentinel=True)
+        codes, values = self._codes.setdefault(column, {}), self._values.setdefault(column, [])
+        for value in uniques:
+            if value not in codes:
+                codes[value] = len(values)
+                values.append(value)
+        mapping = np.array([codes[value] for value in uniques] + [_NO_CODE], dtype=np.int64)
+        return mapping[local]
+
+    def _decode(self, column, cells):
+        kind = self.kinds[column]
+        if kind == 'float':
+            return cells
+        if kind == 'datetime':
+            return cells.view('datetime64[ns]')
+        values = np.array(self._values.get(column, []) + [None], dtype=object)
+        # The missing code -1 picks the trailing None
+        return values[cells]
+
+    def append(self, version, df, fetched_at=None):
+        # Record a refreshed card, returns the number of changed cells
+        fetched_at = fetched_at or pd.Timestamp.now(tz='UTC')
+        with self._lock:
+            number = self.first + len(self.versions)
+            rows = self._rows(list(zip(*(df[c].tolist() for c in RUNNER_KEYS))))
+            self.last_seen[rows] = number
+            cells = {}
+            for column in df.columns:
+                if column not in self.kinds:
+                    self.kinds[column] = _kind(df[column])
+                    self.current[column] = _missing(self.kinds[column], len(self.keys))
+                    self.changes[column] = []
+                self.dtypes[column] = df[column].dtype
+                cells[column] = (rows, self._encode(column, df[column], self.kinds[column]))
+
+            changed = 0
+            for column, (at, values) in cells.items():
+                diff = ~_same(self.current[column][at], values, self.kinds[column])
+                if not diff.any():
+                    continue
+                at, values = at[diff], values[diff]
+                if self.versions:
+                    self.changes[column].append((number, at, self.current[column][at]))
+                self.current[column][at] = values
+                changed += len(at)
+            columns, index = tuple(df.columns), df.index
+            if self.versions:
+                # Share the column names, row order and index with the previous version when unchanged
+                _, _, last_columns, last_rows, last_index = self.versions[-1]
+                columns = last_columns if last_columns == columns else columns
+                rows = last_rows if np.array_equal(last_rows, rows) else rows
+                index = last_index if last_index.equals(index) else index
+            self.versions.append((version, fetched_at, columns, rows, index))
+            if len(self.versions) > self.max_versions:
+                self._drop_oldest()
+            return changed
+
+    def _rows(self, keys):
+        # Row of each runner, appending rows for runners seen for the first time
+        new = [key for key in dict.fromkeys(keys) if key not in self._index]
+        if new:
+            for key in new:
+                self._index[key] = len(self.keys)
+                self.keys.append(key)
+            for column, kind in self.kinds.items():
+                self.current[column] = np.concatenate([self.current[column], _missing(kind, len(new))])
+            self.last_seen = np.concatenate([self.last_seen, np.full(len(new), -1, dtype=np.int64)])
+        return np.fromiter((self._index[key] for key in keys), dtype=np.int64, count=len(keys))
+
+    def _drop_oldest(self):
+        # The changes made by the second version only lead back to the dropped one
+        self.versions.pop(0)
+        self.first += 1
+        for changes in self.changes.values():
+            if changes and changes[0][0] == self.first:
+                changes.pop(0)
+        keep = self.last_seen >= self.first
+        if keep.all():
+            return
+        remap = np.cumsum(keep) - 1
+        # Versions sharing their rows keep sharing them
+        remapped = {}
+        self.versions = [(version, fetched_at, columns, remapped.setdefault(id(rows), remap[rows]), index)
+                         for version, fetched_at, columns, rows, index in self.versions]
+        self.keys = [key for key, kept in zip(self.keys, keep) if kept]
+        self._index = {key: i for i, key in enumerate(self.keys)}
+        self.last_seen = self.last_seen[keep]
+        for column in self.kinds:
+            self.current[column] = self.current[column][keep]
+            # A dropped runner was on no kept version, so no kept change refers to it
+            self.changes[column] = [(number, remap[at], values) for number, at, values in self.changes[column]]
+
+    def _cells_at(self, column, number):
+        cells = self.current[column].copy()
+        for changed_at, at, before in reversed(self.changes[column]):
+            if changed_at <= number:
+                break
+            cells[at] = before
+        return cells
+
+    def _check(self, number):
+        if not self.first <= number <= self.latest:
+            raise KeyError(f"Version {number} is no longer kept")
+
+    def card(self, number):
+        # The card as it was loaded at version number
+        with self._lock:
+            self._check(number)
+            version, _, columns, rows, index = self.versions[number - self.first]
+            df = pd.DataFrame({column: self._decode(column, self._cells_at(column, number)[rows]) for column in columns},
+                              index=index)
+        df = df.astype({column: self.dtypes[column] for column in columns if df[column].dtype != self.dtypes[column]})
+        df.attrs['data_version'] = version
+        df.attrs['version_number'] = number
+        return df
+
+    def changes_between(self, then, now, columns=CHANGE_COLUMNS):
+        # Runners whose values in columns differ between two versions, found from the
+        # changes recorded in between
+        with self._lock:
+            self._check(then)
+            self._check(now)
+            columns = [column for column in columns if column in self.kinds]
+            touched = [at for column in columns for number, at, _ in self.changes[column] if then < number <= now]
+            if not touched:
+                return pd.DataFrame()
+            rows = np.unique(np.concatenate(touched))
+            table = pd.DataFrame([self.keys[row] for row in rows], columns=RUNNER_KEYS)
+            for column in columns:
+                table[f'{column} then'] = self._decode(column, self._cells_at(column, then)[rows])
+                table[f'{column} now'] = self._decode(column, self._cells_at(column, now)[rows])
+        return table
+
+
+class PredictionVersions:
+    # Card versions per country, shared by every session
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._countries = {}
+
+    def get(self, country):
+        with self._lock:
+            return self._countries.setdefault(country, CardVersions())
+
+    def update(self, country, version, df):
+        # Record a refreshed card (no-op unless the card changed). The check and the
+        # append happen under one lock, so concurrent sessions record a refresh once.
+        if df.empty:
+            return
+        with self._lock:
+            versions = self._countries.setdefault(country, CardVersions())
+            if versions.versions and versions.versions[-1][0] == version:
+                return
+            versions.append(version, df)
+
+
+@st.cache_resource
+def prediction_versions():
+    return PredictionVersions()
+
+
+@st.cache_resource(show_spinner=False, max_entries=16)
+def card_as_of(country, number):
+    return prediction_versions().get(country).card(number)
+
+
+def select_card_version(country, df):
+    # "As of" selector, returns the card to display: df itself or a rebuilt past version
+    versions = prediction_versions().get(country)
+    if len(versions.versions) < 2:
+        return df
+    labels = versions.labels()
+    label = st.selectbox("Predictions as of", list(labels), key='race_as_of',
+                         help="Cards from earlier refreshes, rebuilt from the changes stored at each refresh")
+    number = labels[label]
+    if number == versions.latest:
+        return df
+    return card_as_of(country, number)
+
+
+def display_version_changes(country, df, race_keys):
+    # Our prices and the market's then and now, for runners in the selected races that moved since a past card
+    versions = prediction_versions().get(country)
+    then = df.attrs.get('version_number')
+    if then is None or then < versions.first:
+        return
+    changes = versions.changes_between(then, versions.latest)
+    if not changes.empty:
+        race_dates = changes['race_date'].dt.strftime('%Y-%m-%d')
+        changes = changes[pd.Series(list(zip(race_dates, changes['city'], changes['race_name'])), index=changes.index).isin(race_keys)]
+    with st.expander("SHOW PRICE CHANGES SINCE THIS REFRESH"):
+        if changes.empty:
+            st.info("Our prices for the selected races have not changed since.")
+            return
+        st.dataframe(changes.drop(columns=['race_date']), use_container_width=True, hide_index=True)
@@ -0,0 +1,96 @@
+import threading
+
+import pandas as pd
+import pytest
+from google.api_core.exceptions import BadRequest
+
+from racing import bq_budget
+from racing.bq_budget import QueryBudgetExceeded, QueryLedger, cost_report, run_query
+
+
+class Job:
+    def __init__(self, bytes_processed, cache_hit=False):
+        self.total_bytes_processed = bytes_processed
+        self.total_bytes_billed = bytes_processed
+        self.slot_millis = 10
+        self.cache_hit = cache_hit
+
+    def result(self, timeout=None):
+        return self
+
+    def to_dataframe(self):
+        return pd.DataFrame({'x': [1]})
+
+
+class Client:
+    # Dry runs estimate `scan` bytes; real runs of a query already run come from the cache
+    def __init__(self, scan, error=None):
+        self.scan = scan
+        self.error = error
+        self.dry_runs = 0
+        self.ran = set()
+
+    def query(self, query, job_config=None, timeout=None):
+        if job_config.dry_run:
+            self.dry_runs += 1
+            return Job(self.scan)
+        if self.error:
+            raise self.error
+        cache_hit = query in self.ran
+        self.ran.add(query)
+        return Job(self.scan, cache_hit)
+
+
+def test_cache_hits_are_recorded_as_free():
+    ledger, client = QueryLedger(), Client(scan=2**30)
+    for _ in range(3):
+        run_query(client, "SELECT 1", 'uk', 'stats', ledger=ledger, cap=2**31)
+    report = cost_report(ledger).iloc[0]
+    assert report['runs'] == 3 and report['cache_hits'] == 2
+    assert report['gib_billed'] == pytest.approx(1.0) and report['gib_processed'] == pytest.approx(1.0)
+
+
+def test_estimates_are_reused_until_they_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(bq_budget.time, 'monotonic', lambda: now[0])
+    ledger, client = QueryLedger(), Client(scan=100)
+    run_query(client, "SELECT 1", 'uk', 'stats', ledger=ledger, cap=1000)
+    run_query(client, "SELECT 1", 'uk', 'stats', ledger=ledger, cap=1000)
+    assert client.dry_runs == 1
+    now[0] += bq_budget.ESTIMATE_TTL_SECONDS + 1
+    run_query(client, "SELECT 2", 'uk', 'stats', ledger=ledger, cap=1000)
+    run_query(client, "SELECT 1", 'uk', 'stats', ledger=ledger, cap=1000)
+    assert client.dry_runs == 3
+    # The expired estimate was dropped when the new one came in
+    assert len(ledger.estimates) == 2
+
+
+def test_queries_over_the_cap_are_refused_before_running():
+    ledger, client = QueryLedger(), Client(scan=2000)
+    with pytest.raises(QueryBudgetExceeded, match='would scan'):
+        run_query(client, "SELECT 1", 'uk', 'stats', ledger=ledger, cap=1000)
+    assert client.ran == set() and ledger.job_records() == []
+
+
+def test_bigquerys_own_bytes_billed_limit_is_a_budget_refusal():
+    error = BadRequest("Query exceeded limit for bytes billed", errors=[{'reason': 'bytesBilledLimitExceeded'}])
+    with pytest.raises(QueryBudgetExceeded, match='stopped by BigQuery'):
+        run_query(Client(scan=10, error=error), "SELECT 1", 'uk', 'stats', ledger=QueryLedger(), cap=1000)
+    with pytest.raises(BadRequest):
+        run_query(Client(scan=10, error=BadRequest("Syntax error")), "SELECT 1", 'uk', 'stats', ledger=QueryLedger(), cap=1000)
+
+
+def test_ledger_is_safe_across_sessions():
+    ledger, client = QueryLedger(), Client(scan=10)
+
+    def session(n):
+        for i in range(50):
+            run_query(client, f"SELECT {i % 7}", 'uk', f'q{n}', ledger=ledger, cap=1000)
+
+    threads = [threading.Thread(target=session, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(ledger.job_records()) == 400
+    assert len(ledger.estimates) == 7
@@ -0,0 +1,45 @@
+import io
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from loadtest.fake_backends import FakeSupabase
+from racing.export import export_chunks, write_export
+
+COLUMNS = ('race_date', 'race_id', 'horse_id', 'race_name', 'city', 'horse', 'odds')
+
+
+def rows():
+    # The same race name run at two courses on the same day, and again the next day
+    return [{'race_date': race_date, 'race_id': race_id, 'horse_id': f'{race_id}-{n}', 'race_name': 'Maiden Stakes',
+             'city': city, 'horse': f'{city} {n}', 'odds': 2.0 + n}
+            for race_id, (race_date, city) in enumerate([('2026-10-19', 'York'), ('2026-10-19', 'Ascot'), ('2026-10-20', 'York')])
+            for n in range(3)]
+
+
+def test_selected_races_are_matched_on_their_course():
+    supabase = FakeSupabase(rows())
+    keys = [('2026-10-19', 'York', 'Maiden Stakes')]
+    chunks = list(export_chunks(supabase, 'uk_card', COLUMNS, '2026-10-19', '2026-10-19', None, keys, page_size=2))
+    export = pd.concat(chunks)
+    assert set(export['city']) == {'York'} and len(export) == 3
+
+
+def test_odds_ticks_are_joined_per_runner():
+    supabase = FakeSupabase(rows())
+    odds = pd.DataFrame({'race_id': [0, 0, 0], 'horse_link': ['0-0', '0-0', '0-1'], 'odds': [3.0, 2.5, 4.0]})
+    export = pd.concat(export_chunks(supabase, 'uk_card', COLUMNS, None, None, 'York', None, odds))
+    # Two ticks for one runner, one for another, every other runner once with no tick
+    assert len(export) == 7
+    assert export.loc[export['horse_id'] == '0-0', 'odds_tick'].tolist() == [3.0, 2.5]
+    assert export.loc[export['race_id'] == 2, 'odds_tick'].isna().all()
+
+
+def test_csv_and_parquet_exports_hold_every_row():
+    expected = pd.DataFrame(rows())
+    for fmt in ('CSV', 'Parquet'):
+        out = write_export(export_chunks(FakeSupabase(rows()), 'uk_card', COLUMNS, None, None, page_size=2), fmt)
+        data = io.BytesIO(out.read())
+        got = pd.read_csv(data) if fmt == 'CSV' else pq.read_table(data).to_pandas()
+        assert len(got) == len(expected)
+        assert sorted(got['horse'].tolist()) == sorted(expected['horse'].tolist())
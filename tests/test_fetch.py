@@ -0,0 +1,144 @@
+import itertools
+
+import pandas as pd
+import pytest
+from google.api_core.exceptions import BadRequest, NotFound, ServiceUnavailable, TooManyRequests
+from postgrest.exceptions import APIError
+
+from racing import fetch
+from racing.bq_budget import QueryBudgetExceeded
+from racing.fetch import CircuitBreaker, CircuitOpen, LastGood, guarded, resilient, retryable
+
+_sources = itertools.count()
+
+
+@pytest.fixture(autouse=True)
+def clock(monkeypatch):
+    # A clock the tests move by hand, backoff sleeps advance it instead of waiting
+    now = [1000.0]
+    monkeypatch.setattr(fetch.time, 'monotonic', lambda: now[0])
+    monkeypatch.setattr(fetch.time, 'sleep', lambda seconds: now.__setitem__(0, now[0] + seconds))
+    return now
+
+
+@pytest.fixture
+def source():
+    # Breakers are shared per process, every test gets sources of its own
+    return f"table_{next(_sources)}"
+
+
+class Client:
+    # Raises the given errors in turn, then returns its result
+    def __init__(self, *errors, result='rows'):
+        self.errors = list(errors)
+        self.result = result
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return self.result
+
+
+def postgrest_error(code):
+    return APIError({'code': code, 'message': 'error', 'details': None, 'hint': None})
+
+
+@pytest.mark.parametrize('error, expected', [
+    (ServiceUnavailable("backend down"), True),
+    (TooManyRequests("rate limited"), True),
+    (ConnectionError("reset"), True),
+    (BadRequest("syntax error"), False),
+    (NotFound("no such table"), False),
+    (QueryBudgetExceeded("over the cap"), False),
+    (postgrest_error('PGRST116'), False),
+    (postgrest_error('PGRST204'), False),
+    (postgrest_error('42P01'), False),
+    (postgrest_error('22P02'), False),
+    (postgrest_error('57014'), True),
+    (postgrest_error('PGRST000'), True),
+])
+def test_retryable_errors(error, expected):
+    assert retryable(error) is expected
+
+
+def test_breaker_opens_after_repeated_failures_and_half_opens(clock):
+    breaker = CircuitBreaker('test', failure_threshold=3, reset_seconds=60)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert not breaker.allow()
+    clock[0] += 60
+    # One trial caller is let through, the others keep failing fast until it reports back
+    assert breaker.allow() and not breaker.allow()
+    breaker.record_failure()
+    assert not breaker.allow()
+    clock[0] += 60
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.allow() and breaker.allow()
+
+
+def test_transient_errors_are_retried(source):
+    client = Client(ServiceUnavailable("down"), TooManyRequests("slow down"))
+    assert guarded('bigquery', source, client) == 'rows'
+    assert client.calls == 3
+
+
+def test_errors_a_retry_cannot_fix_raise_at_once_and_leave_the_breaker_closed(source):
+    for error in (BadRequest("syntax"), postgrest_error('42703'), QueryBudgetExceeded("cap")):
+        client = Client(error, error, error, error)
+        with pytest.raises(type(error)):
+            guarded('bigquery', source, client)
+        assert client.calls == 1
+    assert guarded('bigquery', source, Client()) == 'rows'
+
+
+def test_open_breaker_fails_fast_until_it_resets(source, clock):
+    down = ServiceUnavailable("down")
+    with pytest.raises(ServiceUnavailable):
+        guarded('supabase', source, Client(down, down, down))
+    client = Client()
+    with pytest.raises(CircuitOpen):
+        guarded('supabase', source, client)
+    assert client.calls == 0
+    # Other tables have breakers of their own
+    assert guarded('supabase', f'{source} other', Client()) == 'rows'
+    clock[0] += fetch.RESET_SECONDS
+    assert guarded('supabase', source, client) == 'rows'
+    assert guarded('supabase', source, client) == 'rows'
+
+
+def test_resilient_serves_the_last_good_result(source, monkeypatch):
+    messages = []
+    monkeypatch.setattr(fetch.st, 'warning', lambda text, **kwargs: messages.append(('warning', text)))
+    monkeypatch.setattr(fetch.st, 'error', lambda text, **kwargs: messages.append(('error', text)))
+    monkeypatch.setattr(fetch, 'last_good', lambda store=LastGood(): store)
+    responses = [pd.DataFrame({'x': [1]}), ServiceUnavailable("down")]
+
+    @resilient('uk', source)
+    def loader(day):
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    assert loader('2026-10-19')['x'].tolist() == [1]
+    stale = loader('2026-10-19')
+    assert stale['x'].tolist() == [1]
+    assert messages[0][0] == 'warning' and 'could not be refreshed' in messages[0][1]
+    # Nothing good yet for another argument: an error and an empty frame
+    responses.append(NotFound("gone"))
+    assert loader('2026-10-20').empty
+    assert messages[1][0] == 'error'
+
+
+def test_last_good_evicts_the_least_recently_used():
+    store = LastGood(max_entries=2)
+    store.put('a', 1)
+    store.put('b', 2)
+    store.get('a')
+    store.put('c', 3)
+    assert store.get('b') is None and store.get('a')[0] == 1 and store.get('c')[0] == 3
@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from racing.form import FORM_COLUMNS, NON_FINISH, OTHER_NON_FINISH, UNPLACED, FormFilter, add_form_columns, form_features, parse_form
+
+P, F, U, B, R = (NON_FINISH[code] for code in 'PFUBR')
+
+
+@pytest.mark.parametrize('form, expected', [
+    ('1-3-P-2-4', [1, 3, P, 2, 4]),
+    ('13P24', [1, 3, P, 2, 4]),
+    ('1/2/3', [0, 0, 1, 2, 3]),
+    ('1234567', [3, 4, 5, 6, 7]),
+    # Two letter codes are one run, with or without separators
+    ('PU-1-UR', [0, 0, P, 1, U]),
+    ('PU1UR2', [0, P, 1, U, 2]),
+    ('BD-RR-F', [0, 0, B, R, F]),
+    ('pu-1', [0, 0, 0, P, 1]),
+    # Positions of 10 and over only appear with separators, '0' is unplaced
+    ('12-10-0', [0, 0, 12, 10, UNPLACED]),
+    ('X1', [0, 0, 0, OTHER_NON_FINISH, 1]),
+])
+def test_parse_form(form, expected):
+    assert parse_form(pd.Series([form])).tolist() == [expected]
+
+
+def test_empty_and_missing_form_is_no_runs():
+    matrix = parse_form(pd.Series(['', None, np.nan, '  '], index=[7, 3, 5, 1]))
+    assert matrix.shape == (4, 5) and not matrix.any()
+    assert parse_form(pd.Series([], dtype=object)).shape == (0, 5)
+
+
+def test_form_features():
+    features = form_features(parse_form(pd.Series(['1-3-P-2-4', '5-4-3-2-1', 'PU-1-UR', '', '0-0'])))
+    assert features['Form runs'].tolist() == [5, 5, 3, 0, 2]
+    assert features['Form wins'].tolist() == [1, 1, 1, 0, 0]
+    assert features['Form non-finishes'].tolist() == [1, 0, 2, 0, 0]
+    assert features['Form avg position'].tolist()[:3] == [2.5, 3.0, 1.0]
+    assert np.isnan(features['Form avg position'][3]) and features['Form avg position'][4] == UNPLACED
+    # Improving form has a negative slope, fewer than two finishes has none
+    assert features['Form trend'][1] == -1.0
+    assert np.isnan(features['Form trend'][2]) and np.isnan(features['Form trend'][3])
+
+
+def test_add_form_columns_keeps_the_index():
+    df = pd.DataFrame({'Horse': ['A', 'B'], 'Last 5 races': ['1-2', None]}, index=[10, 4])
+    form = add_form_columns(df)
+    assert form.index.tolist() == [10, 4]
+    assert form.loc[10, FORM_COLUMNS].tolist() == [0, 0, 0, 1, 2] and form.loc[4, 'Form runs'] == 0
+
+
+@pytest.fixture
+def race():
+    form = ['1-1-2-3-4', '5-4-3-2-1', '1-P-1-1', '4-4', '']
+    return add_form_columns(pd.DataFrame({'Horse': list('ABCDE'), 'Last 5 races': form}))
+
+
+def shown(race, **settings):
+    return FormFilter(**settings).apply(race)['Horse'].tolist()
+
+
+def test_default_filter_keeps_the_card(race):
+    assert FormFilter().apply(race) is race
+
+
+def test_filter_thresholds_are_inclusive(race):
+    assert shown(race, min_wins=2) == ['A', 'C']
+    assert shown(race, min_wins=3) == ['C']
+    # A averages 2.2, B 3.0, C 1.0, D 4.0; E has no finishes and no average
+    assert shown(race, max_avg_position=3.0) == ['A', 'B', 'C']
+    assert shown(race, max_avg_position=2.2) == ['A', 'C']
+
+
+def test_filter_flags(race):
+    assert shown(race, improving_only=True) == ['B']
+    assert shown(race, finished_every_run=True) == ['A', 'B', 'D', 'E']
+    assert shown(race, min_wins=1, finished_every_run=True) == ['A', 'B']
+
+
+def test_sorts_put_runners_without_form_last(race):
+    assert shown(race, sort_by='Form avg position') == ['C', 'A', 'B', 'D', 'E']
+    assert shown(race, sort_by='Form wins') == ['C', 'A', 'B', 'D', 'E']
+    # C and D are flat and keep their card order
+    assert shown(race, sort_by='Form trend') == ['B', 'C', 'D', 'A', 'E']
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from racing.frames import ARROW_STRING, enable_copy_on_write, share_frame
+
+
+@pytest.fixture
+def shared():
+    enable_copy_on_write()
+    df = pd.DataFrame({
+        'race_date': pd.to_datetime(['2026-10-19', '2026-10-20']),
+        'Horse': ['Frankel', 'Enable'],
+        'Win probability': [0.4, 0.2],
+        'Horse number': [1, 2],
+        'Favourite': [True, False],
+    }, index=[10, 11])
+    df.attrs['data_version'] = 'v1'
+    return df, share_frame(df)
+
+
+def test_shared_frame_keeps_values_index_and_attrs(shared):
+    df, frozen = shared
+    pd.testing.assert_frame_equal(frozen, df.astype({'Horse': ARROW_STRING}))
+    assert frozen.attrs == {'data_version': 'v1'}
+    assert frozen['Horse'].dtype == ARROW_STRING
+
+
+def set_column(df):
+    df.loc[:, 'Win probability'] = 0.0
+
+
+def set_integer_cell(df):
+    df.iloc[0, 3] = 5
+
+
+def set_bool_cell(df):
+    df.loc[10, 'Favourite'] = False
+
+
+def write_through_numpy(df):
+    df['Win probability'].to_numpy()[0] = 1.0
+
+
+@pytest.mark.parametrize('write', [set_column, set_integer_cell, set_bool_cell, write_through_numpy])
+def test_in_place_writes_to_a_shared_frame_raise(shared, write):
+    _, frozen = shared
+    # pandas re-raises the read-only error as a TypeError when it tries to set a whole column
+    with pytest.raises((ValueError, TypeError)):
+        write(frozen)
+    assert frozen['Win probability'].tolist() == [0.4, 0.2] and frozen['Horse number'].tolist() == [1, 2]
+
+
+def test_frames_derived_from_a_shared_frame_can_be_written(shared):
+    _, frozen = shared
+    derived = frozen[frozen['Win probability'] > 0.3]
+    derived.loc[10, 'Win probability'] = 0.5
+    added = frozen.assign(Stake=np.zeros(2))
+    added.loc[11, 'Stake'] = 2.0
+    assert derived['Win probability'].tolist() == [0.5]
+    assert frozen['Win probability'].tolist() == [0.4, 0.2]
@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from racing.percentiles import PercentileRanks
+
+COLUMNS = ['horse_form_score', 'jockey_skill_score']
+
+
+def table(seed, races=30, runners=8):
+    # Every runner of a card table, in pages of row dicts as the pager yields them
+    rng = np.random.default_rng(seed)
+    rows = [{'race_id': race, 'horse_id': f'{race}-{n}',
+             'horse_form_score': float(rng.normal()), 'jockey_skill_score': float(rng.normal())}
+            for race in range(races) for n in range(runners)]
+    return [rows[i:i + 50] for i in range(0, len(rows), 50)]
+
+
+def loaded(pages):
+    ranks = PercentileRanks(COLUMNS)
+    ranks.load(pages)
+    return ranks
+
+
+def reference(pages, column, values):
+    # Mid-rank percentiles against the population rebuilt from scratch
+    population = pd.DataFrame([row for page in pages for row in page]).drop_duplicates(['race_id', 'horse_id'], keep='last')
+    scores = np.sort(population[column].dropna().to_numpy())
+    below = np.searchsorted(scores, values, side='left')
+    at_or_below = np.searchsorted(scores, values, side='right')
+    return (below + at_or_below) / 2 / len(scores) * 100
+
+
+def test_load_ranks_against_every_runner():
+    pages = table(0)
+    ranks = loaded(pages)
+    assert len(ranks) == 240
+    values = np.array([-1.0, 0.0, 0.5, np.nan])
+    np.testing.assert_allclose(ranks.percentiles('horse_form_score', values),
+                               np.append(reference(pages, 'horse_form_score', values[:3]), np.nan))
+
+
+def test_refreshed_scores_replace_the_old_ones():
+    pages = table(1)
+    ranks = loaded(pages)
+    card = pd.DataFrame([row for row in pages[0][:10]])
+    card['horse_form_score'] = card['horse_form_score'] + 5
+    card.loc[3, 'jockey_skill_score'] = np.nan
+    ranks.update('v2', card)
+    # Same population size, each refreshed runner counted once with its new score
+    assert len(ranks) == 240 and len(ranks._sorted['horse_form_score']) == 240
+    assert len(ranks._sorted['jockey_skill_score']) == 239
+    refreshed = [page[:] for page in pages]
+    refreshed[0] = card.to_dict('records') + pages[0][10:]
+    values = np.linspace(-3, 8, 23)
+    for column in COLUMNS:
+        np.testing.assert_allclose(ranks.percentiles(column, values), reference(refreshed, column, values))
+
+
+def test_new_runners_join_the_population():
+    ranks = loaded(table(2))
+    late = pd.DataFrame({'race_id': [99, 99], 'horse_id': ['99-0', '99-1'],
+                         'horse_form_score': [10.0, 11.0], 'jockey_skill_score': [0.0, 0.0]})
+    ranks.update('v2', late)
+    assert len(ranks) == 242
+    assert ranks.percentiles('horse_form_score', [11.0])[0] == pytest.approx((241 + 242) / 2 / 242 * 100)
+
+
+def test_percentiles_do_not_depend_on_what_was_browsed():
+    pages = table(3)
+    cards = [pd.DataFrame(pages[i]) for i in range(len(pages))]
+    browsed, untouched = loaded(pages), loaded(pages)
+    # Browsing cards merges them again, unchanged runners must not shift any rank
+    for card in cards + cards[::-1]:
+        browsed.update(f'v{len(card)}-{card["race_id"].iloc[0]}', card)
+    values = np.linspace(-3, 3, 13)
+    for column in COLUMNS:
+        np.testing.assert_allclose(browsed.percentiles(column, values), untouched.percentiles(column, values))
+    assert len(browsed) == len(untouched)
+
+
+def test_a_version_is_merged_once():
+    pages = table(4)
+    ranks = loaded(pages)
+    card = pd.DataFrame(pages[0][:5]).assign(horse_form_score=100.0)
+    ranks.update('v2', card)
+    ranks.update('v2', card.assign(horse_form_score=-100.0))
+    assert ranks.percentiles('horse_form_score', [100.0])[0] > 95
+
+
+def test_empty_population():
+    ranks = loaded([])
+    assert np.isnan(ranks.percentiles('horse_form_score', [1.0])).all()
+    frame = ranks.frame(pd.DataFrame({'horse_form_score': [1.0], 'jockey_skill_score': [2.0]}, index=[7]))
+    assert frame.index.tolist() == [7] and frame.isna().all().all()
+
+
+def test_tied_scores_are_replaced_one_for_one():
+    # Many runners share a score, each refreshed one must remove its own copy
+    pages = [[{'race_id': race, 'horse_id': f'{race}-{n}', 'horse_form_score': float(n % 3), 'jockey_skill_score': 1.0}
+              for race in range(4) for n in range(6)]]
+    ranks = loaded(pages)
+    card = pd.DataFrame(pages[0][:8]).assign(horse_form_score=2.0, jockey_skill_score=1.0)
+    ranks.update('v2', card)
+    refreshed = [card.to_dict('records') + pages[0][8:]]
+    values = np.array([0.0, 1.0, 2.0])
+    np.testing.assert_allclose(ranks.percentiles('horse_form_score', values), reference(refreshed, 'horse_form_score', values))
+    np.testing.assert_array_equal(ranks._sorted['jockey_skill_score'], np.ones(24))
@@ -0,0 +1,75 @@
+import itertools
+import math
+
+import numpy as np
+import pytest
+
+from racing.pools import country_pools, frontier, leg_coverage, legs_covered, optimal_perms, perm_picks, places_paid
+
+
+def harville_coverage(p, k, places):
+    # Chance that one of the k most likely runners finishes in the first `places`,
+    # summed over every finishing order of the placed runners under Harville
+    p = np.sort(np.asarray(p, dtype=float))[::-1]
+    p = p / p.sum()
+    total = 0.0
+    for order in itertools.permutations(range(len(p)), places):
+        chance, left = 1.0, 1.0
+        for runner in order:
+            chance *= p[runner] / left
+            left -= p[runner]
+        if min(order) < k:
+            total += chance
+    return total
+
+
+@pytest.mark.parametrize('places', [1, 2, 3])
+def test_leg_coverage_matches_harville_enumeration(places):
+    p = np.random.default_rng(places).dirichlet(np.ones(7))
+    coverage = leg_coverage(p, places)
+    expected = [harville_coverage(p, k, places) for k in range(1, len(p) + 1)]
+    np.testing.assert_allclose(coverage, expected, atol=1e-9)
+
+
+def test_leg_coverage_of_a_win_leg_is_the_cumulative_probability():
+    coverage = leg_coverage([0.1, 0.5, 0.4])
+    np.testing.assert_allclose(coverage, [0.5, 0.9, 1.0])
+
+
+def test_optimal_perms_match_exhaustive_search():
+    rng = np.random.default_rng(0)
+    coverages = [leg_coverage(rng.dirichlet(np.ones(runners)), places)
+                 for runners, places in [(4, 1), (5, 2), (3, 1), (6, 3)]]
+    max_lines = 60
+    best, picks = optimal_perms(coverages, max_lines)
+    exhaustive = np.full(max_lines + 1, -np.inf)
+    for counts in itertools.product(*(range(1, len(c) + 1) for c in coverages)):
+        lines = math.prod(counts)
+        if lines <= max_lines:
+            log_hit = sum(math.log(c[k - 1]) for c, k in zip(coverages, counts))
+            exhaustive[lines] = max(exhaustive[lines], log_hit)
+    np.testing.assert_allclose(best, exhaustive)
+    for lines in np.flatnonzero(np.isfinite(best)):
+        counts = perm_picks(picks, int(lines))
+        assert math.prod(counts) == lines
+        assert sum(math.log(c[k - 1]) for c, k in zip(coverages, counts)) == pytest.approx(best[lines])
+
+
+def test_frontier_only_lists_improving_perms():
+    best = np.log([np.nan, 0.1, 0.05, 0.2, 0.2, 0.3])
+    best[0] = -np.inf
+    assert frontier(best).tolist() == [1, 3, 5]
+
+
+def test_legs_covered_matches_enumeration():
+    coverage = [0.9, 0.5, 0.2, 0.7]
+    expected = np.zeros(len(coverage) + 1)
+    for hits in itertools.product([0, 1], repeat=len(coverage)):
+        expected[sum(hits)] += math.prod(c if hit else 1 - c for c, hit in zip(coverage, hits))
+    np.testing.assert_allclose(legs_covered(coverage), expected)
+
+
+def test_place_pools_only_on_uk_and_irish_cards():
+    assert country_pools('uk') == ['Placepot', 'Quadpot', 'Jackpot', 'Pick-N']
+    assert country_pools('fr') == ['Pick-N']
+    assert places_paid(4) == 1 and places_paid(7) == 2 and places_paid(16, 'Handicap Chase') == 4
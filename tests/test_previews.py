@@ -0,0 +1,49 @@
+import pandas as pd
+
+from racing.previews import PreviewStore, StubBackend, generate_previews, lookup_previews
+
+
+def card():
+    # Two courses running a race of the same name on the same day
+    rows = []
+    for city in ('Longchamp', 'Chantilly'):
+        for number in range(3):
+            rows.append({'race_date': '2026-10-19', 'city': city, 'race_name': 'Prix Test',
+                         'Horse': f'{city} {number}', 'Jockey': 'J', 'Last 5 races': '1-2',
+                         'Win probability': 0.5 - number / 10, 'Top3 probability': 0.9})
+    return pd.DataFrame(rows)
+
+
+class FlakyBackend(StubBackend):
+    # Fails every prompt about one course
+    def generate(self, prompt):
+        if 'at Chantilly' in prompt:
+            raise TimeoutError("model endpoint timed out")
+        return super().generate(prompt)
+
+
+def test_previews_are_generated_once(tmp_path):
+    store = PreviewStore(tmp_path)
+    assert generate_previews(card(), StubBackend(), store) == (8, [])
+    assert generate_previews(card(), StubBackend(), store) == (0, [])
+
+
+def test_same_named_races_at_different_courses_stay_apart(tmp_path):
+    store = PreviewStore(tmp_path)
+    generate_previews(card(), StubBackend(), store)
+    previews = lookup_previews(card(), StubBackend(), store)
+    assert set(previews) == {('2026-10-19', 'Longchamp', 'Prix Test'), ('2026-10-19', 'Chantilly', 'Prix Test')}
+    assert set(previews['2026-10-19', 'Chantilly', 'Prix Test']) == {None, 'Chantilly 0', 'Chantilly 1', 'Chantilly 2'}
+    assert 'at Chantilly' in previews['2026-10-19', 'Chantilly', 'Prix Test'][None]
+
+
+def test_failed_requests_are_skipped_and_retried(tmp_path):
+    store = PreviewStore(tmp_path)
+    generated, failed = generate_previews(card(), FlakyBackend(), store)
+    assert generated == 4
+    assert len(failed) == 4
+    assert {race_key for race_key, _, _ in failed} == {('2026-10-19', 'Chantilly', 'Prix Test')}
+    assert all(isinstance(error, TimeoutError) for _, _, error in failed)
+    assert set(lookup_previews(card(), FlakyBackend(), store)) == {('2026-10-19', 'Longchamp', 'Prix Test')}
+    # Only the failed ones are requested again
+    assert generate_previews(card(), StubBackend(), PreviewStore(tmp_path)) == (4, [])
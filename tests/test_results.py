@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from racing.calibration import NUM_BINS, Calibration
+from racing.results import ResultsCursor, join_results
+
+
+def finishers(race_date, city, race_name, probabilities):
+    # One joined row per finisher, in finishing order
+    n = len(probabilities)
+    return pd.DataFrame({
+        'race_date': pd.Timestamp(race_date), 'city': city, 'race_name': race_name,
+        'horse': [f'{city} {race_name} {i}' for i in range(n)],
+        'position': np.arange(1, n + 1), 'field_size': n,
+        'winner_prob': probabilities,
+    })
+
+
+def test_cursor_counts_each_race_once():
+    cursor = ResultsCursor()
+    day = pd.concat([finishers('2026-10-10', 'York', 'Maiden', [0.5, 0.3, 0.2]),
+                     finishers('2026-10-10', 'Ascot', 'Maiden', [0.6, 0.4])])
+    assert len(cursor.unseen(day)) == 5
+    assert cursor.advance(day) == 2
+    assert cursor.through == '2026-10-10'
+    assert cursor.unseen(day).empty
+
+
+def test_settle_window_picks_up_late_results():
+    cursor = ResultsCursor(settle_days=7)
+    cursor.advance(finishers('2026-10-10', 'York', 'Maiden', [0.5, 0.5]))
+    assert cursor.window_start == '2026-10-03'
+    # A race from three days before the cursor settles late, an old one is final
+    late = finishers('2026-10-07', 'Ascot', 'Sprint', [0.7, 0.3])
+    old = finishers('2026-10-01', 'Ascot', 'Sprint', [0.7, 0.3])
+    again = finishers('2026-10-10', 'York', 'Maiden', [0.5, 0.5])
+    unseen = cursor.unseen(pd.concat([late, old, again]))
+    assert set(unseen['race_date'].dt.strftime('%Y-%m-%d')) == {'2026-10-07'}
+    assert cursor.advance(unseen) == 1
+    assert cursor.through == '2026-10-10'
+    assert cursor.unseen(late).empty
+
+
+def test_counted_races_are_forgotten_once_final():
+    cursor = ResultsCursor(settle_days=2)
+    cursor.advance(finishers('2026-10-10', 'York', 'Maiden', [1.0]))
+    cursor.advance(finishers('2026-10-15', 'York', 'Maiden', [1.0]))
+    assert cursor.counted == {'2026-10-15|York|Maiden'}
+    assert cursor.unseen(finishers('2026-10-10', 'York', 'Maiden', [1.0])).empty
+
+
+def test_cursor_round_trip_and_old_format():
+    cursor = ResultsCursor()
+    cursor.advance(finishers('2026-10-10', 'York', 'Maiden', [1.0]))
+    restored = ResultsCursor.from_dict(cursor.to_dict())
+    assert restored.through == cursor.through and restored.counted == cursor.counted
+    # Saved before the settle window: only the last day's races, without their date
+    old = ResultsCursor.from_dict({'through': '2026-10-10', 'races_on_through': ['York|Maiden']})
+    assert old.counted == {'2026-10-10|York|Maiden'}
+    assert old.unseen(finishers('2026-10-10', 'York', 'Maiden', [1.0])).empty
+    assert len(old.unseen(finishers('2026-10-09', 'York', 'Maiden', [1.0]))) == 1
+
+
+def test_join_results_drops_unplaced_rows_and_sets_field_size():
+    predictions = pd.DataFrame({'race_date': ['2026-10-10'] * 4, 'city': 'York', 'race_name': 'Maiden',
+                                'horse': ['A', 'B', 'C', 'C'], 'winner_prob': [0.5, 0.3, 0.2, 0.2]})
+    results = pd.DataFrame({'race_date': ['2026-10-10'] * 3, 'city': 'York', 'race_name': 'Maiden',
+                            'horse': ['A', 'B', 'C'], 'position': [2, 1, np.nan]})
+    joined = join_results(predictions, results)
+    assert sorted(joined['horse']) == ['A', 'B']
+    assert joined['field_size'].tolist() == [2, 2]
+
+
+def test_calibration_bins_brier_and_log_loss():
+    calibration = Calibration()
+    joined = pd.concat([finishers('2026-10-10', 'York', 'Maiden', [0.62, 0.26, 0.12]),
+                        finishers('2026-10-10', 'Ascot', 'Maiden', [0.3, 0.7])])
+    assert calibration.merge(joined) == 2
+    p = np.array([0.62, 0.26, 0.12, 0.3, 0.7])
+    y = np.array([1, 0, 0, 1, 0])
+    scores = calibration.scores().set_index('Prediction').loc['Win']
+    assert scores['Runners'] == 5
+    assert scores['Brier score'] == pytest.approx(np.mean((p - y) ** 2))
+    assert scores['Log-loss'] == pytest.approx(-np.mean(y * np.log(p) + (1 - y) * np.log(1 - p)))
+    assert scores['Hit rate'] == pytest.approx(0.4)
+    reliability = calibration.reliability('winner_prob')
+    bins = np.floor(p * NUM_BINS) / NUM_BINS
+    assert reliability['bin_start'].tolist() == pytest.approx(sorted(set(bins)))
+    assert reliability['runners'].sum() == 5
+    row = reliability[np.isclose(reliability['bin_start'], 0.3)].iloc[0]
+    assert row['runners'] == 1 and row['observed'] == 1.0 and row['mean_predicted'] == pytest.approx(0.3)
+    # Probability columns missing from the join leave their rows empty
+    assert calibration.scores().set_index('Prediction').loc['Top 3', 'Runners'] == 0
+
+
+def test_calibration_merges_are_not_double_counted_and_survive_a_restart():
+    calibration = Calibration()
+    joined = finishers('2026-10-10', 'York', 'Maiden', [0.6, 0.4])
+    calibration.merge(joined)
+    assert calibration.merge(joined) == 0
+    restored = Calibration.from_dict(calibration.to_dict())
+    assert restored.merge(joined) == 0
+    assert restored.merge(finishers('2026-10-09', 'Ascot', 'Maiden', [0.9, 0.1])) == 1
+    assert restored.scores()['Runners'][0] == 4
+    np.testing.assert_allclose(restored.runners[0], calibration.runners[0] + np.bincount([18, 2], minlength=NUM_BINS))
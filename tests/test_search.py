@@ -0,0 +1,79 @@
+import pandas as pd
+
+from racing.search import SearchIndex, normalise, trigrams
+
+
+def card(runners, city='York', race_name='York Handicap'):
+    # One race, runners as (horse, jockey) pairs
+    return pd.DataFrame({
+        'race_date': pd.to_datetime(['2026-10-19'] * len(runners)),
+        'city': city,
+        'race_name': race_name,
+        'Horse': [horse for horse, _ in runners],
+        'Jockey': [jockey for _, jockey in runners],
+    })
+
+
+def horses(hits):
+    return [value for field, value, *_ in hits if field == 'Horse']
+
+
+def test_normalise_folds_accents_and_case():
+    assert normalise(' Étoile du Nord ') == 'etoile du nord'
+    assert trigrams('ab') == {'  a', ' ab', 'ab '}
+
+
+def test_prefix_hits_rank_above_fuzzy_ones():
+    index = SearchIndex()
+    index.update('uk', 'v1', card([('Sea The Stars', 'R Moore'), ('Seabiscuit', 'G Woolf'), ('The Sea Star', 'W Buick')]))
+    hits = index.search('sea the star')
+    assert horses(hits) == ['Sea The Stars', 'The Sea Star']
+    # Shorter names first among the prefix hits
+    assert horses(index.search('sea')) == ['Seabiscuit', 'Sea The Stars']
+    assert hits[0][2:] == ('uk', '2026-10-19', 'York', 'York Handicap')
+
+
+def test_typos_are_found_by_trigram_overlap():
+    index = SearchIndex()
+    index.update('uk', 'v1', card([('Frankel', 'T Queally'), ('Enable', 'L Dettori'), ('Baaeed', 'J Crowley')]))
+    assert horses(index.search('frankle')) == ['Frankel']
+    assert [value for field, value, *_ in index.search('detori') if field == 'Jockey'] == ['L Dettori']
+    assert index.search('zzzz') == []
+
+
+def test_equal_scores_rank_alphabetically():
+    index = SearchIndex()
+    index.update('uk', 'v1', card([('Blue B', 'J'), ('Blue A', 'J'), ('Blue C', 'J')]))
+    assert horses(index.search('blue')) == ['Blue A', 'Blue B', 'Blue C']
+
+
+def test_update_replaces_a_sources_card():
+    index = SearchIndex()
+    index.update('uk', 'v1', card([('Frankel', 'T Queally'), ('Enable', 'L Dettori')]))
+    index.update('fr', 'v1', card([('Enable', 'L Dettori')], city='Longchamp', race_name="Prix de l'Arc"))
+    assert {hit[2] for hit in index.search('enable') if hit[0] == 'Horse'} == {'uk', 'fr'}
+    # A non-runner leaves the uk card: gone from uk only, and Frankel moved race
+    index.update('uk', 'v2', card([('Frankel', 'T Queally')], race_name='York Stakes'))
+    assert [hit[2] for hit in index.search('enable') if hit[0] == 'Horse'] == ['fr']
+    assert [hit[5] for hit in index.search('frankel') if hit[0] == 'Horse'] == ['York Stakes']
+    assert horses(index.search('frankle')) == ['Frankel']
+    # Terms on no card any more are dropped from the prefix and trigram lookups
+    index.update('fr', 'v2', card([('Baaeed', 'J Crowley')], city='Longchamp'))
+    assert index.search('enable') == [] and index.search('dettori') == []
+    assert 'enable' not in {text for text, _ in index._sorted_terms}
+
+
+def test_same_version_is_not_reindexed():
+    index = SearchIndex()
+    index.update('uk', 'v1', card([('Frankel', 'T Queally')]))
+    index.update('uk', 'v1', card([('Enable', 'L Dettori')]))
+    assert horses(index.search('frankel')) == ['Frankel'] and index.search('enable') == []
+
+
+def test_freed_term_numbers_are_reused():
+    index = SearchIndex()
+    index.update('uk', 'v1', card([('Frankel', 'T Queally')]))
+    size = len(index._terms)
+    index.update('uk', 'v2', card([('Enable', 'L Dettori')]))
+    assert len(index._terms) == size
+    assert horses(index.search('enabel')) == ['Enable'] and index.search('frankle') == []
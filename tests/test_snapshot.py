@@ -0,0 +1,85 @@
+import os
+
+import pandas as pd
+import pytest
+from google.api_core.exceptions import NotFound
+
+from loadtest.fake_backends import FakeBigQuery, FakeSupabase, synthetic_card
+from racing.history import iter_row_pages, row_key
+from racing.snapshot import BQ_PROJECT, SUPABASE_TABLES, export_snapshot, snapshot_clients
+
+RESULTS_TABLE = 'results-project.gb_results.uk_results'
+
+
+@pytest.fixture(scope='module')
+def snapshot(tmp_path_factory):
+    # Exported in small pages so the walk by row key crosses several of them
+    rows = synthetic_card(days=2, courses=3, races=3, runners=6)
+    bq_client = FakeBigQuery(rows, ticks=3)
+    root = str(tmp_path_factory.mktemp('snapshot'))
+    counts = export_snapshot(root, FakeSupabase(rows), bq_client, results_tables=(RESULTS_TABLE,), page_size=7)
+    supabase, bigquery = snapshot_clients(root)
+    return rows, bq_client, root, counts, supabase, bigquery
+
+
+def test_export_writes_every_table(snapshot):
+    rows, _, root, counts, _, _ = snapshot
+    assert all(counts[table] == len(rows) for table in SUPABASE_TABLES)
+    assert counts['gb_results.uk_results'] == len(rows)
+    assert os.path.exists(os.path.join(root, 'bigquery', 'gb_horse_data', 'gb_horse_odds.parquet'))
+    assert os.path.exists(os.path.join(root, 'bigquery', 'gb_results', 'uk_results.parquet'))
+
+
+def test_query_builder_compiles_to_one_statement(snapshot):
+    supabase = snapshot[4]
+    base = supabase.table('uk_horse_racing_full').select('horse', 'odds')
+    query = (base.eq('city', 'York').gte('race_id', '100002')
+             .or_('odds.lt.3,and(race_id.eq.100001,horse.gt."Horse, 1")')
+             .order('race_date').order('horse', desc=True).range(10, 19))
+    assert query.sql() == ('SELECT "horse", "odds" FROM "uk_horse_racing_full" '
+                           'WHERE "city" = ? AND "race_id" >= ? AND ("odds" < ? OR ("race_id" = ? AND "horse" > ?)) '
+                           'ORDER BY "race_date" ASC, "horse" DESC LIMIT 10 OFFSET 10')
+    # Filter values are cast to the column types, not pasted into the SQL
+    assert query._params == ['York', 100002, 3.0, 100001, 'Horse, 1']
+    # Builders are immutable, as the postgrest ones are
+    assert base.sql() == 'SELECT "horse", "odds" FROM "uk_horse_racing_full"'
+
+
+def test_filters_match_the_live_rows(snapshot):
+    rows, _, _, _, supabase, _ = snapshot
+    frame = pd.DataFrame(rows)
+    data = (supabase.table('uk_horse_racing_full').select('horse_id')
+            .eq('city', 'York').or_('odds.lt.4,odds.gt.10').order('horse_id').execute().data)
+    expected = frame[(frame['city'] == 'York') & ((frame['odds'] < 4) | (frame['odds'] > 10))]
+    assert [row['horse_id'] for row in data] == sorted(expected['horse_id'])
+
+
+def test_supabase_tables_round_trip(snapshot):
+    rows, _, _, _, supabase, _ = snapshot
+    for table in ('uk_horse_racing_full', 'fr_horse_racing'):
+        restored = [row for page in iter_row_pages(supabase, table, ('*',), page_size=5) for row in page]
+        key = row_key(table)
+        assert restored == sorted(rows, key=lambda row: tuple(row[column] for column in key))
+
+
+def test_bigquery_tables_round_trip(snapshot):
+    _, bq_client, root, _, _, bigquery = snapshot
+    reference = f'{BQ_PROJECT}.gb_horse_data.gb_horse_odds'
+    job = bigquery.query(f"SELECT * FROM `{reference}` WHERE odds > 0").result()
+    assert job._sql == 'SELECT * FROM "gb_horse_data"."gb_horse_odds" WHERE odds > 0'
+    assert job.total_bytes_processed == os.path.getsize(
+        os.path.join(root, 'bigquery', 'gb_horse_data', 'gb_horse_odds.parquet'))
+    expected = bq_client._odds.sort_values(['race_id', 'scraped_time'], kind='stable').reset_index(drop=True)
+    pd.testing.assert_frame_equal(job.to_dataframe(), expected, check_dtype=False)
+    assert job.to_arrow().num_rows == len(expected)
+    results = bigquery.query(f"SELECT COUNT(*) AS n FROM `{RESULTS_TABLE}`").to_dataframe()
+    assert results['n'].iloc[0] == len(bq_client._results)
+    assert [field.name for field in bigquery.get_table(RESULTS_TABLE).schema] == list(bq_client._results.columns)
+
+
+def test_tables_missing_from_the_snapshot_are_not_found(snapshot):
+    bigquery = snapshot[5]
+    with pytest.raises(NotFound):
+        bigquery.query(f"SELECT * FROM `{BQ_PROJECT}.gb_horse_data.gb_horse_missing`")
+    with pytest.raises(NotFound):
+        bigquery.get_table(f'{BQ_PROJECT}.gb_horse_data.gb_horse_missing')
@@ -0,0 +1,138 @@
+import numpy as np
+import pytest
+
+from racing.staking import StakeSettings, dutch_stakes, kelly_fractions, limited_kelly_fractions, solve_stakes
+
+
+def races(seed, count=20, runners=6):
+    # Model probabilities and market odds with a bookmaker margin, some runners priced above the model
+    rng = np.random.default_rng(seed)
+    p = rng.dirichlet(np.ones(runners), size=count)
+    market = p * rng.lognormal(0, 0.3, size=p.shape)
+    o = 1 / (1.1 * market / market.sum(axis=1, keepdims=True))
+    return p, o
+
+
+def growth(f, p, o):
+    # Expected log growth of each race's bankroll, unbacked winners leave only the cash kept
+    kept = 1 - f.sum(axis=1)
+    return (p * np.log(kept[:, None] + o * f)).sum(axis=1) + (1 - p.sum(axis=1)) * np.log(kept)
+
+
+def gradient(f, p, o):
+    # Marginal expected log growth of a little more on each runner
+    kept = 1 - f.sum(axis=1, keepdims=True)
+    wealth = kept + o * f
+    unbacked = 1 - p.sum(axis=1, keepdims=True)
+    return p * o / wealth - (p / wealth).sum(axis=1, keepdims=True) - unbacked / kept
+
+
+def test_kelly_only_stakes_races_with_a_value_runner():
+    p, o = races(0)
+    f = kelly_fractions(p, o)
+    value = (p * o > 1).any(axis=1)
+    assert (f[~value] == 0).all() and (f[value].sum(axis=1) > 0).all()
+    assert (f >= 0).all() and (f.sum(axis=1) < 1).all()
+    # Runners below the market can be covered, but never ahead of a better return
+    for race in np.flatnonzero(value):
+        assert (p * o)[race, f[race] > 0].min() > (p * o)[race, f[race] == 0].max(initial=0)
+
+
+def test_kelly_fractions_meet_the_optimality_conditions():
+    p, o = races(1)
+    f = kelly_fractions(p, o)
+    g = gradient(f, p, o)
+    # Equal marginal growth of zero on staked runners, none to gain on the others
+    np.testing.assert_allclose(g[f > 0], 0, atol=1e-9)
+    assert (g[f == 0] <= 1e-9).all()
+
+
+def test_kelly_fractions_beat_random_stakes():
+    p, o = races(2, count=5, runners=4)
+    best = growth(kelly_fractions(p, o), p, o)
+    rng = np.random.default_rng(3)
+    for _ in range(2000):
+        f = rng.dirichlet(np.ones(5), size=5)[:, :4] * rng.uniform(0, 0.5, size=(5, 1))
+        assert (growth(f, p, o) <= best + 1e-12).all()
+
+
+def test_kelly_fraction_of_a_single_runner():
+    # One runner at evens with a 60% chance: stake p - (1 - p) / (o - 1)
+    f = kelly_fractions(np.array([[0.6, 0.4]]), np.array([[2.0, 1.5]]))
+    np.testing.assert_allclose(f, [[0.2, 0]])
+
+
+@pytest.mark.parametrize('race_limit, card_limit', [(0.05, 0), (0, 0.3), (0.05, 0.3)])
+def test_limited_kelly_meets_the_optimality_conditions(race_limit, card_limit):
+    p, o = races(4)
+    free = kelly_fractions(p, o).sum(axis=1)
+    f = limited_kelly_fractions(p, o, race_limit, card_limit)
+    totals = f.sum(axis=1)
+    if race_limit:
+        assert (totals <= race_limit + 1e-9).all()
+    if card_limit:
+        assert totals.sum() <= card_limit + 1e-9
+    assert (totals <= free + 1e-9).all()
+    # Each race's penalty is the marginal growth of its staked runners, no runner left out beats it
+    g = gradient(f, p, o)
+    for race in np.flatnonzero(totals > 0):
+        staked = f[race] > 0
+        penalty = g[race, staked].mean()
+        np.testing.assert_allclose(g[race, staked], penalty, atol=1e-6)
+        assert (g[race, ~staked] <= penalty + 1e-6).all()
+        assert penalty >= -1e-9
+        if totals[race] < (race_limit or np.inf) - 1e-6 and totals[race] < free[race] - 1e-6:
+            assert card_limit
+    if card_limit and not race_limit:
+        # The budget binds and one multiplier is shared by every race it touches
+        assert totals.sum() == pytest.approx(card_limit, abs=1e-6)
+        penalties = [g[race, f[race] > 0].mean() for race in np.flatnonzero(totals > 0)]
+        np.testing.assert_allclose(penalties, penalties[0], atol=1e-6)
+
+
+def test_limited_kelly_beats_scaling_down():
+    p, o = races(5)
+    free = kelly_fractions(p, o)
+    f = limited_kelly_fractions(p, o, race_limit=0.03)
+    scaled = free * np.minimum(1, 0.03 / np.maximum(free.sum(axis=1, keepdims=True), 1e-12))
+    assert (growth(f, p, o) >= growth(scaled, p, o) - 1e-12).all()
+    assert (growth(f, p, o) > growth(scaled, p, o) + 1e-9).any()
+
+
+def test_limited_kelly_without_limits_is_kelly():
+    p, o = races(6)
+    np.testing.assert_allclose(limited_kelly_fractions(p, o), kelly_fractions(p, o))
+
+
+def test_dutch_stakes_return_the_target_whichever_backed_runner_wins():
+    p, o = races(7)
+    stakes = dutch_stakes(p, o, 25)
+    for race in range(len(p)):
+        backed = stakes[race] > 0
+        if backed.any():
+            profit = stakes[race, backed] * o[race, backed] - stakes[race].sum()
+            np.testing.assert_allclose(profit, 25)
+            assert (p[race, backed] * o[race, backed] > 1).all()
+        else:
+            # Nothing to dutch, or the value runners cover the whole book
+            value = p[race] * o[race] > 1
+            assert not value.any() or (1 / o[race, value]).sum() >= 1
+
+
+def test_capped_dutch_stakes_keep_an_equal_profit():
+    p, o = races(8)
+    settings = StakeSettings(method='Dutch to a target profit', target_profit=25, max_race_exposure=20, card_budget=100)
+    stakes = solve_stakes(p, o, settings)
+    assert (stakes.sum(axis=1) <= 20 + 1e-9).all() and stakes.sum() <= 100 + 1e-9
+    for race in np.flatnonzero(stakes.sum(axis=1) > 0):
+        backed = stakes[race] > 0
+        profit = stakes[race, backed] * o[race, backed] - stakes[race].sum()
+        np.testing.assert_allclose(profit, profit[0])
+
+
+def test_kelly_settings_respect_both_limits():
+    p, o = races(9)
+    settings = StakeSettings(bankroll=1000, kelly_fraction=0.5, max_race_exposure=15, card_budget=60)
+    stakes = solve_stakes(p, o, settings)
+    assert (stakes.sum(axis=1) <= 15 + 1e-6).all()
+    assert stakes.sum() <= 60 + 1e-6
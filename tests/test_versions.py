@@ -0,0 +1,81 @@
+import pandas as pd
+import pytest
+
+from racing.versions import CardVersions
+
+
+def card(prices, index=None):
+    # One race with a runner per (horse, odds) pair, in the order given
+    horses = list(prices)
+    return pd.DataFrame({
+        'race_date': pd.to_datetime(['2026-10-19'] * len(horses)),
+        'city': 'York',
+        'race_name': 'York Handicap',
+        'Horse': horses,
+        'Jockey': [f'Jockey {horse}' for horse in horses],
+        'Odds predicted': [prices[horse] for horse in horses],
+        'Initial market odds': [prices[horse] + 1 for horse in horses],
+        'Win probability': [1 / prices[horse] for horse in horses],
+    }, index=index)
+
+
+def test_card_rebuilds_every_version():
+    versions = CardVersions()
+    cards = [card({'A': 2.0, 'B': 4.0, 'C': 8.0}),
+             card({'A': 2.5, 'B': 4.0, 'C': 6.0}),
+             card({'A': 2.5, 'B': 3.0})]
+    for number, df in enumerate(cards):
+        versions.append(f'v{number}', df)
+    assert versions.latest == 2
+    for number, df in enumerate(cards):
+        rebuilt = versions.card(number)
+        pd.testing.assert_frame_equal(rebuilt, df)
+        assert rebuilt.attrs == {'data_version': f'v{number}', 'version_number': number}
+
+
+def test_reordered_refresh_keeps_each_versions_row_order_and_index():
+    versions = CardVersions()
+    first = card({'A': 2.0, 'B': 4.0, 'C': 8.0}, index=[10, 11, 12])
+    refreshed = card({'C': 8.0, 'B': 4.0, 'A': 2.0}, index=[0, 1, 2])
+    versions.append('v0', first)
+    versions.append('v1', refreshed)
+    versions.append('v2', card({'C': 7.0, 'B': 4.0, 'A': 2.0}, index=[0, 1, 2]))
+    # A card's rows are looked up by index, so each version must come back as it was loaded
+    pd.testing.assert_frame_equal(versions.card(0), first)
+    pd.testing.assert_frame_equal(versions.card(1), refreshed)
+    assert versions.card(1).loc[0, 'Horse'] == 'C'
+
+
+def test_append_counts_changed_cells_and_skips_unchanged_columns():
+    versions = CardVersions()
+    assert versions.append('v0', card({'A': 2.0, 'B': 4.0})) > 0
+    # Only A's three prices moved
+    assert versions.append('v1', card({'A': 3.0, 'B': 4.0})) == 3
+    assert versions.append('v2', card({'A': 3.0, 'B': 4.0})) == 0
+    assert all(number == 1 for changes in versions.changes.values() for number, _, _ in changes)
+
+
+def test_changes_between_lists_runners_that_moved():
+    versions = CardVersions()
+    versions.append('v0', card({'A': 2.0, 'B': 4.0, 'C': 8.0}))
+    versions.append('v1', card({'C': 8.0, 'B': 5.0, 'A': 2.0}))
+    versions.append('v2', card({'C': 9.0, 'B': 5.0, 'A': 2.0}))
+    changes = versions.changes_between(0, 2).set_index('Horse')
+    assert sorted(changes.index) == ['B', 'C']
+    assert changes.loc['B', 'Odds predicted then'] == 4.0 and changes.loc['B', 'Odds predicted now'] == 5.0
+    assert changes.loc['C', 'Initial market odds then'] == 9.0 and changes.loc['C', 'Initial market odds now'] == 10.0
+    assert list(versions.changes_between(1, 2)['Horse']) == ['C']
+    assert versions.changes_between(2, 2).empty
+
+
+def test_oldest_versions_are_dropped_with_runners_on_no_kept_version():
+    versions = CardVersions(max_versions=2)
+    versions.append('v0', card({'A': 2.0, 'B': 4.0}))
+    versions.append('v1', card({'B': 5.0, 'C': 6.0}))
+    versions.append('v2', card({'C': 7.0, 'B': 5.0}))
+    assert versions.first == 1
+    assert [key[-1] for key in versions.keys] == ['B', 'C']
+    pd.testing.assert_frame_equal(versions.card(1), card({'B': 5.0, 'C': 6.0}))
+    pd.testing.assert_frame_equal(versions.card(2), card({'C': 7.0, 'B': 5.0}))
+    with pytest.raises(KeyError):
+        versions.card(0)